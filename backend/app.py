@@ -1,13 +1,15 @@
-from fastapi import FastAPI, HTTPException, Body, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Body, BackgroundTasks, WebSocket, WebSocketDisconnect, Request, Response, Query
 import uvicorn
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pydantic import BaseModel, HttpUrl
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable
 import logging
 import threading
 import asyncio
 import os
+import time
+from collections import deque
 from pathlib import Path
 try:
     from backend.core import DownloaderManager
@@ -18,34 +20,144 @@ except ImportError:
 try:
     import backend.database as db
     from backend.utils import get_safe_filename, DEFAULT_OUTPUT_DIR
+    from backend.log_buffer import LogBuffer
 except ImportError:
     import database as db
     from utils import get_safe_filename, DEFAULT_OUTPUT_DIR
+    from log_buffer import LogBuffer
 
 import json
 from apscheduler.schedulers.background import BackgroundScheduler
 
 # WebSocket Manager
+WS_MAX_CLIENTS = 50        # Extra connections are refused (close code 1013)
+WS_LOG_QUEUE = 500         # Log lines buffered per client (oldest dropped first)
+WS_SEND_TIMEOUT = 5.0      # Seconds a single send may take before the client is evicted
+WS_STALL_SECONDS = 10.0    # A client that keeps losing logs for this long without catching up is evicted
+WS_LOG_REPLAY = 200        # Recent log events sent to a client when it connects
+LOG_BUFFER_SIZE = 1000     # Log events kept server-side for replay and GET /logs
+
+class ClientChannel:
+    """
+    Outgoing queue of one websocket, drained by its own writer task.
+    Logs are a bounded deque (drop-oldest); status is a single pending
+    message where newer deltas are merged into older ones (latest wins).
+    """
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.logs = deque(maxlen=WS_LOG_QUEUE)
+        self.status: Optional[Dict] = None
+        self.dropped = 0  # Log lines lost since the queue was last empty
+        self.dropping_since: Optional[float] = None  # First of those losses
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def push(self, message: Dict) -> bool:
+        """Queues a message. Returns False if the client fell too far behind."""
+        if message.get("type") == "log":
+            if len(self.logs) == self.logs.maxlen:
+                if not self.dropped:
+                    self.dropping_since = time.monotonic()
+                self.dropped += 1
+            self.logs.append(message)
+        elif message.get("type") == "status_delta":
+            self.status = _merge_status(self.status, message)
+        elif message.get("type") == "status":
+            self.status = message
+        else:
+            self.logs.append(message)
+        self.wakeup.set()
+        # The stall counts from the first lost line, not from the last drain:
+        # an idle client that fills up in a burst gets the full grace period
+        return not self.dropped or time.monotonic() - self.dropping_since < WS_STALL_SECONDS
+
+    async def run(self, on_dead):
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.status is not None or self.logs:
+                    if self.status is not None:
+                        message, self.status = self.status, None
+                    else:
+                        message = self.logs.popleft()
+                    await asyncio.wait_for(self.websocket.send_json(message), WS_SEND_TIMEOUT)
+                self.dropped = 0
+                self.dropping_since = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"🔌 Cliente WebSocket desconectado ({type(e).__name__})")
+            on_dead(self.websocket)
+
+def _merge_status(pending: Optional[Dict], message: Dict) -> Dict:
+    """Folds a status_delta into the pending status message (snapshot or delta)."""
+    if pending is None:
+        return {"type": "status_delta", "data": {
+            "version": message["data"]["version"], "changes": dict(message["data"]["changes"])
+        }}
+    if pending["type"] == "status":
+        pending["data"].update(message["data"]["changes"])
+        pending["version"] = message["data"]["version"]
+    else:
+        pending["data"]["changes"].update(message["data"]["changes"])
+        pending["data"]["version"] = message["data"]["version"]
+    return pending
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.channels)
+
+    async def connect(self, websocket: WebSocket, initial: Optional[Callable[[], List[Dict]]] = None) -> bool:
+        """
+        Accepts and registers the client. `initial()` builds its first
+        messages; it runs right before registration (no await in between),
+        so nothing published meanwhile is missed.
+        """
+        if len(self.channels) >= WS_MAX_CLIENTS:
+            await websocket.close(code=1013)  # Try again later
+            logger.warning(f"⚠️ WebSocket rechazado: límite de {WS_MAX_CLIENTS} clientes")
+            return False
         await websocket.accept()
-        self.active_connections.append(websocket)
+        channel = ClientChannel(websocket)
+        for message in (initial() if initial else []):
+            channel.push(message)
+        self.channels[websocket] = channel
+        channel.task = asyncio.create_task(channel.run(self.disconnect))
+        return True
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        channel = self.channels.pop(websocket, None)
+        if not channel:
+            return
+        if channel.task and channel.task is not asyncio.current_task():
+            channel.task.cancel()
+        # Wake up a receive loop still waiting on this socket
+        asyncio.ensure_future(self._close(websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    def publish(self, message: Dict):
+        """Queues a message for every client (never blocks; runs on the event loop)."""
+        for websocket, channel in list(self.channels.items()):
+            if not channel.push(message):
+                logger.warning("🐢 Cliente WebSocket demasiado lento, desconectado")
+                self.disconnect(websocket)
 
     async def broadcast(self, message: Dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception:
-                pass
+        self.publish(message)
                 
 connection_manager = ConnectionManager()
+log_buffer = LogBuffer(LOG_BUFFER_SIZE)
 
 app = FastAPI()
 
@@ -81,7 +193,8 @@ app.mount("/js", StaticFiles(directory=js_dir), name="js")
 # Custom Filter to silence /status logs
 class EndpointFilter(logging.Filter):
     def filter(self, record: logging.LogRecord) -> bool:
-        return record.getMessage().find("GET /status") == -1
+        message = record.getMessage()
+        return message.find("GET /status") == -1 and message.find("GET /logs") == -1
 
 logging.getLogger("uvicorn.access").addFilter(EndpointFilter())
 
@@ -107,6 +220,8 @@ main_loop = None
 async def startup_event():
     global main_loop
     main_loop = asyncio.get_running_loop()
+    # asyncio engine runs its jobs on this loop
+    manager.loop = main_loop
     
     # Initialize DB
     db.init_db()
@@ -120,6 +235,9 @@ async def startup_event():
     
     # Run Migration
     run_migration_if_needed()
+    
+    # Index libraries downloaded before the tracks table existed
+    index_unindexed_playlists()
 
 def run_migration_if_needed():
     """Migrates JSON playlists to SQLite if they exist."""
@@ -148,6 +266,19 @@ def run_migration_if_needed():
     except Exception as e:
         logger.error(f"Migration failed: {e}")
 
+def index_unindexed_playlists():
+    """Builds the library index from existing M3U files (one-off per playlist)."""
+    for pl in db.get_playlists():
+        if db.count_tracks(pl["id"]) > 0:
+            continue
+        try:
+            count = manager.index_playlist(pl["id"], pl["name"])
+            if count:
+                logger.info(f"Indexed {count} tracks for {pl['name']}")
+                update_track_count_for_playlist(pl)
+        except Exception as e:
+            logger.error(f"Indexing failed for {pl['name']}: {e}")
+
 @app.post("/schedule")
 def set_schedule(interval_hours: int = Body(..., embed=True)):
     """Configura la ejecución automática cada X horas y persiste la configuración."""
@@ -172,22 +303,48 @@ def set_schedule(interval_hours: int = Body(..., embed=True)):
         return {"status": "scheduled", "interval_hours": interval_hours}
     else:
         return {"status": "disabled"}
+def _on_main_loop() -> bool:
+    try:
+        return asyncio.get_running_loop() is main_loop
+    except RuntimeError:
+        return False
+
 def sync_broadcast(event_type, data):
     msg = {"type": event_type, "data": data}
-    if main_loop and connection_manager.active_connections:
-        asyncio.run_coroutine_threadsafe(connection_manager.broadcast(msg), main_loop)
+    if event_type == "log":
+        # Kept for clients that connect later (replay) and GET /logs
+        msg["seq"] = log_buffer.append(data)["seq"]
+    if main_loop and connection_manager.channels:
+        # Fan-out happens on the loop; per-client writers do the actual sends
+        if _on_main_loop():
+            # asyncio engine: already on the loop, no thread hop
+            connection_manager.publish(msg)
+        else:
+            main_loop.call_soon_threadsafe(connection_manager.publish, msg)
 
 manager = DownloaderManager(config_path=str(CONFIG_PATH), broadcast_func=sync_broadcast)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await connection_manager.connect(websocket)
-    # Send current status immediately
-    await websocket.send_json({"type": "status", "data": manager.status})
+    def initial_messages():
+        # Current status first (full snapshot; "status_delta" frames follow),
+        # then recent history. Live logs carry "seq" so the client can skip repeats.
+        version, snapshot = manager.status_publisher.snapshot()
+        return [
+            {"type": "status", "data": snapshot, "version": version},
+            {"type": "log_replay", "data": {
+                "epoch": log_buffer.epoch, "events": log_buffer.tail(WS_LOG_REPLAY)
+            }},
+        ]
+
+    if not await connection_manager.connect(websocket, initial_messages):
+        return
     try:
         while True:
             data = await websocket.receive_text()
-    except WebSocketDisconnect:
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
         connection_manager.disconnect(websocket)
 
 # Models
@@ -201,6 +358,7 @@ class ConfigUpdate(BaseModel):
 class SettingsUpdate(BaseModel):
     output_dir: Optional[str] = None
     concurrency: Optional[int] = None
+    engine: Optional[str] = None
 
 class Playlist(BaseModel):
     id: str
@@ -218,10 +376,29 @@ def get_config():
 
 @app.get("/status")
 def get_status():
-    return manager.status
+    # Live scheduler view (token bucket + pause); not part of the WS status frames
+    scheduler = manager.throttle.snapshot()
+    scheduler["workers"] = manager.worker_snapshot()
+    return {**manager.status, "scheduler": scheduler}
+
+@app.get("/logs")
+def get_logs(since: int = Query(0, ge=0), limit: int = Query(500, ge=1, le=LOG_BUFFER_SIZE)):
+    """
+    Log events with seq > since, oldest first. `truncated` means older
+    events were already overwritten; `epoch` changes when the server restarts.
+    """
+    events = log_buffer.since(since, limit)
+    return {
+        "epoch": log_buffer.epoch,
+        "last_seq": log_buffer.last_seq,
+        "truncated": since + 1 < log_buffer.first_seq() and since < log_buffer.last_seq,
+        "events": events,
+    }
 
 @app.post("/settings")
 def update_settings(settings: SettingsUpdate):
+    if settings.engine is not None and settings.engine not in ("threads", "asyncio"):
+        raise HTTPException(status_code=400, detail="engine must be 'threads' or 'asyncio'")
     try:
         current = manager.config.copy()
         
@@ -234,6 +411,7 @@ def update_settings(settings: SettingsUpdate):
              current["output_dir"] = path
              
         if settings.concurrency is not None: current["concurrency"] = settings.concurrency
+        if settings.engine is not None: current["engine"] = settings.engine
         CONFIG_PATH.write_text(json.dumps(current, indent=2), encoding="utf-8")
     except Exception as e:
         logger.error(f"Failed to update settings: {e}")
@@ -276,6 +454,8 @@ def delete_playlist(id: str):
            if target_dir.exists() and target_dir.is_dir():
                shutil.rmtree(target_dir)
                logger.info(f"Deleted folder: {target_dir}")
+           # Songs only this playlist used leave the shared pool too
+           manager.prune_track_pool()
         except Exception as e:
             logger.error(f"Failed to delete folder for {pl['name']}: {e}")
             
@@ -290,6 +470,18 @@ def sync_playlist_now(id: str, background_tasks: BackgroundTasks):
     background_tasks.add_task(execution_job_single, pl)
     return {"status": "started", "playlist": pl["name"]}
 
+@app.get("/playlists/{id}/plan")
+def get_playlist_plan(id: str, resolve: bool = True):
+    """
+    What a sync of the playlist would download, per source. Uses the cached
+    Spotify manifests and YouTube listings; with resolve=false spotdl is
+    never called (sources without a usable manifest are reported as unknown).
+    """
+    pl = db.get_playlist(id)
+    if not pl:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    return manager.plan_playlist(pl, resolve)
+
 @app.get("/history")
 def get_history():
     return db.get_history()
@@ -323,6 +515,15 @@ async def retry_download(id: str):
 async def sanitize_files():
     """Renombra archivos eliminando IDs y emojis para compatibilidad."""
     stats = manager.sanitize_files()
+    
+    # Renamed files => M3U files changed, refresh the library index
+    if stats.get("m3u_updated"):
+        for pl in db.get_playlists():
+            try:
+                manager.index_playlist(pl["id"], pl["name"])
+                update_track_count_for_playlist(pl)
+            except Exception as e:
+                logger.error(f"Indexing failed for {pl['name']}: {e}")
     return {"status": "ok", "stats": stats}
 
 def migrate_db():
@@ -356,7 +557,7 @@ def execution_job_single(p: Dict):
     manager.update_status("playlist_name", p['name'])
     
     # Process
-    results = manager.process_urls(urls, m3u_name=p["name"])
+    results = manager.process_urls(urls, m3u_name=p["name"], playlist_id=p["id"])
     
     # Calculate stats
     duration = time.time() - start_time
@@ -365,12 +566,14 @@ def execution_job_single(p: Dict):
     # Results is List of dicts. If manager modifies it we can check?
     # Manager returns list of results: {url, status, attempts}
     
+    report = manager.last_job_report
     db.add_history_entry(
         playlist_name=p["name"],
         status="completed",
         downloaded=downloaded,
         total=len(urls),
-        duration=duration
+        duration=duration,
+        details={"concurrency": [dict(report, playlist=p["name"])]} if report else None
     )
     
     # Update Track Count
@@ -382,6 +585,7 @@ def execution_job():
     start_time = time.time()
     total_processed = 0
     downloaded_count = 0
+    reports = [] # Concurrency controller summary of the run
     
     try:
         # Use DB
@@ -390,28 +594,24 @@ def execution_job():
             logger.info("No playlists to schedule.")
             return
 
-        for p in playlists:
-            urls = p.get("urls", [])
-            if not urls:
-                continue
-                
-            logger.info(f"Processing playlist: {p['name']}")
-            
-            manager.update_status("playlist_name", p['name'])
-            
-            # Process
-            try:
-                results = manager.process_urls(urls, m3u_name=p["name"])
-                total_processed += len(urls)
-                # Count successes in this batch
-                downloaded_count += sum(1 for r in results if r.get("status") == "success")
-            except Exception as e:
-                logger.error(f"Error processing playlist {p['name']}: {e}")
-            
-            # CRITICAL: Check if stop was requested during processing
-            if manager.stop_requested.is_set():
-                logger.info("Stop requested. Aborting remaining playlists.")
-                break
+        playlists = [p for p in playlists if p.get("urls")]
+        logger.info(f"Processing {len(playlists)} playlists in one queue")
+        manager.update_status("playlist_name", "Scheduled Sync")
+        
+        # One global queue: songs shared by several playlists are downloaded once
+        try:
+            results = manager.process_playlists(playlists)
+            total_processed = sum(len(p["urls"]) for p in playlists)
+            downloaded_count = sum(1 for r in results if r.get("status") == "success")
+            if manager.last_job_report:
+                reports.append(dict(manager.last_job_report, playlist="Scheduled Sync"))
+            # Per playlist outcome (shared downloads count for each playlist they served)
+            for p in playlists:
+                served = [r for r in results if p["id"] in r.get("playlists", [])]
+                ok = sum(1 for r in served if r.get("status") == "success")
+                logger.info(f"Playlist {p['name']}: {ok}/{len(served)} tareas OK")
+        except Exception as e:
+            logger.error(f"Error processing scheduled playlists: {e}")
             
         # Update Track Counts
         playlists_latest = db.get_playlists()
@@ -432,69 +632,50 @@ def execution_job():
                     status="completed",
                     downloaded=downloaded_count,
                     total=total_processed,
-                    duration=duration
+                    duration=duration,
+                    details={"concurrency": reports} if reports else None
                 )
                 logger.info(f"Scheduled execution finished. Processed {total_processed} URLs.")
             except Exception as h_err:
                 logger.error(f"Failed to save history: {h_err}")
 
 def update_track_count_for_playlist(p):
-    manager.reload_config()
-    output_dir = Path(manager.config.get("output_dir", DEFAULT_OUTPUT_DIR))
-    
-    m3u_name = p["name"]
-    safe_name = get_safe_filename(m3u_name)
-    
-    # Check in subfolder first (New Structure)
-    m3u_path = output_dir / safe_name / f"{safe_name}.m3u8"
-    if not m3u_path.exists():
-        # Fallback to old root structure
-        m3u_path = output_dir / f"{safe_name}.m3u8"
-    
-    count = 0
-    if m3u_path.exists():
-        try:
-            lines = m3u_path.read_text(encoding="utf-8").splitlines()
-            count = sum(1 for line in lines if line.strip() and not line.startswith("#"))
-        except:
-            pass
+    # Served from the library index kept up to date by the download pipeline
+    count = db.count_tracks(p["id"])
     
     if p.get("track_count") != count:
         db.update_track_count(p["id"], count)
         logger.info(f"Updated track count for {p['name']}: {count}")
 
 @app.get("/playlists/{id}/tracks")
-def get_playlist_tracks(id: str):
-    target_pl = db.get_playlist(id)
-    if not target_pl:
+def get_playlist_tracks(
+    id: str,
+    request: Request,
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    prefix: Optional[str] = None,
+):
+    """
+    Lists the downloaded tracks of a playlist (paginated with offset/limit,
+    optionally filtered by filename prefix). The total number of matches is
+    returned in X-Total-Count. The ETag changes only when the library index
+    does, so If-None-Match revalidations are answered with 304.
+    """
+    version = db.get_tracks_version(id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Playlist not found")
 
-    m3u_name = target_pl["name"]
-    safe_name = get_safe_filename(m3u_name)
-    
-    manager.reload_config()
-    output_dir = Path(manager.config.get("output_dir", DEFAULT_OUTPUT_DIR))
-    
-    # Check in subfolder first (New Structure)
-    m3u_path = output_dir / safe_name / f"{safe_name}.m3u8"
-    if not m3u_path.exists():
-        # Fallback to old root structure
-        m3u_path = output_dir / f"{safe_name}.m3u8"
-    
-    if not m3u_path.exists():
-        return []
-        
-    tracks = []
-    try:
-        lines = m3u_path.read_text(encoding="utf-8").splitlines()
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith("#"):
-                tracks.append(line)
-    except Exception as e:
-        logger.error(f"Error reading m3u8: {e}")
-        
-    return tracks 
+    etag = f'"{id}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    response.headers["X-Total-Count"] = str(db.count_tracks(id, prefix))
+    return [t["filename"] for t in db.get_tracks(id, offset, limit, prefix)]
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,250 @@
+
+import mmap
+import struct
+import logging
+from pathlib import Path
+from typing import Optional, Union
+
+logger = logging.getLogger("downloader.audio_meta")
+
+# Native duration readers for the containers spotdl/yt-dlp produce.
+# Only headers and the last page/box/frame headers are touched (via mmap),
+# so a lookup costs microseconds instead of an ffprobe fork/exec.
+# Every reader returns None when unsure; callers then fall back to ffprobe.
+
+OGG_TAIL_SCAN = 65536 + 282  # Max page size + header
+
+
+def _skip_id3v2(buf) -> int:
+    """Returns the offset right after an ID3v2 tag (0 if there is none)."""
+    if len(buf) >= 10 and buf[:3] == b"ID3":
+        flags = buf[5]
+        b = buf[6:10]
+        size = (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+        footer = 10 if flags & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+# === FLAC ===
+
+def _flac_duration(buf) -> Optional[float]:
+    pos = _skip_id3v2(buf)
+    if buf[pos:pos + 4] != b"fLaC":
+        return None
+    pos += 4
+    # STREAMINFO is mandatory and always the first metadata block
+    header = buf[pos:pos + 4]
+    if len(header) < 4 or (header[0] & 0x7F) != 0:
+        return None
+    info = buf[pos + 4:pos + 4 + 34]
+    if len(info) < 34:
+        return None
+    # 20 bits sample rate | 3 bits channels | 5 bits bps | 36 bits total samples
+    packed = int.from_bytes(info[10:18], "big")
+    sample_rate = packed >> 44
+    total_samples = packed & 0xFFFFFFFFF
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / sample_rate
+
+
+# === Ogg (Opus / Vorbis) ===
+
+def _ogg_duration(buf) -> Optional[float]:
+    if buf[:4] != b"OggS" or len(buf) < 28:
+        return None
+    serial = buf[14:18]
+    segments = buf[26]
+    data = 27 + segments
+    head = buf[data:data + 19]
+
+    if head[:8] == b"OpusHead":
+        pre_skip = struct.unpack_from("<H", head, 10)[0]
+        sample_rate = 48000  # Opus granule positions are always 48 kHz
+    elif head[:7] == b"\x01vorbis":
+        pre_skip = 0
+        sample_rate = struct.unpack_from("<I", head, 12)[0]
+    else:
+        return None
+    if not sample_rate:
+        return None
+
+    # Last page of the same logical stream holds the final granule position
+    size = len(buf)
+    start = max(0, size - OGG_TAIL_SCAN)
+    pos = buf.rfind(b"OggS", start)
+    while pos != -1:
+        if buf[pos + 14:pos + 18] == serial:
+            granule = struct.unpack_from("<q", buf, pos + 6)[0]
+            if granule > 0:
+                return max(0, granule - pre_skip) / sample_rate
+        if pos <= start:
+            break
+        pos = buf.rfind(b"OggS", start, pos)
+    return None
+
+
+# === MP3 ===
+
+_MP3_BITRATES = {
+    # (version_is_mpeg1, layer) -> kbps table
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _mp3_frame(buf, pos):
+    """Parses the frame header at pos. Returns (frame_len, samples, sample_rate, is_mpeg1, mono) or None."""
+    if pos + 4 > len(buf):
+        return None
+    b1, b2, b3 = buf[pos + 1], buf[pos + 2], buf[pos + 3]
+    if buf[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03   # 3 = MPEG1, 2 = MPEG2, 0 = MPEG2.5
+    layer = 4 - ((b1 >> 1) & 0x03)
+    br_idx = b2 >> 4
+    sr_idx = (b2 >> 2) & 0x03
+    if version == 1 or layer == 4 or br_idx in (0, 15) or sr_idx == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][br_idx] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sr_idx]
+    padding = (b2 >> 1) & 0x01
+    mono = (b3 >> 6) == 3
+
+    if layer == 1:
+        samples = 384
+        frame_len = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        frame_len = (samples // 8) * bitrate // sample_rate + padding
+    if frame_len < 4:
+        return None
+    return frame_len, samples, sample_rate, mpeg1, mono
+
+
+def _mp3_duration(buf) -> Optional[float]:
+    pos = _skip_id3v2(buf)
+    end = len(buf)
+    if end >= 128 and buf[end - 128:end - 125] == b"TAG":
+        end -= 128  # ID3v1
+
+    # Find the first valid frame (confirmed by the following one)
+    limit = min(end, pos + 65536)
+    frame = None
+    while pos < limit:
+        pos = buf.find(b"\xff", pos, limit)
+        if pos == -1:
+            return None
+        frame = _mp3_frame(buf, pos)
+        if frame and (pos + frame[0] >= end or _mp3_frame(buf, pos + frame[0])):
+            break
+        frame = None
+        pos += 1
+    if not frame:
+        return None
+
+    frame_len, samples, sample_rate, mpeg1, mono = frame
+
+    # 1. Xing / Info header (VBR and LAME CBR files)
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = pos + 4 + side_info
+    if buf[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack_from(">I", buf, xing + 4)[0]
+        if flags & 0x01:
+            frames = struct.unpack_from(">I", buf, xing + 8)[0]
+            if frames:
+                return frames * samples / sample_rate
+
+    # 2. VBRI (Fraunhofer encoders)
+    vbri = pos + 4 + 32
+    if buf[vbri:vbri + 4] == b"VBRI":
+        frames = struct.unpack_from(">I", buf, vbri + 14)[0]
+        if frames:
+            return frames * samples / sample_rate
+
+    # 3. Frame scan: walk the frame headers (4 bytes read per frame)
+    count = 0
+    while pos < end:
+        frame = _mp3_frame(buf, pos)
+        if not frame:
+            break
+        count += 1
+        pos += frame[0]
+    if not count:
+        return None
+    return count * samples / sample_rate
+
+
+# === MP4 / M4A ===
+
+def _iter_boxes(buf, start: int, end: int):
+    pos = start
+    while pos + 8 <= end:
+        size = struct.unpack_from(">I", buf, pos)[0]
+        kind = bytes(buf[pos + 4:pos + 8])
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield kind, pos + header, min(pos + size, end)
+        pos += size
+
+
+def _mp4_duration(buf) -> Optional[float]:
+    if buf[4:8] != b"ftyp":
+        return None
+    for kind, body, box_end in _iter_boxes(buf, 0, len(buf)):
+        if kind != b"moov":
+            continue
+        for sub, sub_body, _ in _iter_boxes(buf, body, box_end):
+            if sub != b"mvhd":
+                continue
+            version = buf[sub_body]
+            if version == 1:
+                timescale, duration = struct.unpack_from(">IQ", buf, sub_body + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", buf, sub_body + 12)
+            if timescale and duration:
+                return duration / timescale
+            return None
+    return None
+
+
+_READERS = {
+    ".flac": _flac_duration,
+    ".opus": _ogg_duration,
+    ".ogg": _ogg_duration,
+    ".mp3": _mp3_duration,
+    ".m4a": _mp4_duration,
+}
+
+
+def read_duration(path: Union[str, Path]) -> Optional[float]:
+    """
+    Returns the duration in seconds of an audio file without spawning ffprobe.
+    Returns None for unknown formats or files that can't be parsed.
+    """
+    reader = _READERS.get(Path(path).suffix.lower())
+    if not reader:
+        return None
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return reader(buf)
+    except (OSError, ValueError, struct.error, IndexError) as e:
+        # Empty files can't be mapped; truncated ones fail to unpack
+        logger.debug(f"Native duration read failed for {path}: {e}")
+        return None
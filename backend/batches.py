@@ -0,0 +1,162 @@
+
+import re
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    from backend.track_pool import track_key
+except ImportError:
+    from track_pool import track_key
+
+logger = logging.getLogger("downloader.batches")
+
+# Item outcomes that end an item for good (LookupError / unavailable video won't change on retry)
+FINAL_OUTCOMES = ("downloaded", "skipped", "not_found")
+
+DEFAULTS = {
+    "initial": 50,             # Items per batch until something has been measured
+    "min": 5,
+    "max": 100,
+    "target_seconds": 600.0,   # Wanted duration of one batch command
+}
+
+# Weight of the newest batch in the moving averages
+EWMA_ALPHA = 0.3
+
+# yt-dlp output template "%(title)s [%(id)s].%(ext)s"
+_VIDEO_ID_IN_NAME_RE = re.compile(r"\[([\w-]{11})\](?:\.\w+)?$")
+
+
+def item_key(value: str) -> str:
+    """Key of a batch input or of a name reported for it: video id or track_key."""
+    if value.startswith("http"):
+        parts = urlsplit(value)
+        video_id = parse_qs(parts.query).get("v", [None])[0]
+        if video_id:
+            return video_id
+        if parts.netloc.endswith("youtu.be"):
+            return parts.path.strip("/")
+        return value
+    match = _VIDEO_ID_IN_NAME_RE.search(value)
+    if match:
+        return match.group(1)
+    return track_key(value)
+
+
+class BatchOutcomes:
+    """
+    Per-item outcomes of one batch queue item (spotdl titles / track URLs,
+    yt-dlp watch URLs), fed by the "item_outcome" updates of LogParser.
+
+    Reported names are matched to inputs by `item_key`. spotdl reports
+    Spotify's "Artist - Title", which may not be the searched title (and
+    track URL inputs have no name at all): such a name is given to the
+    first input without an outcome, since --threads 1 reports songs in
+    input order.
+
+    `unresolved()` is what a retry has to run again: inputs without an
+    outcome or whose last outcome was an error.
+    """
+
+    def __init__(self, inputs: List[str]):
+        self.inputs = list(inputs)
+        self.outcomes: Dict[int, str] = {}
+        self._by_key: Dict[str, List[int]] = {}
+        for i, value in enumerate(self.inputs):
+            self._by_key.setdefault(item_key(value), []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.inputs)
+
+    def record(self, outcome: str, name: Optional[str]) -> Optional[str]:
+        """Stores an outcome and returns the input it was given to (None if none)."""
+        index = None
+        if name:
+            # Bare video ids (archive hits, yt-dlp errors) are keys already
+            for i in self._by_key.get(item_key(name), []) + self._by_key.get(name, []):
+                if self.outcomes.get(i) not in FINAL_OUTCOMES:
+                    index = i
+                    break
+        if index is None and outcome in FINAL_OUTCOMES:
+            index = next((i for i in range(len(self.inputs)) if i not in self.outcomes), None)
+        if index is None:
+            return None
+        self.outcomes[index] = outcome
+        return self.inputs[index]
+
+    def unresolved(self) -> List[str]:
+        return [v for i, v in enumerate(self.inputs) if self.outcomes.get(i) not in FINAL_OUTCOMES]
+
+    def succeeded(self) -> List[str]:
+        return [v for i, v in enumerate(self.inputs) if self.outcomes.get(i) in ("downloaded", "skipped")]
+
+    def summary(self) -> Dict[str, int]:
+        counts = {outcome: 0 for outcome in FINAL_OUTCOMES}
+        for outcome in self.outcomes.values():
+            if outcome in counts:
+                counts[outcome] += 1
+        counts["unresolved"] = len(self.unresolved())
+        return counts
+
+
+class BatchSizer:
+    """
+    Items per batch command, from the per-item time and failure rate seen
+    so far (moving averages over finished batch attempts).
+
+    The size aims at `target_seconds` per command: slow items give smaller
+    batches, so a stop or crash loses less work, fast ones (mostly skips)
+    bigger ones, so fewer interpreter startups. It shrinks further with the
+    share of items left unresolved, which a retry has to run again.
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        self.lock = threading.Lock()
+        self._item_seconds: Optional[float] = None
+        self._failure_rate = 0.0
+        self.configure(settings)
+
+    def configure(self, settings: Optional[Dict[str, Any]] = None):
+        cfg = dict(DEFAULTS)
+        cfg.update(settings or {})
+        with self.lock:
+            try:
+                self.min_size = max(1, int(cfg["min"]))
+                self.max_size = max(self.min_size, int(cfg["max"]))
+                self.initial = min(self.max_size, max(self.min_size, int(cfg["initial"])))
+                self.target_seconds = max(1.0, float(cfg["target_seconds"]))
+            except (TypeError, ValueError):
+                self.min_size, self.max_size = DEFAULTS["min"], DEFAULTS["max"]
+                self.initial, self.target_seconds = DEFAULTS["initial"], DEFAULTS["target_seconds"]
+
+    def observe(self, items: int, seconds: float, unresolved: int):
+        """One finished batch attempt: inputs, wall time, inputs left unresolved."""
+        if items <= 0:
+            return
+        with self.lock:
+            per_item = max(0.0, seconds) / items
+            rate = min(1.0, max(0, unresolved) / items)
+            if self._item_seconds is None:
+                self._item_seconds, self._failure_rate = per_item, rate
+            else:
+                self._item_seconds += EWMA_ALPHA * (per_item - self._item_seconds)
+                self._failure_rate += EWMA_ALPHA * (rate - self._failure_rate)
+
+    def size(self) -> int:
+        with self.lock:
+            if self._item_seconds is None:
+                return self.initial
+            size = self.target_seconds / max(self._item_seconds, 0.01)
+            size *= max(0.25, 1.0 - 2 * self._failure_rate)
+            return int(min(self.max_size, max(self.min_size, size)))
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            item_seconds, failure_rate = self._item_seconds, self._failure_rate
+        return {
+            "size": self.size(),
+            "item_seconds": round(item_seconds, 2) if item_seconds is not None else None,
+            "failure_rate": round(failure_rate, 2),
+        }
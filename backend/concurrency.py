@@ -0,0 +1,229 @@
+
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("downloader.concurrency")
+
+DEFAULTS = {
+    "enabled": False,
+    "min": 1,
+    "initial": 1,
+    "increase_every": 5,       # Healthy songs needed for +1 worker
+    "latency_factor": 2.0,     # Healthy while latency <= best latency * factor
+    "min_success_rate": 0.9,   # Over the last WINDOW outcomes
+    "cooldown_seconds": 30.0,  # Min time between two decreases
+}
+
+WINDOW = 20
+MAX_DECISIONS = 200
+
+
+class AIMDController:
+    """
+    Worker slots for one download job, sized by additive-increase /
+    multiplicative-decrease.
+
+    Workers hold a slot (`acquire()` / `acquire_async()` + `release()`) while
+    they run an item. The limit starts at `initial` and:
+
+      * grows by one after `increase_every` songs in a row while the recent
+        success rate and per-song latency stay healthy (up to `max`);
+      * halves on a congestion signal (Spotify rate limit, AudioProviderError,
+        yt-dlp errors), at most once per `cooldown_seconds` (down to `min`).
+
+    Lowering the limit doesn't interrupt running items; new ones wait until
+    enough slots are released. With `enabled` off the limit stays at `max`.
+
+    `report()` summarises the decisions and songs/minute at each limit for
+    job history.
+    """
+
+    def __init__(self, max_limit: int, settings: Optional[Dict[str, Any]] = None):
+        cfg = dict(DEFAULTS)
+        cfg.update(settings or {})
+        self.enabled = bool(cfg["enabled"])
+        self.max_limit = max(1, int(max_limit))
+        self.min_limit = min(self.max_limit, max(1, int(cfg["min"])))
+        initial = int(cfg["initial"]) if self.enabled else self.max_limit
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.increase_every = max(1, int(cfg["increase_every"]))
+        self.latency_factor = float(cfg["latency_factor"])
+        self.min_success_rate = float(cfg["min_success_rate"])
+        self.cooldown = float(cfg["cooldown_seconds"])
+
+        self.cond = threading.Condition()
+        self.active = 0
+        self._async_waiters = set()  # (loop, asyncio.Event)
+
+        self._start = time.monotonic()
+        self._outcomes = deque(maxlen=WINDOW)  # True = song ok
+        self._latencies = deque(maxlen=WINDOW)
+        self._best_latency: Optional[float] = None
+        self._streak = 0
+        self._last_decrease = float("-inf")
+        self._songs = 0
+        self._failures = 0
+        self.decisions: List[Dict] = []
+        # Time spent / songs done at each limit
+        self._limit_since = self._start
+        self._by_limit: Dict[int, Dict[str, float]] = {}
+
+    # --- Slots ---
+
+    def _try_enter(self) -> bool:
+        # Caller holds cond
+        if self.active < self.limit:
+            self.active += 1
+            return True
+        return False
+
+    def acquire(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """Waits for a free slot (threads). False if stopped first."""
+        with self.cond:
+            while not self._try_enter():
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                self.cond.wait()
+            return True
+
+    async def acquire_async(self, stop_event: Optional[asyncio.Event] = None) -> bool:
+        """acquire() for the asyncio engine."""
+        loop = asyncio.get_running_loop()
+        while True:
+            changed = asyncio.Event()
+            with self.cond:
+                if self._try_enter():
+                    return True
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                waiter = (loop, changed)
+                self._async_waiters.add(waiter)
+            waits = [asyncio.ensure_future(changed.wait())]
+            if stop_event is not None:
+                waits.append(asyncio.ensure_future(stop_event.wait()))
+            try:
+                await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for w in waits:
+                    w.cancel()
+                with self.cond:
+                    self._async_waiters.discard(waiter)
+
+    def release(self):
+        with self.cond:
+            self.active = max(0, self.active - 1)
+            self._notify()
+
+    def wake(self):
+        """Lets waiting workers re-check their stop signal."""
+        with self.cond:
+            self._notify()
+
+    def _notify(self):
+        # Caller holds cond
+        self.cond.notify_all()
+        for loop, changed in list(self._async_waiters):
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                pass  # Loop closed
+
+    # --- Signals ---
+
+    def record_song(self, latency: float):
+        with self.cond:
+            self._songs += 1
+            self._count_song()
+            self._outcomes.append(True)
+            self._latencies.append(latency)
+            self._streak += 1
+            if self.enabled and self._streak >= self.increase_every and self.limit < self.max_limit:
+                avg = sum(self._latencies) / len(self._latencies)
+                # Best latency seen so far, measured over a full streak
+                if self._best_latency is None or avg < self._best_latency:
+                    self._best_latency = avg
+                healthy = (self._success_rate() >= self.min_success_rate and
+                           avg <= self._best_latency * self.latency_factor)
+                if healthy:
+                    self._set_limit(self.limit + 1, "healthy", avg)
+                self._streak = 0
+
+    def record_failure(self):
+        with self.cond:
+            self._failures += 1
+            self._outcomes.append(False)
+            self._streak = 0
+
+    def record_congestion(self, reason: str):
+        with self.cond:
+            self._streak = 0
+            now = time.monotonic()
+            if not self.enabled or self.limit <= self.min_limit or now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self._set_limit(max(self.min_limit, self.limit // 2), reason)
+
+    def _success_rate(self) -> float:
+        return sum(self._outcomes) / len(self._outcomes) if self._outcomes else 1.0
+
+    def _count_song(self):
+        stats = self._by_limit.setdefault(self.limit, {"seconds": 0.0, "songs": 0})
+        stats["songs"] += 1
+
+    def _set_limit(self, new_limit: int, reason: str, latency: Optional[float] = None):
+        # Caller holds cond
+        now = time.monotonic()
+        stats = self._by_limit.setdefault(self.limit, {"seconds": 0.0, "songs": 0})
+        stats["seconds"] += now - self._limit_since
+        self._limit_since = now
+
+        action = "increase" if new_limit > self.limit else "decrease"
+        if len(self.decisions) < MAX_DECISIONS:
+            decision = {
+                "t": round(now - self._start, 1),
+                "action": action,
+                "from": self.limit,
+                "to": new_limit,
+                "reason": reason,
+                "success_rate": round(self._success_rate(), 2),
+            }
+            if latency is not None:
+                decision["latency"] = round(latency, 2)
+            self.decisions.append(decision)
+        logger.info(f"{'📈' if action == 'increase' else '📉'} Concurrencia {self.limit} → {new_limit} ({reason})")
+        self.limit = new_limit
+        self._notify()
+
+    # --- Reporting ---
+
+    def snapshot(self) -> Dict:
+        with self.cond:
+            return {"limit": self.limit, "active": self.active, "max": self.max_limit, "adaptive": self.enabled}
+
+    def report(self) -> Dict:
+        """Decisions and songs/minute at each limit, for job history."""
+        with self.cond:
+            now = time.monotonic()
+            by_limit = {k: dict(v) for k, v in self._by_limit.items()}
+            current = by_limit.setdefault(self.limit, {"seconds": 0.0, "songs": 0})
+            current["seconds"] += now - self._limit_since
+            for stats in by_limit.values():
+                minutes = stats["seconds"] / 60.0
+                stats["seconds"] = round(stats["seconds"], 1)
+                stats["songs_per_minute"] = round(stats["songs"] / minutes, 2) if minutes > 0 else 0.0
+            elapsed = (now - self._start) / 60.0
+            return {
+                "adaptive": self.enabled,
+                "initial": self.decisions[0]["from"] if self.decisions else self.limit,
+                "final": self.limit,
+                "max": self.max_limit,
+                "songs": self._songs,
+                "failures": self._failures,
+                "songs_per_minute": round(self._songs / elapsed, 2) if elapsed > 0 else 0.0,
+                "by_limit": {str(k): v for k, v in sorted(by_limit.items())},
+                "decisions": list(self.decisions),
+            }
@@ -5,6 +5,7 @@ import shutil
 import subprocess
 import threading
 import queue
+import asyncio
 import time
 import os
 import re
@@ -16,14 +17,38 @@ import signal
 # Robust Import for LogParser
 try:
     from backend.log_parser import LogParser
-    from backend.utils import get_safe_filename, DEFAULT_OUTPUT_DIR
+    from backend.m3u import M3UWriter
+    from backend.audio_meta import read_duration
+    from backend.status import StatusPublisher
+    from backend.throttle import TokenBucket
+    from backend.concurrency import AIMDController
+    from backend.track_pool import TrackPool, POOL_DIR_NAME, track_key
+    from backend.spotdl_workers import SpotdlWorkerPool, WorkerUnavailable
+    from backend.batches import BatchOutcomes, BatchSizer
+    from backend.retry import RetryPolicy
+    from backend.proc_reader import LineReader, LineSplitter, CHUNK_SIZE
+    from backend.utils import get_safe_filename, normalize_url, normalize_title, DEFAULT_OUTPUT_DIR
+    import backend.database as db
 except ImportError:
     from log_parser import LogParser
-    from utils import get_safe_filename, DEFAULT_OUTPUT_DIR
+    from m3u import M3UWriter
+    from audio_meta import read_duration
+    from status import StatusPublisher
+    from throttle import TokenBucket
+    from concurrency import AIMDController
+    from track_pool import TrackPool, POOL_DIR_NAME, track_key
+    from spotdl_workers import SpotdlWorkerPool, WorkerUnavailable
+    from batches import BatchOutcomes, BatchSizer
+    from retry import RetryPolicy
+    from proc_reader import LineReader, LineSplitter, CHUNK_SIZE
+    from utils import get_safe_filename, normalize_url, normalize_title, DEFAULT_OUTPUT_DIR
+    import database as db
 
 # Configurar logger localmente para este módulo
 logger = logging.getLogger("downloader.core")
 
+AUDIO_EXTS = (".opus", ".mp3", ".m4a", ".flac", ".ogg")
+
 
 
 class DownloaderManager:
@@ -42,15 +67,52 @@ class DownloaderManager:
             "current_song": None,
             "total_songs": 0,
             "downloaded": 0,
-            "playlist_name": None
+            "playlist_name": None,
+            "playlists": {} # Per-playlist progress of the running job: {id: {name, total, downloaded}}
         } 
         self.config = {}
         self.reload_config()
         
+        # Coalesced, delta-only status frames (see status.py)
+        self.status_publisher = StatusPublisher(
+            self.status, broadcast_func, self.config.get("status_max_rate", 10)
+        )
+        
+        # Shared gate for spotdl launches, paused by Spotify rate limits (see throttle.py)
+        self.throttle = TokenBucket(*self._rate_limit_config())
+        
+        # Items per batch command, learned from finished batches (see batches.py)
+        self.batch_sizer = BatchSizer(self.config.get("batching"))
+        
+        # Worker slots of the running job (see concurrency.py) and its last summary
+        self.pool: Optional[AIMDController] = None
+        # Backoff between attempts of the running job (see retry.py)
+        self.retry_policy = RetryPolicy(self.config.get("retry"))
+        self.last_job_report: Optional[Dict] = None
+        self._track_pool_cache: Optional[TrackPool] = None
+        
+        # Persistent spotdl processes of the running job (see spotdl_workers.py)
+        self.spotdl_workers: Optional[SpotdlWorkerPool] = None
+        
+        # YouTube listing entries queued by the running job: normalize_title -> [(playlist_id, url, video_id)]
+        self._listing_pending: Dict[str, List[tuple]] = {}
+        
         # Stop Control
         self.stop_requested = threading.Event()
         self.active_processes = set() # Track ALL running processes
+        self.active_readers = set() # Output readers to wake up on stop
         self.proc_lock = threading.Lock() # Lock for process set
+        self.status_lock = threading.Lock() # Counters updated by several workers
+        
+        # asyncio engine: app event loop (set on startup) and per-job stop signal
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.active_async_procs = set() # asyncio.subprocess.Process children
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_stop: Optional[asyncio.Event] = None
+        
+        # M3U writers for the running job (one per playlist file)
+        self._m3u_writers: Dict[str, M3UWriter] = {}
+        self._m3u_lock = threading.Lock()
         
         # Si no se pasó output_dir en init, usar el del config
         if not self.output_dir:
@@ -116,7 +178,25 @@ class DownloaderManager:
         
         # Kill ALL active processes safely
         with self.proc_lock:
-            if not self.active_processes:
+            # Readers notice the stop flag right away instead of on the next output line
+            for reader in list(self.active_readers):
+                reader.wake()
+            if self._async_loop and self._async_stop:
+                self._async_loop.call_soon_threadsafe(self._async_stop.set)
+            if self.pool:
+                self.pool.wake()
+            # asyncio children: SIGTERM here, _run_cmd_async escalates to SIGKILL
+            for proc in list(self.active_async_procs):
+                if proc.returncode is None:
+                    try:
+                        logger.info(f"🛑 Deteniendo grupo de procesos {proc.pid}...")
+                        os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
+                    except ProcessLookupError:
+                        pass
+                    except Exception as e:
+                        logger.error(f"Error killing PID {proc.pid}: {e}")
+
+            if not self.active_processes and not self.active_async_procs:
                 logger.debug("No active processes to kill via object reference.")
             
             for proc in list(self.active_processes): # Copy to avoid modification while cleaning
@@ -146,50 +226,124 @@ class DownloaderManager:
     def update_status(self, key: str, value: Any):
         """Helper to update status and broadcast change."""
         self.status[key] = value
-        if self.broadcast_func:
-            self.broadcast_func("status", self.status)
+        self.status_publisher.publish()
 
-    def _get_audio_metadata(self, filename_stub: str) -> tuple[str, int]:
+    def _get_audio_metadata(self, filename_stub: str, directory: Optional[Path] = None) -> tuple[str, int]:
         """
         Resolves full filename (w/ extension) and gets duration.
-        Returns (full_filename, duration_seconds).
-        """
-        # 1. Resolve File
-        target_file = None
-        # Try exact match first
-        p = self.output_dir / filename_stub
-        if p.exists():
-            target_file = p
-        else:
-            # Try searching with common extensions
-            for ext in [".opus", ".mp3", ".m4a", ".flac", ".ogg"]:
-                p = self.output_dir / (filename_stub + ext)
-                if p.exists():
-                    target_file = p
-                    break
-        
+        `directory` is where the file was written (the playlist folder);
+        defaults to output_dir. Returns (full_filename, duration_seconds).
+        """
+        # 1. Resolve File (exact name first, then with audio extensions)
+        target_file = self._find_song_file(directory or self.output_dir, filename_stub)
+
         if not target_file:
             # Fallback: return original stub and 0 duration (valid-ish)
             return filename_stub, 0
             
-        # 2. Get Duration via ffprobe
+        # 2. Cached duration (same path, size and mtime => same file)
+        try:
+            st = target_file.stat()
+            try:
+                cache_key = str(target_file.relative_to(self.output_dir))
+            except ValueError:
+                cache_key = str(target_file)
+            cached = db.get_cached_duration(cache_key, st.st_size, st.st_mtime_ns)
+            if cached is not None:
+                return target_file.name, cached
+        except Exception as e:
+            logger.debug(f"Duration cache unavailable: {e}")
+            st = None
+
+        # 3. Native container parser (no subprocess), ffprobe as fallback
         duration = 0
+        native = read_duration(target_file)
         try:
-            cmd = [
-                "ffprobe", 
-                "-v", "error", 
-                "-show_entries", "format=duration", 
-                "-of", "default=noprint_wrappers=1:nokey=1", 
-                str(target_file)
-            ]
-            res = subprocess.run(cmd, capture_output=True, text=True)
-            if res.returncode == 0:
+            if native is not None:
+                duration = int(native)
+            else:
+                cmd = [
+                    "ffprobe", 
+                    "-v", "error", 
+                    "-show_entries", "format=duration", 
+                    "-of", "default=noprint_wrappers=1:nokey=1", 
+                    str(target_file)
+                ]
+                res = subprocess.run(cmd, capture_output=True, text=True)
+                if res.returncode != 0:
+                    return target_file.name, 0
                 duration = int(float(res.stdout.strip()))
+            if st is not None:
+                db.save_cached_duration(cache_key, st.st_size, st.st_mtime_ns, duration)
         except:
             pass
             
         return target_file.name, duration
 
+    def _get_m3u_writer(self, m3u_path: str, playlist_id: Optional[str] = None) -> M3UWriter:
+        """Returns the job-scoped writer for m3u_path (loaded once per job)."""
+        key = str(m3u_path)
+        with self._m3u_lock:
+            writer = self._m3u_writers.get(key)
+            if writer is None:
+                writer = M3UWriter(key, playlist_id=playlist_id)
+                self._m3u_writers[key] = writer
+            elif playlist_id:
+                writer.playlist_id = playlist_id
+            return writer
+
+    def _close_m3u_writers(self):
+        """Flushes and forgets all M3U writers (job boundary)."""
+        with self._m3u_lock:
+            writers = list(self._m3u_writers.values())
+            self._m3u_writers.clear()
+        for writer in writers:
+            try:
+                writer.close()
+                if writer.playlist_id:
+                    self._index_playlist(writer)
+            except Exception as e:
+                logger.error(f"Failed to flush M3U {writer.path}: {e}")
+
+    def _index_playlist(self, writer: M3UWriter) -> int:
+        """
+        Stores the writer's entries (plus file size/mtime) in the library index.
+        Each entry is resolved in the playlist folder like a download (the line
+        may lack its extension); entries without a duration get it from the file.
+        """
+        base_dir = writer.path.parent
+        tracks = []
+        for duration, line in writer.tracks():
+            size = mtime = 0
+            song = self._find_song_file(base_dir, line)
+            if song:
+                try:
+                    st = song.stat()
+                    size, mtime = st.st_size, int(st.st_mtime)
+                except OSError:
+                    pass
+                if not duration:
+                    _, duration = self._get_audio_metadata(song.name, base_dir)
+            tracks.append({"filename": line, "duration": duration, "size": size, "mtime": mtime})
+        db.replace_tracks(writer.playlist_id, tracks)
+        return len(tracks)
+
+    def index_playlist(self, playlist_id: str, name: str) -> int:
+        """
+        Rebuilds the library index of a playlist from its M3U file.
+        Used for libraries downloaded before the index existed and after
+        maintenance tasks that rewrite M3U files. Returns the track count.
+        """
+        safe_name = get_safe_filename(name)
+        # Check in subfolder first (New Structure), then old root structure
+        m3u_path = self.output_dir / safe_name / f"{safe_name}.m3u8"
+        if not m3u_path.exists():
+            m3u_path = self.output_dir / f"{safe_name}.m3u8"
+        if not m3u_path.exists():
+            db.replace_tracks(playlist_id, [])
+            return 0
+        return self._index_playlist(M3UWriter(str(m3u_path), playlist_id=playlist_id))
+
     def reload_config(self):
         """Recarga la configuración desde el archivo JSON."""
         if not self.config_path.exists():
@@ -198,7 +352,18 @@ class DownloaderManager:
                 "output_dir": "./downloads",
                 "default_tool": "spotdl",
                 "concurrency": 2,
-                "retry": {"attempts": 1, "backoff_seconds": 5},
+                "retry": {"attempts": 1, "backoff_seconds": 5, "max_backoff_seconds": 300, "jitter": True},
+                "status_max_rate": 10,
+                "engine": "threads",
+                "spotify_rate_limit": {"per_minute": 20, "burst": 2},
+                "adaptive_concurrency": {"enabled": False, "min": 1, "initial": 1},
+                "track_pool": {"enabled": False, "key": "title"},
+                "spotdl_workers": {"enabled": False, "max_requests": 50},
+                "youtube_listing": {"full_recheck_hours": 168},
+                "spotify_manifest": {"enabled": False, "ttl_hours": 24},
+                "youtube_mode": "spotdl",
+                "match_cache": {"enabled": False},
+                "batching": {"initial": 50, "min": 5, "max": 100, "target_seconds": 600},
                 "spotdl_extra_args": [],
                 "ytdlp_extra_args": []
             }
@@ -229,6 +394,33 @@ class DownloaderManager:
                 logger.error(f"Error parseando config: {e}")
                 raise
 
+        # Status frame rate can be tuned without restarting
+        if getattr(self, "status_publisher", None):
+            self.status_publisher.max_rate = self.config.get("status_max_rate", 10)
+        if getattr(self, "throttle", None):
+            self.throttle.configure(*self._rate_limit_config())
+        if getattr(self, "retry_policy", None):
+            self.retry_policy.configure(self.config.get("retry"))
+        if getattr(self, "batch_sizer", None):
+            self.batch_sizer.configure(self.config.get("batching"))
+
+    def _rate_limit_config(self) -> tuple:
+        limits = self.config.get("spotify_rate_limit") or {}
+        return limits.get("per_minute", 20), limits.get("burst", 2)
+
+    def _concurrency(self) -> int:
+        try:
+            return max(1, int(self.config.get("concurrency", 1)))
+        except (TypeError, ValueError):
+            return 1
+
+    def worker_snapshot(self) -> Dict:
+        """Worker pool view: the AIMD controller's snapshot, or the configured limit when no job ran yet."""
+        pool = self.pool
+        if pool:
+            return pool.snapshot()
+        return {"limit": self._concurrency(), "active": 0}
+
     def verify_dependencies(self):
         """Verifica que spotdl, yt-dlp y ffmpeg existan."""
         for tool in ["spotdl", "yt-dlp", "ffmpeg"]:
@@ -246,7 +438,274 @@ class DownloaderManager:
         except Exception as e:
             logger.warning(f"Error general verificando dependencias: {e}")
 
-    def _run_cmd(self, cmd: List[str], m3u_path: Optional[str] = None) -> tuple[bool, List[str]]:
+    def _handle_line(self, line: str, tool: str, m3u_path: Optional[str] = None, run: Optional[Dict] = None):
+        """
+        Parses one output line: console log, M3U entry, log/status broadcast.
+        `run` is per-command state (see _new_run): the pool's latency signal,
+        playlists to fan downloads out to and per-playlist progress.
+        """
+        updates = self._parse_output_line(line, tool)
+        song = self._write_song(updates, m3u_path, run)
+        matches = self._take_outcome(updates, run)
+        if matches:
+            self._store_matches(matches, song)
+        self._apply_updates(updates, run)
+
+    async def _handle_line_async(self, line: str, tool: str, m3u_path: Optional[str], run: Dict):
+        """
+        _handle_line for the asyncio engine: parsing, counters and status stay
+        on the loop; only the steps that touch the disk or the DB (metadata,
+        M3U, pool links, match cache) run in a thread.
+        """
+        updates = self._parse_output_line(line, tool)
+        song = None
+        if updates.get("new_filename") and m3u_path:
+            song = await asyncio.to_thread(self._write_song, updates, m3u_path, run)
+        matches = self._take_outcome(updates, run)
+        if matches:
+            await asyncio.to_thread(self._store_matches, matches, song)
+        self._apply_updates(updates, run)
+
+    def _parse_output_line(self, line: str, tool: str) -> Dict:
+        """Parses a line and logs it to the console unless it is known noise."""
+        # 1. PARSE FIRST (same pass flags known noisy lines)
+        updates, is_noise = self.parser.parse_line(line, tool, self.status["state"])
+
+        if not is_noise:
+            # 2. CONSOLE LOGGING (Raw/Normal)
+            # User requested "logs normales" in console
+            logger.info(line)
+
+        # yt-dlp has no "Downloaded" line: the extracted audio file is the finished song
+        if tool == "yt-dlp" and updates.get("new_filename") and "downloaded_increment" not in updates:
+            updates["downloaded_increment"] = 1
+        return updates
+
+    def _write_song(self, updates: Dict, m3u_path: Optional[str], run: Optional[Dict]) -> Optional[tuple]:
+        """
+        3. M3U Generation (Manual for ALL tools). Returns (file name, duration)
+        of the reported song, None if the line reports none.
+        """
+        if not (updates.get("new_filename") and m3u_path):
+            return None
+        song = None
+        try:
+            # Resolve real filename and duration
+            real_name, duration = self._get_audio_metadata(updates["new_filename"], Path(m3u_path).parent)
+
+            # Prepare M3U Entry
+            # Logic: If duration > 0, we found the file (with ext), so stem is safe.
+            # If duration == 0, we failed to find file, so real_name might typically be raw name (no ext).
+            # If raw name has dots (e.g. "Feat."), stem would truncate it. Avoid that.
+            # yt-dlp reports the final name with its audio extension.
+            if duration > 0 or Path(real_name).suffix.lower() in AUDIO_EXTS:
+                title = Path(real_name).stem 
+            else:
+                title = real_name
+
+            song = (real_name, duration)
+
+            # Buffered append (duplicates checked in memory)
+            writer = self._get_m3u_writer(m3u_path)
+            if writer.add(duration, title, f"./{real_name}"):
+                logger.info(f"📝 Added to M3U: {real_name}")
+            else:
+                logger.info(f"⏭ En M3U (Skipping add): {real_name}")
+
+            # Shared store: keep one copy per song, linked from the playlist folder
+            pool = self._track_pool()
+            if pool:
+                pooled = self._find_song_file(Path(m3u_path).parent, real_name)
+                if pooled:
+                    pool.adopt(pooled)
+
+            # Same song wanted by other playlists of this run
+            for extra_m3u in (run or {}).get("fanout", ()):
+                self._fan_out(real_name, duration, title, m3u_path, extra_m3u)
+
+        except Exception as e:
+            logger.error(f"Failed to append to M3U: {e}")
+        return song
+
+    def _take_outcome(self, updates: Dict, run: Optional[Dict]) -> Optional[tuple]:
+        """
+        Records an "item_outcome" in the batch state. Returns the match cache
+        work it implies (name, input, source URL, inputs to forget), or None.
+        """
+        outcome = updates.pop("item_outcome", None)
+        match_url = updates.pop("match_url", None)
+        value = None
+        forget = []
+        if outcome and run is not None and run.get("items") is not None:
+            value = run["items"].record(*outcome)
+            if value is not None and outcome[0] not in ("downloaded", "skipped") and value in run.get("matched", {}):
+                forget.append(value)
+        if not match_url or not self._match_cache_enabled():
+            match_url = None
+        if not forget and not match_url:
+            return None
+        return (outcome[1] if outcome else None, value, match_url, forget)
+
+    def _store_matches(self, matches: tuple, song: Optional[tuple]):
+        """Match cache writes for one line (see _take_outcome)."""
+        name, value, match_url, forget = matches
+        if forget:
+            self._forget_matches(forget)
+        if match_url:
+            self._remember_match(name, value, match_url, song)
+
+    def _apply_updates(self, updates: Dict, run: Optional[Dict]):
+        """Counters, pool signals, log broadcast and the coalesced status frame."""
+        # 4. FRONTEND BROADCAST (Pretty/Modified)
+        if updates:
+            if "rate_limit_wait" in updates:
+                # Hold every worker back, not just this process: no new launch
+                # and no retry before the server's wait is over
+                wait = updates.pop("rate_limit_wait")
+                self.throttle.pause(wait)
+                self.retry_policy.hold(wait)
+
+            congestion = updates.pop("congestion", None)
+            if self.pool:
+                if congestion:
+                    self.pool.record_congestion(congestion)
+                if "downloaded_increment" in updates and run is not None:
+                    now = time.monotonic()
+                    if "new_filename" in updates:
+                        self.pool.record_song(now - run["mark"])
+                    else:
+                        # Counted as processed but not found / unavailable
+                        self.pool.record_failure()
+                    run["mark"] = now
+
+            if "total_songs" in updates and run is not None:
+                # "Found N songs": N replaces the 1 planned for this URL, other queued work stays counted
+                found = updates.pop("total_songs")
+                if run.get("planned") is not None:
+                    delta, run["planned"] = found - run["planned"], None
+                    with self.status_lock:
+                        self.status["total_songs"] += delta
+                        self._bump_playlists(run, "total", delta)
+
+            if "downloaded_increment" in updates:
+                # Several workers may report at once
+                increment = updates.pop("downloaded_increment")
+                with self.status_lock:
+                    self.status["downloaded"] += increment
+                    if run is not None:
+                        self._bump_playlists(run, "downloaded", increment)
+
+            if "log_message" in updates:
+                if self.broadcast_func:
+                    # Send raw message with ANSI codes so frontend can parse colors
+                    self.broadcast_func("log", updates["log_message"])
+
+            for k, v in updates.items():
+                if k not in ["log_message", "log_level", "log_raw", "new_filename"]:
+                    self.status[k] = v
+
+            # Coalesced: at most status_max_rate frames/sec
+            self.status_publisher.publish()
+
+    def _track_pool(self) -> Optional[TrackPool]:
+        """Shared track store under output_dir/.pool, if "track_pool.enabled"."""
+        cfg = self.config.get("track_pool") or {}
+        if not cfg.get("enabled"):
+            return None
+        root = self.output_dir / POOL_DIR_NAME
+        pool = self._track_pool_cache
+        if pool is None or pool.root != root or pool.key_mode != cfg.get("key", "title"):
+            pool = self._track_pool_cache = TrackPool(root, cfg.get("key", "title"))
+        return pool
+
+    def prune_track_pool(self) -> int:
+        """Removes pool files no playlist links to any more (e.g. after deleting a playlist)."""
+        pool = self._track_pool()
+        return pool.gc() if pool else 0
+
+    def _audio_exts(self) -> List[str]:
+        """Audio extensions, configured format first."""
+        fmt = "." + str(self.config.get("format", "opus")).lstrip(".")
+        return [fmt] + [ext for ext in AUDIO_EXTS if ext != fmt]
+
+    def _find_song_file(self, directory: Path, name: str) -> Optional[Path]:
+        """File for a reported song name, which may lack its extension ("Downloaded "Artist - Title"")."""
+        path = directory / name
+        if path.is_file():
+            return path
+        for ext in self._audio_exts():
+            path = directory / (name + ext)
+            if path.is_file():
+                return path
+        return None
+
+    def _new_run(self, task: Optional[Dict] = None) -> Dict:
+        """Per-command state threaded through _handle_line."""
+        task = task or {}
+        return {
+            "mark": time.monotonic(),
+            "fanout": task.get("fanout", []),
+            "playlists": task.get("playlists", []),
+            # Songs counted for this command before spotdl reports "Found N songs"
+            "planned": 1 if isinstance(task.get("url"), str) else None,
+            # Inputs dispatched with a cached match (input -> cache key)
+            "matched": task.get("matched", {}),
+            # Per-input outcomes of a batch, so a retry only runs what's left
+            "items": BatchOutcomes(task["url"]) if isinstance(task.get("url"), list) else None,
+        }
+
+    def _bump_playlists(self, run: Dict, field: str, amount: int):
+        # Caller holds status_lock. Copy-on-write so the publisher sees the change.
+        progress = self.status.get("playlists")
+        if not progress or not run.get("playlists"):
+            return
+        progress = dict(progress)
+        for pid in run["playlists"]:
+            if pid in progress:
+                entry = dict(progress[pid])
+                entry[field] = entry.get(field, 0) + amount
+                progress[pid] = entry
+        self.status["playlists"] = progress
+
+    def _fan_out(self, real_name: str, duration: int, title: str, src_m3u: str, dst_m3u: str):
+        """Puts a song downloaded for one playlist into another playlist's folder and M3U."""
+        src_dir, dst_dir = Path(src_m3u).parent, Path(dst_m3u).parent
+        src = self._find_song_file(src_dir, real_name)
+        if src is None:
+            logger.warning(f"⚠️ No se encontró {real_name} para copiarlo a {dst_dir.name}")
+            return
+        dst = dst_dir / src.name
+        try:
+            if not dst.exists():
+                try:
+                    os.link(src, dst)  # Same filesystem: no extra space
+                except OSError:
+                    shutil.copy2(src, dst)
+            if self._get_m3u_writer(dst_m3u).add(duration, title, f"./{src.name}"):
+                logger.info(f"🔗 Compartido con {dst_dir.name}: {src.name}")
+        except Exception as e:
+            logger.error(f"Error copiando {src.name} a {dst_dir}: {e}")
+
+    def _command_succeeded(self, returncode: int, tool: str, out_lines: List[str]) -> bool:
+        # Determine success
+        is_success = (returncode == 0)
+        
+        # YT-DLP Soft Success: Playlist finished but some videos were unavailable (exit code != 0)
+        if not is_success and tool == "yt-dlp":
+            # Scan for explicit "Finished" message
+            if any("Finished downloading playlist" in l for l in out_lines):
+                logger.info("✅ Playlist completada (con errores de vídeos no disponibles).")
+                is_success = True
+                
+        # SpotDL Soft Success: If sync file saved, we are good
+        if not is_success and tool == "spotdl":
+            if any("Saved results to" in l and ".spotdl" in l for l in out_lines):
+                 logger.info("✅ SpotDL finalizado correctamente (Sync guardado).")
+                 is_success = True
+
+        return is_success
+
+    def _run_cmd(self, cmd: List[str], m3u_path: Optional[str] = None, run: Optional[Dict] = None) -> tuple[bool, List[str]]:
         if self.stop_requested.is_set():
             return False, []
             
@@ -254,167 +713,46 @@ class DownloaderManager:
         logger.debug(f"[CMD] {cmd_str}")
         
         tool = "spotdl" if "spotdl" in cmd[0] else "yt-dlp"
+        if tool == "spotdl" and self.spotdl_workers and not self.spotdl_workers.unavailable:
+            return self._run_in_worker(cmd, m3u_path, run)
         
         proc = None
+        reader = None
         try:
              # Start process w/ new session for group killing
+             # Binary pipe: LineReader reads big chunks and splits lines itself
              proc = subprocess.Popen(
                  cmd, 
                  stdout=subprocess.PIPE, 
                  stderr=subprocess.STDOUT, 
-                 text=True,
                  start_new_session=True 
              )
+             reader = LineReader(proc.stdout, self.stop_requested)
              
              with self.proc_lock:
                  self.active_processes.add(proc)
+                 self.active_readers.add(reader)
              
              out_lines = []
-             while True:
-                 # Check stop flag aggressively
-                 if self.stop_requested.is_set():
-                     logger.info("🛑 Interrupción de comando detectada.")
-                     try:
-                         # Ensure we kill this specific process immediately if stop is set
-                         os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-                     except: pass
-                     break
-                     
-                 # Check if process ended
-                 if proc.poll() is not None:
-                     # Read remainder
-                     rem = proc.stdout.read()
-                     if rem:
-                         for l in rem.splitlines():
-                             if l.strip(): out_lines.append(l.strip())
-                     break
-                     
-                 line = proc.stdout.readline()
-                 
-                 if not line and proc.poll() is not None:
-                     break
-                     
-                 if not line:
-                     continue
-                
+             run = run if run is not None else self._new_run()
+             run["mark"] = time.monotonic()
+             # Sleeps until there is output, EOF or a stop signal (no polling)
+             for line in reader:
                  line = line.strip()
                  if line:
                      out_lines.append(line)
                      
-                     # 1. PARSE FIRST
-                     updates = self.parser.parse(line, tool, self.status["state"])
-                     
-                     # 2. LOGGING STRATEGY
-                     is_error = "ERROR:" in line or "WARNING:" in line
-                     has_update = bool(updates) and "log_message" in updates
-                     
-                     # Explicitly ignore known noisy lines
-                     is_noise = (
-                        "Downloading webpage" in line or 
-                        "Extracting URL" in line or 
-                        "m3u8 information" in line or
-                        "android sdkless" in line or
-                        "web safari" in line or
-                        "[ExtractAudio]" in line or
-                        "JavaScript runtime" in line or
-                        "web_safari client" in line or
-                        "web client" in line
-                     )
-
-                     if not is_noise:
-                         # 2. CONSOLE LOGGING (Raw/Normal)
-                         # User requested "logs normales" in console
-                         logger.info(line)
-                    
-                     # 3. M3U Generation (Manual for ALL tools)
-                     if updates.get("new_filename") and m3u_path:
-                         try:
-                             # Resolve real filename and duration
-                             real_name, duration = self._get_audio_metadata(updates["new_filename"])
-                             
-                             # Prepare M3U Entry
-                             # Logic: If duration > 0, we found the file (with ext), so stem is safe.
-                             # If duration == 0, we failed to find file, so real_name might typically be raw name (no ext).
-                             # If raw name has dots (e.g. "Feat."), stem would truncate it. Avoid that.
-                             if duration > 0:
-                                 title = Path(real_name).stem 
-                             else:
-                                 title = real_name
-
-                             extinf_line = f"#EXTINF:{duration},{title}"
-                             file_line = f"./{real_name}"
-                             
-                             # Read current M3U content
-                             current_lines = []
-                             has_header = False
-                             
-                             if os.path.exists(m3u_path):
-                                 with open(m3u_path, "r", encoding="utf-8") as f:
-                                     raw_lines = f.read().splitlines()
-                                     current_lines = [l.strip() for l in raw_lines if l.strip()]
-                                     if raw_lines and raw_lines[0].strip() == "#EXTM3U":
-                                         has_header = True
-                             
-                             # Check duplicates (check if filename line exists)
-                             if file_line not in current_lines:
-                                 with open(m3u_path, "a", encoding="utf-8") as f:
-                                     # Add Header if missing/new file
-                                     if not has_header and os.path.getsize(m3u_path) == 0:
-                                          f.write("#EXTM3U\n")
-                                     elif not has_header and not os.path.exists(m3u_path): # Should be covered by size check but safe
-                                          f.write("#EXTM3U\n")
-
-                                     # Defensive newline if needed (not empty file)
-                                     if os.path.exists(m3u_path) and os.path.getsize(m3u_path) > 0:
-                                         # Check last char? simplified: just Ensure usage of new lines
-                                         f.write("\n")
-                                     
-                                     f.write(f"{extinf_line}\n{file_line}")
-                                     
-                                 logger.info(f"📝 Added to M3U: {real_name}")
-                             else:
-                                 logger.info(f"⏭ En M3U (Skipping add): {real_name}")
-                                 
-                         except Exception as e:
-                             logger.error(f"Failed to append to M3U: {e}")
-
-                     # 4. FRONTEND BROADCAST (Pretty/Modified)
-                     if updates:
-                         if "downloaded_increment" in updates:
-                             self.status["downloaded"] += updates.pop("downloaded_increment")
-                             
-                         if "log_message" in updates:
-                             if self.broadcast_func:
-                                 # Send raw message with ANSI codes so frontend can parse colors
-                                 self.broadcast_func("log", updates["log_message"])
-                         
-                         for k, v in updates.items():
-                             if k not in ["log_message", "log_level", "log_raw", "new_filename"]:
-                                 self.status[k] = v
-                        
-                         # CRITICAL: Broadcast status immediately after update
-                         if self.broadcast_func:
-                             self.broadcast_func("status", self.status)
+                     self._handle_line(line, tool, m3u_path, run)
 
-             proc.wait()
-             
-             # Determine success
-             is_success = (proc.returncode == 0)
-             
-             # YT-DLP Soft Success: Playlist finished but some videos were unavailable (exit code != 0)
-             if not is_success and tool == "yt-dlp":
-                 # Scan for explicit "Finished" message
-                 if any("Finished downloading playlist" in l for l in out_lines):
-                     logger.info("✅ Playlist completada (con errores de vídeos no disponibles).")
-                     is_success = True
-                     
-             # SpotDL Soft Success: If sync file saved, we are good
-             if not is_success and tool == "spotdl":
-                 if any("Saved results to" in l and ".spotdl" in l for l in out_lines):
-                      logger.info("✅ SpotDL finalizado correctamente (Sync guardado).")
-                      is_success = True
+             if reader.stopped:
+                 logger.info("🛑 Interrupción de comando detectada.")
+                 try:
+                     # Ensure we kill this specific process immediately if stop is set
+                     os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
+                 except: pass
 
-             return is_success, out_lines
+             proc.wait()
+             return self._command_succeeded(proc.returncode, tool, out_lines), out_lines
              
         except Exception as e:
             logger.error(f"Error executing command: {e}")
@@ -427,237 +765,577 @@ class DownloaderManager:
             if proc:
                 with self.proc_lock:
                     self.active_processes.discard(proc)
+                    self.active_readers.discard(reader)
+                if reader:
+                    reader.close()
+                try:
+                    proc.stdout.close()
+                except Exception:
+                    pass
+            # Batch boundary: persist buffered M3U entries
+            if m3u_path:
+                try:
+                    self._get_m3u_writer(m3u_path).flush()
+                except Exception as e:
+                    logger.error(f"Failed to append to M3U: {e}")
 
-    def _download_worker(self, q: queue.Queue, results: List[Dict]):
-        retry_cfg = self.config.get("retry", {"attempts": 1, "backoff_seconds": 5})
-        max_att = retry_cfg.get("attempts", 1)
-
-        while True:
-            item = q.get()
-            if item is None:
-                q.task_done()
-                break
+    def _run_in_worker(self, cmd: List[str], m3u_path: Optional[str] = None, run: Optional[Dict] = None) -> tuple[bool, List[str]]:
+        """
+        _run_cmd for a spotdl command, run by a persistent worker that already
+        imported spotdl (no interpreter + spotdl startup per command). The
+        worker is tracked like a subprocess, so stop() kills it the same way.
+        """
+        workers = self.spotdl_workers
+        worker = None
+        fallback = False
+        out_lines = []
+        try:
+            worker = workers.acquire()
+            with self.proc_lock:
+                self.active_processes.add(worker.proc)
+                self.active_readers.add(worker.reader)
             
-            # CRITICAL: If stopped, drain the queue
-            if self.stop_requested.is_set():
-                q.task_done()
-                continue
-
-            # Unpack item (supports optional m3u_name)
-            if len(item) == 3:
-                url, tool, m3u_name = item
-            else:
-                url, tool = item
-                m3u_name = None
-
-            attempts = 0
-            success = False
+            run = run if run is not None else self._new_run()
+            run["mark"] = time.monotonic()
             
-            extra_args = self.config.get("spotdl_extra_args", [])
+            def on_line(line: str):
+                line = line.strip()
+                if line:
+                    out_lines.append(line)
+                    self._handle_line(line, "spotdl", m3u_path, run)
+            
+            returncode = worker.run(cmd[1:], on_line)
+            if returncode is None:
+                # Stopped or died mid-command: the worker is discarded
+                if worker.reader.stopped:
+                    logger.info("🛑 Interrupción de comando detectada.")
+                    try:
+                        os.killpg(os.getpgid(worker.proc.pid), signal.SIGTERM)
+                    except: pass
+                try:
+                    returncode = worker.proc.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    try:
+                        os.killpg(os.getpgid(worker.proc.pid), signal.SIGKILL)
+                    except: pass
+                    returncode = worker.proc.wait()
+            return self._command_succeeded(returncode, "spotdl", out_lines), out_lines
+        
+        except WorkerUnavailable as e:
+            if not workers.unavailable:
+                workers.unavailable = True
+                logger.warning(f"⚠️ Workers de spotdl no disponibles ({e}): se usa un proceso por comando.")
+            fallback = True
+        except Exception as e:
+            logger.error(f"Error executing command: {e}")
+            return False, []
+        finally:
+            if worker:
+                with self.proc_lock:
+                    self.active_processes.discard(worker.proc)
+                    self.active_readers.discard(worker.reader)
+                workers.release(worker)
+            # Batch boundary: persist buffered M3U entries
+            if m3u_path:
+                try:
+                    self._get_m3u_writer(m3u_path).flush()
+                except Exception as e:
+                    logger.error(f"Failed to append to M3U: {e}")
         
-            # Command Selection
-            cmd = []
-            m3u_arg = None
+        if fallback:
+            return self._run_cmd(cmd, m3u_path, run)
+
+    async def _run_cmd_async(self, cmd: List[str], m3u_path: Optional[str] = None, run: Optional[Dict] = None) -> tuple[bool, List[str]]:
+        """
+        _run_cmd for the asyncio engine: the child's output is read, parsed and
+        published on the event loop (see _handle_line_async).
+        """
+        if self.stop_requested.is_set():
+            return False, []
             
-            # CRITICAL: Playlist Isolation
-            # Ensure output_dir is absolute and exists
-            self.output_dir = self.output_dir.resolve()
+        logger.debug(f"[CMD] {' '.join(cmd)}")
+        
+        tool = "spotdl" if "spotdl" in cmd[0] else "yt-dlp"
+        if tool == "spotdl" and self.spotdl_workers and not self.spotdl_workers.unavailable:
+            # Worker pipes are read with LineReader, off the loop
+            return await asyncio.to_thread(self._run_in_worker, cmd, m3u_path, run)
+        
+        proc = None
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                start_new_session=True
+            )
+            with self.proc_lock:
+                self.active_async_procs.add(proc)
             
-            # HARD FIX: Double check for double /app/app which shouldn't happen with new logic but just in case
-            s_out = str(self.output_dir)
-            if "/app/app/" in s_out:
-                new_out = s_out.replace("/app/app/", "/app/")
-                logger.warning(f"⚠️ Caught runtime double-app path: {s_out} -> {new_out}")
-                self.output_dir = Path(new_out)
+            splitter = LineSplitter()
+            out_lines = []
+            run = run if run is not None else self._new_run()
+            run["mark"] = time.monotonic()
+            stopped = False
+            stop_wait = asyncio.ensure_future(self._async_stop.wait())
             try:
-                if not self.output_dir.exists():
-                     self.output_dir.mkdir(parents=True, exist_ok=True)
-            except Exception as e:
-                logger.error(f"Failed to ensure root output dir {self.output_dir}: {e}")
+                while True:
+                    read = asyncio.ensure_future(proc.stdout.read(CHUNK_SIZE))
+                    await asyncio.wait({read, stop_wait}, return_when=asyncio.FIRST_COMPLETED)
+                    if not read.done():
+                        read.cancel()
+                        stopped = True
+                        break
+                    chunk = read.result()
+                    for line in (splitter.feed(chunk) if chunk else splitter.flush()):
+                        line = line.strip()
+                        if line:
+                            out_lines.append(line)
+                            await self._handle_line_async(line, tool, m3u_path, run)
+                    if not chunk:
+                        break
+            finally:
+                stop_wait.cancel()
 
-            target_dir = self.output_dir
-            if m3u_name:
-                # Sanitize using centralized logic
-                safe_pl_name = get_safe_filename(m3u_name)
-                    
-                target_dir = self.output_dir / safe_pl_name
-                
-                # ROBUST MKDIR
+            if stopped:
+                logger.info("🛑 Interrupción de comando detectada.")
+                try:
+                    os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
+                except: pass
+                try:
+                    await asyncio.wait_for(proc.wait(), timeout=2)
+                except asyncio.TimeoutError:
+                    try:
+                        os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
+                    except: pass
+
+            await proc.wait()
+            return self._command_succeeded(proc.returncode, tool, out_lines), out_lines
+
+        except Exception as e:
+            logger.error(f"Error executing command: {e}")
+            if proc and proc.returncode is None:
                 try:
-                    target_dir.mkdir(parents=True, exist_ok=True)
+                    proc.kill()
+                    await proc.wait()
+                except: pass
+            return False, []
+        finally:
+            if proc:
+                with self.proc_lock:
+                    self.active_async_procs.discard(proc)
+            # Batch boundary: persist buffered M3U entries
+            if m3u_path:
+                try:
+                    await asyncio.to_thread(self._get_m3u_writer(m3u_path).flush)
                 except Exception as e:
-                    logger.error(f"Error creating dir {target_dir}: {e}")
+                    logger.error(f"Failed to append to M3U: {e}")
 
-                m3u_arg = f"{target_dir}/{safe_pl_name}.m3u8"
-                
-                # CRITICAL FIX: Ensure the PARENT directory of the M3U file exists before SpotDL tries to write to it
-                # This handles cases where SpotDL resolves paths weirdly or target_dir failed silently
+    def _prepare_task(self, item, results: List[Dict]) -> Optional[Dict]:
+        """
+        Builds the command for a queue item (url_or_titles, tool[, m3u_name[, playlist_id[, fanout]]]).
+        `fanout` lists other (m3u_name, playlist_id) targets that get the same songs.
+        Returns None if the item can't run (already logged / added to results).
+        """
+        # Unpack item (supports optional m3u_name / playlist_id / fanout)
+        playlist_id = None
+        fanout = []
+        if len(item) == 5:
+            url, tool, m3u_name, playlist_id, fanout = item
+        elif len(item) == 4:
+            url, tool, m3u_name, playlist_id = item
+        elif len(item) == 3:
+            url, tool, m3u_name = item
+        else:
+            url, tool = item
+            m3u_name = None
+
+        extra_args = self.config.get("spotdl_extra_args", [])
+
+        # Command Selection
+        cmd = []
+        m3u_arg = None
+
+        # CRITICAL: Playlist Isolation
+        # Ensure output_dir is absolute and exists
+        self.output_dir = self.output_dir.resolve()
+
+        # HARD FIX: Double check for double /app/app which shouldn't happen with new logic but just in case
+        s_out = str(self.output_dir)
+        if "/app/app/" in s_out:
+            new_out = s_out.replace("/app/app/", "/app/")
+            logger.warning(f"⚠️ Caught runtime double-app path: {s_out} -> {new_out}")
+            self.output_dir = Path(new_out)
+        try:
+            if not self.output_dir.exists():
+                 self.output_dir.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            logger.error(f"Failed to ensure root output dir {self.output_dir}: {e}")
+
+        target_dir, m3u_arg = self._playlist_target(m3u_name, playlist_id)
+        fanout_args = [self._playlist_target(name, pid)[1] for name, pid in fanout]
+
+        if tool == "spotdl":
+            # Construir comando (SpotDL)
+            import hashlib
+            # Sync dir inside the target folder to keep it self-contained
+            sync_dir = target_dir / ".sync"
+
+            if not sync_dir.exists():
                 try:
-                    Path(m3u_arg).parent.mkdir(parents=True, exist_ok=True)
-                except:
-                    pass
+                    sync_dir.mkdir(parents=True, exist_ok=True)
+                except Exception as e:
+                    logger.warning(f"⚠️ No se pudo crear directorio .sync: {e}")
+
+            # If url is a search query (no protocol), hash might be ugly, but functional
+            if isinstance(url, list):
+                 # For batch, hash the first item + count to be unique enough
+                 url_hash = hashlib.md5((url[0] + str(len(url))).encode("utf-8")).hexdigest()
+            else: 
+                 url_hash = hashlib.md5(url.encode("utf-8")).hexdigest()
+
+            save_file = sync_dir / f"{url_hash}.spotdl"
+
+            # Obtener formato y bitrate
+            fmt = self.config.get("format", "opus")
+            bitrate = self.config.get("bitrate", "192k")
+
+            # Determine Mode: URL vs Search Query
+            # Hybrid M3U Logic
+            # If URL (Spotify Playlist/Track): Use SpotDL native --m3u (User prefers this)
+            # If Title (YouTube Extraction): Use Manual Append (SpotDL overwrite fix)
+            # Hybrid M3U Logic
+            run_cmd_m3u_arg = None 
+
+            # Input Handling (Batch vs Single)
+            inputs = []
+            is_batch = isinstance(url, list)
+            if is_batch:
+                inputs = url
+                # For batches (TITLES), we are definitely in Manual Mode
+                # No sync file, No native M3U
+                run_cmd_m3u_arg = m3u_arg
+                # Use first title for display/hash if needed, or just "Batch" in logging
             else:
-                 # Single song or untracked -> root downloads
-                 target_dir = self.output_dir
-                 if m3u_name: 
-                     pass
+                inputs = [url]
 
-            if tool == "spotdl":
-                # Construir comando (SpotDL)
-                import hashlib
-                # Sync dir inside the target folder to keep it self-contained
-                sync_dir = target_dir / ".sync"
-                
-                if not sync_dir.exists():
-                    try:
-                        sync_dir.mkdir(parents=True, exist_ok=True)
-                    except Exception as e:
-                        logger.warning(f"⚠️ No se pudo crear directorio .sync: {e}")
-                
-                # If url is a search query (no protocol), hash might be ugly, but functional
-                if isinstance(url, list):
-                     # For batch, hash the first item + count to be unique enough
-                     url_hash = hashlib.md5((url[0] + str(len(url))).encode("utf-8")).hexdigest()
-                else: 
-                     url_hash = hashlib.md5(url.encode("utf-8")).hexdigest()
-                     
-                save_file = sync_dir / f"{url_hash}.spotdl"
-                
-                # Obtener formato y bitrate
-                fmt = self.config.get("format", "opus")
-                bitrate = self.config.get("bitrate", "192k")
-                
-                # Determine Mode: URL vs Search Query
-                # Hybrid M3U Logic
-                # If URL (Spotify Playlist/Track): Use SpotDL native --m3u (User prefers this)
-                # If Title (YouTube Extraction): Use Manual Append (SpotDL overwrite fix)
-                # Hybrid M3U Logic
-                run_cmd_m3u_arg = None 
-                
-                # Input Handling (Batch vs Single)
-                inputs = []
-                is_batch = isinstance(url, list)
-                if is_batch:
-                    inputs = url
-                    # For batches (TITLES), we are definitely in Manual Mode
-                    # No sync file, No native M3U
-                    run_cmd_m3u_arg = m3u_arg
-                    # Use first title for display/hash if needed, or just "Batch" in logging
-                else:
-                    inputs = [url]
-                
-                # Determine Mode (URL vs Title)
-                # If ANY input starts with http, treat as URL mode (likely single)
-                # If batch, assume Titles (Manual)
-                is_url_mode = any(u.startswith("http") for u in inputs)
-                
-                # Base Command
-                cmd.extend(["spotdl", "download"])
-                cmd.extend(inputs) # Add all titles/urls
-                
-                cmd.extend([
-                    "--output", f"{target_dir}/{{artist}} - {{title}}",
-                    "--format", fmt,
-                    "--bitrate", bitrate,
-                    "--restrict", "ascii", # Force ASCII filenames
-                    "--threads", "1", # CRITICAL: Force sequential processing to avoid FFmpeg/Resource errors
-                ])
-
-                if is_url_mode and not is_batch:
-                    # Native Mode (Single Spotify Playlist/URL)
-                    cmd.extend(["--save-file", str(save_file)])
-                    # CRITICAL: Do NOT use native --m3u. SpotDL mangles absolute paths (creates /app/app/...).
-                    # We rely 100% on our robust manual M3U generator in _run_cmd.
-                    # cmd.extend(["--m3u", m3u_arg])
-                    run_cmd_m3u_arg = m3u_arg
-                else:
-                    # Manual Mode (Titles or Batch)
-                    run_cmd_m3u_arg = m3u_arg
+            # Determine Mode (URL vs Title)
+            # If ANY input starts with http, treat as URL mode (likely single)
+            # If batch, assume Titles (Manual)
+            is_url_mode = any(u.startswith("http") for u in inputs)
 
-                
-                # Check for cookies.txt
-                cookies_path = self.config_path.parent / "cookies.txt"
-                if cookies_path.exists():
-                    cmd.extend(["--cookie-file", str(cookies_path)])
-                    
-                cmd.extend(extra_args)
+            # Base Command
+            cmd.extend(["spotdl", "download"])
+            # Songs with a cached match are downloaded from it, without searching
+            matched = {}
+            if is_batch and self._match_cache_enabled():
+                inputs, matched = self._apply_matches(inputs)
+            cmd.extend(inputs) # Add all titles/urls
 
+            cmd.extend([
+                "--output", f"{target_dir}/{{artist}} - {{title}}",
+                "--format", fmt,
+                "--bitrate", bitrate,
+                "--restrict", "ascii", # Force ASCII filenames
+                "--threads", "1", # CRITICAL: Force sequential processing to avoid FFmpeg/Resource errors
+            ])
 
+            if is_url_mode and not is_batch:
+                # Native Mode (Single Spotify Playlist/URL)
+                cmd.extend(["--save-file", str(save_file)])
+                # CRITICAL: Do NOT use native --m3u. SpotDL mangles absolute paths (creates /app/app/...).
+                # We rely 100% on our robust manual M3U generator in _run_cmd.
+                # cmd.extend(["--m3u", m3u_arg])
+                run_cmd_m3u_arg = m3u_arg
             else:
-                 # Fallback (Should not happen with current logic, but keeps safety)
-                 logger.error(f"Herramienta no soportada o eliminada: {tool}")
-                 q.task_done()
-                 continue
+                # Manual Mode (Titles or Batch)
+                run_cmd_m3u_arg = m3u_arg
+
+
+            # Check for cookies.txt
+            cookies_path = self.config_path.parent / "cookies.txt"
+            if cookies_path.exists():
+                cmd.extend(["--cookie-file", str(cookies_path)])
+
+            cmd.extend(extra_args)
+
+        elif tool == "yt-dlp":
+            # Direct YouTube mode: videos by id, finished ids recorded in the playlist archive
+            archive = self._archive_path(m3u_name) if m3u_name else target_dir / ".sync" / "ytdlp-archive.txt"
+            try:
+                archive.parent.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo crear directorio .sync: {e}")
+
+            fmt = self.config.get("format", "opus")
+            bitrate = str(self.config.get("bitrate", "192k")).upper()
+
+            cmd.extend(["yt-dlp", "--extract-audio",
+                        "--audio-format", fmt,
+                        "--audio-quality", bitrate,
+                        "--output", f"{target_dir}/%(title)s [%(id)s].%(ext)s",
+                        "--download-archive", str(archive),
+                        "--no-playlist",
+                        "--embed-metadata"])
+            ffmpeg_path = self.config.get("ffmpeg_path", "ffmpeg")
+            if ffmpeg_path and ffmpeg_path != "ffmpeg":
+                cmd.extend(["--ffmpeg-location", ffmpeg_path])
+
+            cookies_path = self.config_path.parent / "cookies.txt"
+            if cookies_path.exists():
+                cmd.extend(["--cookies", str(cookies_path)])
+
+            cmd.extend(self.config.get("ytdlp_extra_args", []))
+            cmd.extend(url if isinstance(url, list) else [url])
+            run_cmd_m3u_arg = m3u_arg
+            matched = {}
+
+        else:
+             # Fallback (Should not happen with current logic, but keeps safety)
+             logger.error(f"Herramienta no soportada o eliminada: {tool}")
+             return None
+
+        if not cmd:
+            logger.error(f"Herramienta desconocida: {tool}")
+            results.append({"url": url, "status": "failed", "attempts": self.retry_policy.attempts, "error": "Unknown tool"})
+            return None
+
+        return {
+            "item": item, "url": url, "tool": tool, "cmd": cmd,
+            "m3u_name": m3u_name, "m3u_arg": m3u_arg,
+            "run_m3u": run_cmd_m3u_arg,  # Triggers manual M3U append in _run_cmd
+            "matched": matched,
+            "fanout": [a for a in fanout_args if a],
+            "playlists": [pid for pid in [playlist_id] + [pid for _, pid in fanout] if pid],
+        }
+
+    def _playlist_target(self, m3u_name: Optional[str], playlist_id: Optional[str] = None) -> tuple:
+        """(target_dir, m3u_path) for a playlist; m3u_path is None without a name."""
+        if not m3u_name:
+            # Single song or untracked -> root downloads
+            return self.output_dir, None
+
+        # Sanitize using centralized logic
+        safe_pl_name = get_safe_filename(m3u_name)
+
+        target_dir = self.output_dir / safe_pl_name
+
+        # ROBUST MKDIR
+        try:
+            target_dir.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            logger.error(f"Error creating dir {target_dir}: {e}")
+
+        m3u_arg = f"{target_dir}/{safe_pl_name}.m3u8"
+
+        # CRITICAL FIX: Ensure the PARENT directory of the M3U file exists before SpotDL tries to write to it
+        # This handles cases where SpotDL resolves paths weirdly or target_dir failed silently
+        try:
+            Path(m3u_arg).parent.mkdir(parents=True, exist_ok=True)
+        except:
+            pass
+
+        # Register the playlist owning this M3U (library index)
+        self._get_m3u_writer(m3u_arg, playlist_id)
+        return target_dir, m3u_arg
+
+    def _announce_attempt(self, task: Dict, attempts: int):
+        url, tool = task["url"], task["tool"]
+        if isinstance(url, list):
+             msg = f"✨ Procesando lote de {len(url)} canciones | 🔧 {tool} (Intento {attempts})"
+        else:
+             msg = f"✨ Procesando: {url} | 🔧 {tool} (Intento {attempts})"
+        
+        logger.info(msg)
+        if self.broadcast_func: self.broadcast_func("log", msg)
+
+    def _mark_listing_done(self, values: List[str]):
+        """Listing entries of these batch inputs count as downloaded from now on."""
+        if not self._listing_pending:
+            return
+        done = []
+        for value in values:
+            done.extend(self._listing_pending.pop(self._input_key(value), []))
+        try:
+            db.mark_yt_entries_done(done)
+        except Exception as e:
+            logger.error(f"Error actualizando el listado de YouTube: {e}")
+
+    def _on_task_success(self, task: Dict, run: Optional[Dict] = None):
+        # Every input of the batch, also those resolved by earlier attempts
+        if isinstance(task["url"], list):
+            items = (run or {}).get("items")
+            self._mark_listing_done(items.inputs if items is not None else task["url"])
+
+        # Post-process M3U8 to fix paths (owner playlist and fan-out copies)
+        for m3u_arg in ([task["m3u_arg"]] if task["m3u_name"] else []) + task.get("fanout", []):
+            try:
+                # m3u_arg is the full path to the m3u8 file
+                writer = self._get_m3u_writer(m3u_arg)
+                if writer.normalize_paths():
+                    logger.info(f"Corregidas rutas en M3U: {m3u_arg}")
+                    if writer.playlist_id:
+                        self._index_playlist(writer)
+            except Exception as e:
+                logger.error(f"Error procesando M3U: {e}")
+
+    def _settle_attempt(self, task: Dict, run: Dict, success: bool, started: float) -> tuple:
+        """
+        (done, task for the next attempt) after one attempt of a queue item.
+        A failed batch is retried with its unresolved inputs only; one whose
+        inputs all got a final outcome (e.g. spotdl exiting 1 after a
+        LookupError) is done.
+        """
+        items = run.get("items")
+        if items is None:
+            return success, task
+        left = items.unresolved()
+        self.batch_sizer.observe(len(task["url"]), time.monotonic() - started, len(left))
+        if success:
+            return True, task
+        # Cached matches that didn't download are searched again on the retry
+        self._forget_matches([value for value in left if value in run.get("matched", {})])
+        if not left:
+            logger.info("✅ Lote completado: todas las canciones resueltas pese al código de salida.")
+            return True, task
+        if len(left) < len(task["url"]):
+            retry = self._prepare_task((left, *task["item"][1:]), [])
+            if retry is not None:
+                msg = f"🔁 {len(task['url']) - len(left)} canciones del lote ya resueltas: se reintentan solo {len(left)}."
+                logger.info(msg)
+                if self.broadcast_func: self.broadcast_func("log", msg)
+                return False, retry
+        return False, task
+
+    def _task_result(self, task: Dict, run: Dict, status: str, attempts: int) -> Dict:
+        items = run.get("items")
+        result = {"url": items.inputs if items is not None else task["url"], "status": status, "attempts": attempts, "playlists": task["playlists"]}
+        if items is not None:
+            result["items"] = items.summary()
+        return result
+
+    def _download_worker(self, q: queue.Queue, results: List[Dict]):
+        while True:
+            item = q.get()
+            if item is None:
+                q.task_done()
+                break
             
-            if not cmd:
-                logger.error(f"Herramienta desconocida: {tool}")
-                results.append({"url": url, "status": "failed", "attempts": max_att, "error": "Unknown tool"})
+            # CRITICAL: If stopped, drain the queue
+            # Otherwise wait for a worker slot (the pool may have shrunk)
+            if self.stop_requested.is_set() or not self.pool.acquire(self.stop_requested):
                 q.task_done()
                 continue
+
+            try:
+                self._download_item(item, results)
+            finally:
+                self.pool.release()
+            q.task_done()
+
+    def _download_item(self, item, results: List[Dict]):
+        """Runs one queue item with retries (threads engine)."""
+        max_att = self.retry_policy.attempts
+        task = self._prepare_task(item, results)
+        if task is None:
+            return
+        url = task["url"]
+        run = self._new_run(task)
+
+        attempts = 0
+        success = False
+        
+        # Set state to running for this url
+        self.status["state"] = "processing"
+        
+        while attempts < max_att:
+            if self.stop_requested.is_set():
+                logger.info("🛑 Deteniendo bucle principal...")
+                break
+                
+            if task["tool"] == "spotdl" and not self.throttle.acquire(self.stop_requested):
+                break
+                
+            attempts += 1
+            self._announce_attempt(task, attempts)
             
-            # Set state to running for this url
-            self.status["state"] = "processing"
+            # run_m3u triggers manual append only if needed
+            started = time.monotonic()
+            success, logs = self._run_cmd(task["cmd"], task["run_m3u"], run)
             
-            while attempts < max_att:
-                if self.stop_requested.is_set():
-                    logger.info("🛑 Deteniendo bucle principal...")
-                    break
-                    
-                attempts += 1
-                if isinstance(url, list):
-                     msg = f"✨ Procesando lote de {len(url)} canciones | 🔧 {tool} (Intento {attempts})"
+            if self.stop_requested.is_set():
+                break
+
+            # Failed batches come back with only their unresolved inputs
+            success, task = self._settle_attempt(task, run, success, started)
+            if success:
+                self._on_task_success(task, run)
+                results.append(self._task_result(task, run, "success", attempts))
+                break # Exit retry loop
+            else:
+                logger.warning(f"Error en intento {attempts}.")
+                self.pool.record_failure()
+                if attempts < max_att and not self.stop_requested.is_set():
+                    # Exponential backoff with jitter, never shorter than a server wait hint
+                    if not self.retry_policy.wait(attempts, self.stop_requested):
+                        break
                 else:
-                     msg = f"✨ Procesando: {url} | 🔧 {tool} (Intento {attempts})"
-                
-                logger.info(msg)
-                if self.broadcast_func: self.broadcast_func("log", msg)
+                    if not self.stop_requested.is_set():
+                        logger.error(f"Fallo final para {url}.")
+                        if run.get("items") is not None:
+                            self._mark_listing_done(run["items"].succeeded())
+                        results.append(self._task_result(task, run, "failed", attempts))
+
+    async def _download_task_async(self, item, results: List[Dict]):
+        """One queue item on the asyncio engine (same retry rules as _download_worker)."""
+        max_att = self.retry_policy.attempts
+
+        # Folders, cookies and the match cache: disk and DB, off the loop
+        task = await asyncio.to_thread(self._prepare_task, item, results)
+        if task is None:
+            return
+        url = task["url"]
+        run = self._new_run(task)
+        
+        attempts = 0
+        self.status["state"] = "processing"
+        
+        while attempts < max_att:
+            if self.stop_requested.is_set():
+                logger.info("🛑 Deteniendo bucle principal...")
+                break
                 
-                # Pass run_cmd_m3u_arg to trigger manual append only if needed
-                success, logs = self._run_cmd(cmd, run_cmd_m3u_arg)
+            if task["tool"] == "spotdl" and not await self.throttle.acquire_async(self._async_stop):
+                break
                 
-                if self.stop_requested.is_set():
-                    break
+            attempts += 1
+            self._announce_attempt(task, attempts)
+            
+            started = time.monotonic()
+            success, logs = await self._run_cmd_async(task["cmd"], task["run_m3u"], run)
+            
+            if self.stop_requested.is_set():
+                break
 
-                if success:
-                    # Post-process M3U8 to fix paths
-                    if m3u_name:
-                        try:
-                            # m3u_arg is the full path to the m3u8 file
-                            m3u_file = Path(m3u_arg)
-                            if m3u_file.exists():
-                                content = m3u_file.read_text(encoding='utf-8')
-                                
-                                new_lines = []
-                                for line in content.splitlines():
-                                    if line.startswith("#") or not line.strip():
-                                        new_lines.append(line)
-                                        continue
-                                        
-                                    p = Path(line)
-                                    filename = p.name
-                                    # Enforce ./ prefix to match _run_cmd logic and user preference
-                                    if not filename.startswith("./"):
-                                        filename = f"./{filename}"
-                                    new_lines.append(filename)
-                                
-                                # Ensure trailing newline
-                                m3u_file.write_text("\n".join(new_lines) + "\n", encoding='utf-8')
-                                logger.info(f"Corregidas rutas en M3U: {m3u_file}")
-                        except Exception as e:
-                            logger.error(f"Error procesando M3U: {e}")
-                            
-                    results.append({"url": url, "status": "success", "attempts": attempts})
-                    break # Exit retry loop
+            # Failed batches come back with only their unresolved inputs
+            success, task = await asyncio.to_thread(self._settle_attempt, task, run, success, started)
+            if success:
+                # Normalizing and indexing touch the disk and the DB: keep them off the loop
+                await asyncio.to_thread(self._on_task_success, task, run)
+                results.append(self._task_result(task, run, "success", attempts))
+                break
+            else:
+                logger.warning(f"Error en intento {attempts}.")
+                self.pool.record_failure()
+                if attempts < max_att and not self.stop_requested.is_set():
+                    # Backoff that a stop cuts short
+                    if not await self.retry_policy.wait_async(attempts, self._async_stop):
+                        break
                 else:
-                    logger.warning(f"Error en intento {attempts}.")
-                    if attempts < max_att and not self.stop_requested.is_set():
-                        time.sleep(retry_cfg.get("backoff_seconds", 5))
-                    else:
-                        if not self.stop_requested.is_set():
-                            logger.error(f"Fallo final para {url}.")
-                            results.append({"url": url, "status": "failed", "attempts": attempts})
-            
-            q.task_done()
+                    if not self.stop_requested.is_set():
+                        logger.error(f"Fallo final para {url}.")
+                        if run.get("items") is not None:
+                            await asyncio.to_thread(self._mark_listing_done, run["items"].succeeded())
+                        results.append(self._task_result(task, run, "failed", attempts))
 
     def determine_tool(self, url: str) -> str:
         if "spotify" in url:
@@ -670,16 +1348,7 @@ class DownloaderManager:
              return "yt-dlp"
         return self.config.get("default_tool", "spotdl")
 
-    def process_urls(self, urls: List[str], m3u_name: Optional[str] = None) -> List[Dict]:
-        """Procesa una lista de URLs en paralelo.
-        
-        Args:
-            urls: Lista de URLs a descargar
-            m3u_name: Nombre opcional para el archivo m3u8 (solo spotdl)
-        """
-        concurrency = 1 # Force concurrency to 1 as requested to avoid rate limits
-
-        
+    def _ensure_output_dir(self) -> bool:
         # Ensure directory exists before starting
         if not self.output_dir.exists():
              try:
@@ -687,12 +1356,11 @@ class DownloaderManager:
                  logger.info(f"📁 Directorio creado: {self.output_dir}")
              except Exception as e:
                  logger.error(f"❌ Error creando directorio {self.output_dir}: {e}")
-                 return []
-            
-        q = queue.Queue()
-        results = []
-        
-        tasks = []
+                 return False
+        return True
+
+    def _plan_tasks(self, urls: List[str], m3u_name: Optional[str], playlist_id: Optional[str], results: List[Dict]) -> List[tuple]:
+        """Expands URLs into queue items (YouTube playlists become spotdl title batches)."""
         tasks = []
         
         # Initial Log for Playlist start (if m3u_name provided)
@@ -709,9 +1377,9 @@ class DownloaderManager:
                 if self.broadcast_func: self.broadcast_func("log", msg)
                 
                 try:
-                    # Run yt-dlp to get titles (flat-playlist)
-                    # --print "%(title)s" gives us just the title per line
-                    cmd = ["yt-dlp", "--flat-playlist", "--print", "%(title)s", u]
+                    # Run yt-dlp to get ids + titles (flat-playlist)
+                    # One "<id>\t<title>" line per video
+                    cmd = ["yt-dlp", "--flat-playlist", "--print", "%(id)s\t%(title)s", u]
                     
                     # Check for cookies
                     cookies_path = self.config_path.parent / "cookies.txt"
@@ -720,16 +1388,38 @@ class DownloaderManager:
                         
                     res = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
                     if res.returncode == 0:
-                        titles = res.stdout.strip().splitlines()
+                        listed = []
+                        for line in res.stdout.strip().splitlines():
+                            video_id, sep, title = line.partition("\t")
+                            if not sep:
+                                video_id, title = "", line
+                            if video_id.strip() == "NA":
+                                # yt-dlp's placeholder for a missing field
+                                video_id = ""
+                            if title.strip():
+                                listed.append((video_id.strip(), title))
                         
-                        msg = f"✅ Títulos extraídos de YouTube: {len(titles)} canciones encontradas."
+                        msg = f"✅ Títulos extraídos de YouTube: {len(listed)} canciones encontradas."
                         logger.info(msg)
                         if self.broadcast_func: self.broadcast_func("log", msg)
 
                         # Optimization: Batch titles to avoid 66x python startup overhead
-                        # Batch size 50 is safe for command line length
-                        batch_size = 50
-                        current_batch = []
+                        batch_size = self.batch_sizer.size()
+                        batches = {}  # tool -> batch being filled
+                        reuse = self._title_reuser(m3u_name, playlist_id)
+                        reused = 0
+                        
+                        # Listing of the previous sync: entries already downloaded are
+                        # skipped until the next full recheck
+                        listing_key = (playlist_id or "", normalize_url(u))
+                        known, full_check = self._previous_listing(*listing_key)
+                        entries = []
+                        unchanged = 0
+                        
+                        # Direct mode: yt-dlp downloads the videos themselves (no spotdl re-search)
+                        direct = self.config.get("youtube_mode", "spotdl") == "ytdlp" and m3u_name
+                        archived = self._archived_ids(m3u_name) if direct else set()
+                        searched = 0  # Direct mode entries without a video id (searched by spotdl)
                         
                         # Pre-compile regex for cleaning titles
                         import re
@@ -738,22 +1428,68 @@ class DownloaderManager:
                         # Case insensitive.
                         clean_pattern = re.compile(r'\s*[\(\[](?:[^)\].]*?(?:video|official|oficial|lyric|letra)[^)\].]*?)[\)\]]', re.IGNORECASE)
 
-                        for title in titles:
-                            if title.strip():
-                                # CLEAN TITLE
-                                clean_title = clean_pattern.sub('', title)
-                                # Clean up extra spaces
-                                clean_title = re.sub(r'\s+', ' ', clean_title).strip()
-                                
-                                if clean_title:
-                                    current_batch.append(clean_title)
-                                    if len(current_batch) >= batch_size:
-                                        tasks.append((current_batch, "spotdl", m3u_name))
-                                        current_batch = []
+                        for video_id, title in listed:
+                            # CLEAN TITLE
+                            clean_title = clean_pattern.sub('', title)
+                            # Clean up extra spaces
+                            clean_title = re.sub(r'\s+', ' ', clean_title).strip()
+                            if not clean_title:
+                                continue
+                            
+                            entry = {"video_id": video_id or normalize_title(clean_title), "title": title,
+                                     "clean_title": clean_title, "done": False}
+                            entries.append(entry)
+                            previous = known.get(entry["video_id"])
+                            if previous and previous["done"] and not full_check:
+                                entry["done"] = True
+                                unchanged += 1
+                            elif video_id in archived:
+                                entry["done"] = True
+                                unchanged += 1
+                            elif reuse and reuse(clean_title):
+                                entry["done"] = True
+                                reused += 1
+                            else:
+                                # yt-dlp gets the video itself, spotdl the cleaned title.
+                                # Without a video id there is nothing for yt-dlp to fetch:
+                                # the title goes to spotdl's search as in the default mode
+                                if direct and video_id:
+                                    tool, value = "yt-dlp", f"https://www.youtube.com/watch?v={video_id}"
+                                else:
+                                    tool, value = "spotdl", clean_title
+                                    if direct:
+                                        searched += 1
+                                self._listing_pending.setdefault(self._input_key(value), []).append(
+                                    (*listing_key, entry["video_id"])
+                                )
+                                batch = batches.setdefault(tool, [])
+                                batch.append(value)
+                                if len(batch) >= batch_size:
+                                    tasks.append((batch, tool, m3u_name, playlist_id))
+                                    batches[tool] = []
                         
                         # Add remaining
-                        if current_batch:
-                            tasks.append((current_batch, "spotdl", m3u_name))
+                        for tool, batch in batches.items():
+                            if batch:
+                                tasks.append((batch, tool, m3u_name, playlist_id))
+
+                        try:
+                            db.save_yt_listing(*listing_key, entries, full_check)
+                        except Exception as e:
+                            logger.error(f"Error guardando el listado de YouTube: {e}")
+
+                        if unchanged:
+                            msg = f"📋 {unchanged} canciones sin cambios desde la última sincronización: no se vuelven a comprobar."
+                            logger.info(msg)
+                            if self.broadcast_func: self.broadcast_func("log", msg)
+                        if reused:
+                            msg = f"♻️ {reused} canciones ya descargadas: se omiten sin llamar a spotdl."
+                            logger.info(msg)
+                            if self.broadcast_func: self.broadcast_func("log", msg)
+                        if searched:
+                            msg = f"🔎 {searched} vídeos sin ID en el listado: se buscan por título con spotdl."
+                            logger.warning(msg)
+                            if self.broadcast_func: self.broadcast_func("log", msg)
                             
                     else:
                          logger.error(f"❌ Error extrayendo playlist de YT: {res.stderr}")
@@ -765,30 +1501,497 @@ class DownloaderManager:
                     results.append({"url": u, "status": "failed", "error": str(e)})
             else:
                  # Standard SpotDL (Spotify URL)
-                 tasks.append((u, "spotdl", m3u_name))
-            
-        # Init status
-        self.stop_requested.clear() # Reset stop flag
+                 tasks.extend(self._plan_spotify(u, m3u_name, playlist_id))
+
+        return tasks
+
+    def _plan_spotify(self, url: str, m3u_name: Optional[str], playlist_id: Optional[str]) -> List[tuple]:
+        """
+        Queue items for a Spotify URL. With "spotify_manifest.enabled" and a
+        manifest from an earlier sync, only the tracks missing from the
+        library are queued (batches of track URLs); songs stored elsewhere in
+        the library are linked in like YouTube titles. Without a manifest the
+        whole URL is queued as before, and that run writes the manifest.
+        """
+        whole = [(url, "spotdl", m3u_name, playlist_id)]
+        if not (self.config.get("spotify_manifest") or {}).get("enabled") or not m3u_name:
+            return whole
+        target_dir = self.output_dir / get_safe_filename(m3u_name)
+        if not self._manifest_path(url, target_dir).exists():
+            return whole
+        songs, info = self._spotify_manifest(url, target_dir)
+        if songs is None:
+            return whole
+
+        reuse = self._title_reuser(m3u_name, playlist_id)
+        missing = [song for song in songs if not reuse(self._song_title(song))]
+        age = "recién resuelto" if info["resolved"] else f"de hace {info['age_seconds'] // 60} min"
+        msg = f"📋 Manifiesto de Spotify ({age}): {len(songs) - len(missing)} de {len(songs)} canciones ya descargadas, {len(missing)} pendientes."
+        logger.info(msg)
+        if self.broadcast_func: self.broadcast_func("log", msg)
+
+        inputs = [song.get("url") or self._song_title(song) for song in missing]
+        size = self.batch_sizer.size()
+        return [(inputs[i:i + size], "spotdl", m3u_name, playlist_id)
+                for i in range(0, len(inputs), size)]
+
+    @staticmethod
+    def _manifest_path(url: str, target_dir: Path) -> Path:
+        """spotdl save file of a Spotify URL (written by its --save-file downloads)."""
+        import hashlib
+        return target_dir / ".sync" / f"{hashlib.md5(url.encode('utf-8')).hexdigest()}.spotdl"
+
+    @staticmethod
+    def _song_title(song: Dict) -> str:
+        """"Artist - Title" of a save file song, like the files spotdl writes."""
+        artist = song.get("artist") or next(iter(song.get("artists") or []), "")
+        return f"{artist} - {song.get('name', '')}"
+
+    def _spotify_manifest(self, url: str, target_dir: Path, resolve: bool = True) -> tuple:
+        """
+        (songs, info) from the save file of a Spotify URL. A missing manifest,
+        or one older than "spotify_manifest.ttl_hours", is resolved again
+        with `spotdl save` if `resolve`. songs is None if there's no usable
+        manifest.
+        """
+        path = self._manifest_path(url, target_dir)
+        try:
+            ttl = float((self.config.get("spotify_manifest") or {}).get("ttl_hours", 24)) * 3600
+        except (TypeError, ValueError):
+            ttl = 24 * 3600.0
+        info = {"path": str(path), "age_seconds": None, "fresh": False, "resolved": False}
+        songs = None
+        try:
+            songs = json.loads(path.read_text(encoding="utf-8"))
+            if not isinstance(songs, list):
+                songs = None
+            else:
+                songs = [song for song in songs if isinstance(song, dict)]
+                info["age_seconds"] = int(time.time() - path.stat().st_mtime)
+                info["fresh"] = info["age_seconds"] < ttl
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Manifiesto de Spotify ilegible ({path.name}): {e}")
+
+        if resolve and not info["fresh"]:
+            resolved = self._resolve_manifest(url, path)
+            if resolved is not None:
+                songs = resolved
+                info.update(age_seconds=0, fresh=True, resolved=True)
+        return songs, info
+
+    def _resolve_manifest(self, url: str, path: Path) -> Optional[List[Dict]]:
+        """Runs `spotdl save` for a Spotify URL into `path`. Returns its songs."""
+        msg = f"🔎 Resolviendo playlist de Spotify: {url}..."
+        logger.info(msg)
+        if self.broadcast_func: self.broadcast_func("log", msg)
+        if not self.throttle.acquire(self.stop_requested):
+            return None
+        # spotdl only accepts .spotdl save files
+        tmp = path.with_name(f"{path.stem}.tmp.spotdl")
+        cmd = ["spotdl", "save", url, "--save-file", str(tmp)]
+        cookies_path = self.config_path.parent / "cookies.txt"
+        if cookies_path.exists():
+            cmd.extend(["--cookie-file", str(cookies_path)])
+        cmd.extend(self.config.get("spotdl_extra_args", []))
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            res = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+            if res.returncode != 0:
+                logger.error(f"❌ Error resolviendo {url}: {res.stdout[-500:]}{res.stderr[-500:]}")
+                return None
+            songs = json.loads(tmp.read_text(encoding="utf-8"))
+            if not isinstance(songs, list):
+                return None
+            os.replace(tmp, path)
+            return [song for song in songs if isinstance(song, dict)]
+        except Exception as e:
+            logger.error(f"❌ Excepción resolviendo {url}: {e}")
+            return None
+        finally:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+    def plan_playlist(self, playlist: Dict, resolve: bool = True) -> Dict:
+        """
+        Dry run of a sync: what each source of a playlist would download.
+        Spotify URLs are diffed from their manifest (spotdl is only called if
+        it's missing or stale and `resolve`); YouTube URLs from the listing of
+        the last sync, so videos added since then aren't known. Nothing is
+        linked, written or downloaded.
+        """
+        name, playlist_id = playlist["name"], playlist["id"]
+        target_dir = self.output_dir / get_safe_filename(name)
+        present = self._title_reuser(name, playlist_id, dry_run=True)
+        sources = []
+        for url in playlist.get("urls", []):
+            if "youtube" in url or "youtu.be" in url:
+                known, full_check = self._previous_listing(playlist_id, normalize_url(url))
+                source = {"url": url, "type": "youtube", "known": bool(known), "full_recheck": full_check}
+                if known:
+                    entries = list(known.values())
+                    todo = [e for e in entries if full_check or not e["done"]]
+                    missing = [{"title": e["clean_title"]} for e in todo if not present(e["clean_title"])]
+                    source.update(total=len(entries), unchanged=len(entries) - len(todo), missing=missing)
+            else:
+                songs, info = self._spotify_manifest(url, target_dir, resolve)
+                source = {"url": url, "type": "spotify", "known": songs is not None, "manifest": info}
+                if songs is not None:
+                    missing = [{"title": self._song_title(song), "url": song.get("url")}
+                               for song in songs if not present(self._song_title(song))]
+                    source.update(total=len(songs), missing=missing)
+            sources.append(source)
+        return {
+            "playlist_id": playlist_id,
+            "name": name,
+            "sources": sources,
+            "to_download": sum(len(src.get("missing", [])) for src in sources),
+            "complete": all(src["known"] for src in sources),
+        }
+
+    def _match_cache_enabled(self) -> bool:
+        return bool((self.config.get("match_cache") or {}).get("enabled"))
+
+    @staticmethod
+    def _match_key(value: str) -> Optional[str]:
+        """Match cache key of a spotdl input or reported song: Spotify track or track_key of the title."""
+        if value.startswith("http"):
+            key = normalize_url(value)
+            return key if key.startswith("spotify:track:") else None
+        return track_key(value) or None
+
+    def _apply_matches(self, inputs: List[str]) -> tuple:
+        """
+        (spotdl inputs, {input: cache key}) with cached matches applied:
+        "<source>|<spotify track>" when the track is known, else the source
+        URL alone. spotdl downloads those without its YouTube search.
+        """
+        keys = {value: self._match_key(value) for value in inputs}
+        try:
+            cached = db.get_song_matches([k for k in keys.values() if k])
+        except Exception as e:
+            logger.error(f"Error leyendo la caché de coincidencias: {e}")
+            return inputs, {}
+        out, matched = [], {}
+        for value in inputs:
+            match = cached.get(keys[value])
+            if match is None:
+                out.append(value)
+                continue
+            spotify_url = match.get("spotify_url") or (value if value.startswith("http") else None)
+            out.append(f"{match['source_url']}|{spotify_url}" if spotify_url else match["source_url"])
+            matched[value] = keys[value]
+        if matched:
+            msg = f"🎯 {len(matched)} canciones con coincidencia conocida: se descargan sin buscar."
+            logger.info(msg)
+            if self.broadcast_func: self.broadcast_func("log", msg)
+        return out, matched
+
+    def _remember_match(self, name: Optional[str], value: Optional[str], source_url: str, song: Optional[tuple]):
+        """Caches the source spotdl chose, under the reported song and the batch input it answered."""
+        try:
+            keys = [self._match_key(v) for v in (name, value) if v]
+            spotify_url = value if value and value.startswith("http") and "spotify" in value else None
+            filename, duration = song if song else (None, 0)
+            db.save_song_match([k for k in keys if k], source_url, spotify_url, duration, filename)
+        except Exception as e:
+            logger.error(f"Error guardando la coincidencia de {name}: {e}")
+
+    def _forget_matches(self, values: List[str]):
+        keys = [k for k in (self._match_key(v) for v in values) if k]
+        if not keys:
+            return
+        try:
+            db.forget_song_matches(keys)
+            logger.info(f"🗑 {len(keys)} coincidencias en caché descartadas tras fallar la descarga.")
+        except Exception as e:
+            logger.error(f"Error actualizando la caché de coincidencias: {e}")
+
+    @staticmethod
+    def _input_key(value: str) -> str:
+        """De-duplication key of a queued input: normalized URL or title."""
+        return normalize_url(value) if value.startswith("http") else normalize_title(value)
+
+    def _archive_path(self, m3u_name: str) -> Path:
+        """yt-dlp --download-archive file of a playlist (one "youtube <id>" line per finished video)."""
+        return self.output_dir / get_safe_filename(m3u_name) / ".sync" / "ytdlp-archive.txt"
+
+    def _archived_ids(self, m3u_name: str) -> set:
+        try:
+            lines = self._archive_path(m3u_name).read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return set()
+        return {line.split()[1] for line in lines if len(line.split()) == 2 and line.startswith("youtube ")}
+
+    def _previous_listing(self, playlist_id: str, url: str) -> tuple:
+        """
+        (entries of the last sync, full recheck due?) for a playlist's
+        YouTube URL. A full recheck dispatches every entry again; it's due
+        every "youtube_listing.full_recheck_hours" (0 = every sync).
+        """
+        try:
+            hours = float((self.config.get("youtube_listing") or {}).get("full_recheck_hours", 168))
+        except (TypeError, ValueError):
+            hours = 168.0
+        try:
+            known = db.get_yt_listing(playlist_id, url)
+            last_full = db.get_yt_full_check(playlist_id, url)
+        except Exception as e:
+            logger.error(f"Error leyendo el listado de YouTube: {e}")
+            return {}, True
+        due = hours <= 0 or last_full is None or time.time() - last_full >= hours * 3600
+        return known, due
+
+    def _title_reuser(self, m3u_name: Optional[str], playlist_id: Optional[str],
+                      dry_run: bool = False) -> Optional[Callable[[str], bool]]:
+        """
+        Pre-dispatch check for song titles ("Artist - Title") of a playlist.
+        The returned function makes sure an already stored song is in the
+        playlist (folder + M3U) and returns True, or returns False if the
+        title must be downloaded. With `dry_run` it only answers (no links,
+        no M3U changes).
+
+        Titles are matched by track_key (accents, case and punctuation
+        ignored) against the playlist folder, then the track pool (if
+        enabled), then the other playlists in the library index. spotdl would
+        only search YouTube to report "Skipping (file already exists)".
+        """
+        if not m3u_name:
+            return None
+        if dry_run:
+            target_dir, writer = self.output_dir / get_safe_filename(m3u_name), None
+        else:
+            target_dir, m3u_arg = self._playlist_target(m3u_name, playlist_id)
+            writer = self._get_m3u_writer(m3u_arg, playlist_id)
+        exts = self._audio_exts()
+        pool = self._track_pool()
+        local = self._songs_by_key(target_dir)
+        library = None  # Built on the first title not found locally
+
+        def from_library(key: str) -> Optional[Path]:
+            nonlocal library
+            if library is None:
+                library = {}
+                try:
+                    files = db.get_library_files(playlist_id)
+                except Exception as e:
+                    logger.error(f"Error leyendo el índice de la biblioteca: {e}")
+                    files = []
+                for f in files:
+                    # M3U lines may lack the extension ("./Artist - Title")
+                    name = Path(f["filename"]).name
+                    stem = Path(name).stem if Path(name).suffix.lower() in AUDIO_EXTS else name
+                    library.setdefault(track_key(stem), (self.output_dir / get_safe_filename(f["name"]), name))
+            if key not in library:
+                return None
+            src = self._find_song_file(*library[key])
+            if src is None or dry_run:
+                return src
+            dst = target_dir / src.name
+            try:
+                if not dst.exists():
+                    try:
+                        os.link(src, dst)  # Same filesystem: no extra space
+                    except OSError:
+                        shutil.copy2(src, dst)
+            except OSError as e:
+                logger.error(f"Error copiando {src.name} a {target_dir}: {e}")
+                return None
+            return dst
+
+        def reuse(title: str) -> bool:
+            key = track_key(title)
+            song = local.get(key)
+            if song is None and pool:
+                pooled = pool.find(title, exts)
+                if pooled is not None and dry_run:
+                    return True
+                if pooled is not None:
+                    try:
+                        song = pool.link_into(pooled, target_dir)
+                    except OSError as e:
+                        logger.error(f"❌ Pool: no se pudo enlazar {pooled.name}: {e}")
+            if song is None:
+                song = from_library(key)
+            if song is None:
+                return False
+            if dry_run:
+                return True
+            local[key] = song
+            entry = f"./{song.name}"
+            if entry not in writer:
+                _, duration = self._get_audio_metadata(str(song.relative_to(self.output_dir)))
+                writer.add(duration, song.stem, entry)
+            return True
+
+        return reuse
+
+    def _songs_by_key(self, directory: Path) -> Dict[str, Path]:
+        """Audio files of a folder by track_key of their name (configured format wins)."""
+        rank = {ext: i for i, ext in enumerate(self._audio_exts())}
+        songs = {}
+        try:
+            entries = [Path(e.path) for e in os.scandir(directory) if e.is_file()]
+        except OSError:
+            return songs
+        entries = [p for p in entries if p.suffix.lower() in rank]
+        for path in sorted(entries, key=lambda p: rank[p.suffix.lower()]):
+            songs.setdefault(track_key(path.stem), path)
+        return songs
+
+    def _plan_global(self, playlists: List[Dict], results: List[Dict]) -> List[tuple]:
+        """
+        Queue items for several playlists with shared work merged. A Spotify
+        URL (normalized) or YouTube title listed by several playlists is
+        downloaded once, into the first playlist that lists it, and fanned out
+        to the rest (5th item field). Titles are re-batched by the set of
+        playlists that want them.
+        """
+        urls = {}    # normalize_url -> (url, [(m3u_name, playlist_id), ...], tool)
+        titles = {}  # _input_key -> (title or track/video URL, [(m3u_name, playlist_id), ...], tool)
+        requested = 0
+        for p in playlists:
+            target = (p["name"], p["id"])
+            first_result = len(results)
+            for item in self._plan_tasks(p.get("urls", []), p["name"], p["id"], results):
+                inputs = item[0] if isinstance(item[0], list) else [item[0]]
+                requested += len(inputs)
+                pending = titles if isinstance(item[0], list) else urls
+                for value in inputs:
+                    # Lists hold titles or track/video URLs
+                    entry = pending.setdefault(self._input_key(value), (value, [], item[1]))
+                    if target not in entry[1]:
+                        entry[1].append(target)
+            for r in results[first_result:]:
+                r.setdefault("playlists", [p["id"]])
+
+        tasks = []
+        for url, targets, tool in urls.values():
+            tasks.append((url, tool, targets[0][0], targets[0][1], targets[1:]))
+
+        groups = {}
+        for title, targets, tool in titles.values():
+            groups.setdefault((tool, tuple(targets)), []).append(title)
+        size = self.batch_sizer.size()
+        for (tool, targets), group in groups.items():
+            for i in range(0, len(group), size):
+                tasks.append((group[i:i + size], tool, targets[0][0], targets[0][1], list(targets[1:])))
+
+        unique = len(urls) + len(titles)
+        if unique < requested:
+            msg = f"🔗 {requested - unique} descargas repetidas: se descargan una vez y se copian a cada playlist."
+            logger.info(msg)
+            if self.broadcast_func: self.broadcast_func("log", msg)
+        return tasks
+
+    def _begin_job(self, tasks: List[tuple]):
+        # Init status (the stop flag was reset before planning, see _run_job)
+        self.pool = AIMDController(self._concurrency(), self.config.get("adaptive_concurrency"))
+        self.retry_policy.reset()
+        workers_cfg = self.config.get("spotdl_workers") or {}
+        if workers_cfg.get("enabled"):
+            self.spotdl_workers = SpotdlWorkerPool(
+                workers_cfg.get("entry"), workers_cfg.get("max_requests", 50), self.stop_requested
+            )
         self.status["state"] = "starting"
         
         # Calculate strict total songs (accounting for batches)
         total_count = 0
+        progress = {} # Per playlist: shared downloads count for each one they serve
         for t in tasks:
-            # t is (url_or_list, tool, m3u_name)
+            # t is (url_or_list, tool[, m3u_name[, playlist_id[, fanout]]])
             input_data = t[0]
-            if isinstance(input_data, list):
-                total_count += len(input_data)
-            else:
-                total_count += 1
+            size = len(input_data) if isinstance(input_data, list) else 1
+            total_count += size
+            targets = ([tuple(t[2:4])] if len(t) >= 4 else []) + (list(t[4]) if len(t) == 5 else [])
+            for name, pid in targets:
+                if pid:
+                    entry = progress.setdefault(pid, {"name": name, "total": 0, "downloaded": 0})
+                    entry["total"] += size
                 
         self.status["total_songs"] = total_count
         self.status["downloaded"] = 0
+        self.status["playlists"] = progress
         
         msg = f"🚀 Iniciando descarga de {total_count} canciones..."
         logger.info(msg)
         if self.broadcast_func:
              self.broadcast_func("log", msg)
-             self.broadcast_func("status", self.status)
+        self.status_publisher.publish(flush=True)
+
+    def _stopped_while_planning(self) -> bool:
+        """True if Stop was pressed while planning; keeps what planning wrote and drops the queue."""
+        if not self.stop_requested.is_set():
+            return False
+        # Titles reused from the library were already added to M3U writers
+        self._close_m3u_writers()
+        self._listing_pending = {}
+        msg = "🛑 Descarga cancelada antes de empezar."
+        logger.info(msg)
+        if self.broadcast_func: self.broadcast_func("log", msg)
+        self.status["state"] = "idle"
+        self.status_publisher.publish(flush=True)
+        return True
+
+    def _end_job(self):
+        # Job boundary: flush M3U files
+        self._close_m3u_writers()
+        self.last_job_report = self.pool.report() if self.pool else None
+        if self.last_job_report is not None:
+            self.last_job_report["batching"] = self.batch_sizer.snapshot()
+            self.last_job_report["retry"] = self.retry_policy.report()
+        if self.spotdl_workers:
+            self.spotdl_workers.close()
+            self.spotdl_workers = None
+        self._listing_pending = {}
+        
+        # Reset status to idle when done
+        self.status["state"] = "idle"
+        self.status["current_song"] = None
+        self.status_publisher.publish(flush=True)
+
+    def process_urls(self, urls: List[str], m3u_name: Optional[str] = None, playlist_id: Optional[str] = None) -> List[Dict]:
+        """Procesa una lista de URLs en paralelo.
+        
+        Args:
+            urls: Lista de URLs a descargar
+            m3u_name: Nombre opcional para el archivo m3u8 (solo spotdl)
+            playlist_id: ID de la playlist para mantener el índice de tracks
+        """
+        return self._run_job(lambda results: self._plan_tasks(urls, m3u_name, playlist_id, results))
+
+    def process_playlists(self, playlists: List[Dict]) -> List[Dict]:
+        """Procesa varias playlists ({"id", "name", "urls"}) como un único trabajo.
+        
+        Songs shared between playlists are downloaded once and copied to the
+        others (see _plan_global). Each result lists the playlist ids it served
+        under "playlists".
+        """
+        return self._run_job(lambda results: self._plan_global(playlists, results))
+
+    def _run_job(self, plan: Callable[[List[Dict]], List[tuple]]) -> List[Dict]:
+        """Runs one job on the configured engine. `plan(results)` returns the queue items."""
+        if self.config.get("engine", "threads") == "asyncio":
+            return self._run_async_job(plan)
+
+        # Parallel workers; Spotify limits are handled by the shared token bucket
+        concurrency = self._concurrency()
+
+        # Reset before planning: listings and manifests can take minutes and
+        # a Stop pressed meanwhile must cancel the job
+        self.stop_requested.clear()
+        if not self._ensure_output_dir():
+            return []
+            
+        q = queue.Queue()
+        results = []
+        tasks = plan(results)
+        if self._stopped_while_planning():
+            return results
+        self._begin_job(tasks)
 
         threads = []
         for _ in range(concurrency):
@@ -810,12 +2013,69 @@ class DownloaderManager:
         # Join threads with timeout
         for th in threads:
             th.join(timeout=1.0)
-        
-        # Reset status to idle when done
-        self.status["state"] = "idle"
-        self.status["current_song"] = None
-        if self.broadcast_func: self.broadcast_func("status", self.status)
-        
+
+        self._end_job()
+        return results
+
+    def _run_async_job(self, plan: Callable[[List[Dict]], List[tuple]]) -> List[Dict]:
+        """Runs the job on the app's event loop (or a private one) and waits for it."""
+        coro = self._run_job_async(plan)
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                coro.close()
+                raise RuntimeError("process_urls() would block the event loop; await process_urls_async() instead")
+            return asyncio.run_coroutine_threadsafe(coro, loop).result()
+        # No app loop (CLI, benchmarks): private loop for this job
+        return asyncio.run(coro)
+
+    async def process_urls_async(self, urls: List[str], m3u_name: Optional[str] = None, playlist_id: Optional[str] = None) -> List[Dict]:
+        """process_urls() for callers already running on the event loop."""
+        return await self._run_job_async(lambda results: self._plan_tasks(urls, m3u_name, playlist_id, results))
+
+    async def _run_job_async(self, plan: Callable[[List[Dict]], List[tuple]]) -> List[Dict]:
+        """
+        asyncio engine: spotdl/yt-dlp children run through create_subprocess_exec
+        and are read on the event loop; everything that touches the disk, the
+        DB or other processes runs in threads. Up to `concurrency` children at once.
+        """
+        # Reset before planning (see _run_job)
+        self.stop_requested.clear()
+        if not self._ensure_output_dir():
+            return []
+
+        results = []
+        # Listing YouTube playlists runs yt-dlp synchronously
+        tasks = await asyncio.to_thread(plan, results)
+        if await asyncio.to_thread(self._stopped_while_planning):
+            return results
+        self._begin_job(tasks)
+
+        self._async_loop = asyncio.get_running_loop()
+        self._async_stop = asyncio.Event()
+        if self.stop_requested.is_set():
+            self._async_stop.set()
+        async def run_one(item):
+            if not await self.pool.acquire_async(self._async_stop):
+                return
+            try:
+                if not self.stop_requested.is_set():
+                    await self._download_task_async(item, results)
+            finally:
+                self.pool.release()
+
+        try:
+            await asyncio.gather(*(run_one(t) for t in tasks))
+        finally:
+            self._async_loop = None
+            self._async_stop = None
+
+        # M3U flush, library index and worker shutdown block
+        await asyncio.to_thread(self._end_job)
         return results
 
     def sanitize_files(self) -> Dict[str, int]:
@@ -930,8 +2190,33 @@ class DownloaderManager:
         except Exception as e:
             logger.error(f"Error traversing directories: {e}")
 
+        # 3. Shared track pool: link duplicates to one stored copy, drop orphans
+        pooled = self._pool_library()
+
         msg = f"✨ Sanitización completada: {renamed_count} archivos renombrados."
         logger.info(msg)
         if self.broadcast_func: self.broadcast_func("log", msg)
         
-        return {"renamed": renamed_count, "m3u_updated": m3u_updated_count}
+        return {"renamed": renamed_count, "m3u_updated": m3u_updated_count, "pooled": pooled}
+
+    def _pool_library(self) -> int:
+        """Adopts every playlist file into the track pool (if enabled). Returns files now linked."""
+        pool = self._track_pool()
+        if not pool:
+            return 0
+        exts = set(AUDIO_EXTS) | set(self._audio_exts())
+        adopted = 0
+        try:
+            for folder in self.output_dir.iterdir():
+                if not folder.is_dir() or folder.name.startswith('.'):
+                    continue
+                for file in folder.iterdir():
+                    if file.suffix.lower() in exts and not file.is_symlink() and pool.adopt(file):
+                        adopted += 1
+        except Exception as e:
+            logger.error(f"Error pooling library: {e}")
+        pool.gc()
+        msg = f"🔗 Pool: {adopted} archivos de playlists enlazados al almacén compartido."
+        logger.info(msg)
+        if self.broadcast_func: self.broadcast_func("log", msg)
+        return adopted
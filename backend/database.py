@@ -1,7 +1,9 @@
 
 import sqlite3
 import json
+import time
 import logging
+import threading
 from pathlib import Path
 from typing import List, Dict, Optional
 
@@ -24,18 +26,84 @@ from contextlib import contextmanager
 
 DB_PATH = DATA_DIR / "soniq.db"
 
+# Applied to every connection. WAL lets the scheduler, background tasks and
+# request handlers read while one of them writes; synchronous=NORMAL is safe
+# with WAL (a power cut may lose the last commits, never corrupts the file).
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -8000",       # KiB (8 MB page cache per connection)
+    "PRAGMA mmap_size = 67108864",     # 64 MB of the file read through mmap
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",      # ms to wait for another writer
+)
+
+def _add_column(table: str, column: str, declaration: str):
+    """Migration step adding a column, a no-op where an earlier build already added it."""
+    def step(conn: sqlite3.Connection):
+        columns = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+    return step
+
+# Schema changes after the base tables of init_db, in order: SQL statements
+# or callables taking the connection. PRAGMA user_version is the number of
+# migrations applied; add new ones at the end.
+MIGRATIONS = [
+    # 1. Indexes for the per-playlist and history lookups
+    (
+        "CREATE INDEX IF NOT EXISTS idx_playlist_urls_playlist ON playlist_urls (playlist_id)",
+        "CREATE INDEX IF NOT EXISTS idx_job_history_created ON job_history (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_song_matches_source ON song_matches (source_url)",
+    ),
+    # 2. Columns added before schema versioning (present in databases of those builds)
+    (
+        # Per-job details (JSON), e.g. the concurrency controller's decisions
+        _add_column("job_history", "details", "TEXT"),
+        # Version of the indexed track list (ETag of /playlists/{id}/tracks)
+        _add_column("playlists", "tracks_version", "INTEGER DEFAULT 0"),
+    ),
+]
+
+_local = threading.local()
+
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
+    """
+    This thread's connection to DB_PATH, opened on first use and reused by
+    every later call (a new one if DB_PATH changed). Don't close it; see
+    close_db().
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()
+    conn = sqlite3.connect(DB_PATH, timeout=5.0)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    _local.conn, _local.path = conn, DB_PATH
     return conn
 
+def close_db():
+    """Closes this thread's connection (e.g. on shutdown)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
+
 @contextmanager
 def get_db_context():
     conn = get_db()
     try:
         yield conn
-    finally:
-        conn.close()
+    except BaseException:
+        # The connection outlives this call: never leave a transaction open on it
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    if conn.in_transaction:
+        conn.commit()
 
 def init_db():
     """Initializes the database schema."""
@@ -74,9 +142,89 @@ def init_db():
             )
         ''')
         
+        # Media Cache Table (ffprobe results keyed by file identity)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS media_cache (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                duration INTEGER DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Library Index (tracks present in each playlist M3U, in order)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS tracks (
+                playlist_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                duration INTEGER DEFAULT 0,
+                size INTEGER DEFAULT 0,
+                mtime INTEGER DEFAULT 0,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (playlist_id, filename),
+                FOREIGN KEY(playlist_id) REFERENCES playlists(id) ON DELETE CASCADE
+            )
+        ''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tracks_position ON tracks (playlist_id, position)")
+        
+        # YouTube playlist listings (flat-playlist entries seen on the last sync of each playlist)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS yt_listings (
+                playlist_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                video_id TEXT NOT NULL,
+                title TEXT,
+                clean_title TEXT,
+                position INTEGER NOT NULL,
+                done INTEGER DEFAULT 0,
+                PRIMARY KEY (playlist_id, url, video_id)
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS yt_listing_checks (
+                playlist_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                full_check_at REAL,
+                PRIMARY KEY (playlist_id, url)
+            )
+        ''')
+        
+        # Song -> chosen source, shared by every playlist and run (skips spotdl's search)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS song_matches (
+                key TEXT PRIMARY KEY,
+                source_url TEXT NOT NULL,
+                spotify_url TEXT,
+                duration INTEGER DEFAULT 0,
+                filename TEXT,
+                updated_at REAL
+            )
+        ''')
+        
         conn.commit()
+        _migrate(conn)
     logger.info(f"Database initialized at {DB_PATH}")
 
+def _migrate(conn: sqlite3.Connection):
+    """Applies the MIGRATIONS newer than the database's user_version, one transaction each."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            conn.execute("BEGIN")
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            # PRAGMA doesn't take parameters
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"Database schema migrated to version {number}")
+
 def get_playlists() -> List[Dict]:
     results = []
     with get_db_context() as conn:
@@ -129,6 +277,9 @@ def delete_playlist(id: str):
     with get_db_context() as conn:
         conn.execute("DELETE FROM playlists WHERE id = ?", (id,))
         conn.execute("DELETE FROM playlist_urls WHERE playlist_id = ?", (id,))
+        conn.execute("DELETE FROM tracks WHERE playlist_id = ?", (id,))
+        conn.execute("DELETE FROM yt_listings WHERE playlist_id = ?", (id,))
+        conn.execute("DELETE FROM yt_listing_checks WHERE playlist_id = ?", (id,))
         conn.commit()
 
 def update_track_count(id: str, count: int):
@@ -136,15 +287,213 @@ def update_track_count(id: str, count: int):
         conn.execute("UPDATE playlists SET track_count = ? WHERE id = ?", (count, id))
         conn.commit()
 
-def add_history_entry(playlist_name: str, status: str, downloaded: int, total: int, duration: float):
+def add_history_entry(playlist_name: str, status: str, downloaded: int, total: int, duration: float,
+                      details: Optional[Dict] = None):
     with get_db_context() as conn:
         conn.execute(
-            "INSERT INTO job_history (playlist_name, status, items_downloaded, total_items, duration_seconds) VALUES (?, ?, ?, ?, ?)",
-            (playlist_name, status, downloaded, total, duration)
+            "INSERT INTO job_history (playlist_name, status, items_downloaded, total_items, duration_seconds, details) VALUES (?, ?, ?, ?, ?, ?)",
+            (playlist_name, status, downloaded, total, duration, json.dumps(details) if details else None)
         )
         conn.commit()
 
 def get_history(limit: int = 50) -> List[Dict]:
     with get_db_context() as conn:
         rows = conn.execute("SELECT * FROM job_history ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        history = []
+        for row in rows:
+            entry = dict(row)
+            try:
+                entry["details"] = json.loads(entry["details"]) if entry.get("details") else None
+            except ValueError:
+                entry["details"] = None
+            history.append(entry)
+        return history
+
+def get_cached_duration(path: str, size: int, mtime_ns: int) -> Optional[int]:
+    """Returns the cached duration for path if size and mtime still match."""
+    with get_db_context() as conn:
+        row = conn.execute(
+            "SELECT duration FROM media_cache WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, size, mtime_ns)
+        ).fetchone()
+        return row["duration"] if row else None
+
+def save_cached_duration(path: str, size: int, mtime_ns: int, duration: int):
+    with get_db_context() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO media_cache (path, size, mtime_ns, duration, updated_at) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)",
+            (path, size, mtime_ns, duration)
+        )
+        conn.commit()
+
+def replace_tracks(playlist_id: str, tracks: List[Dict]):
+    """
+    Replaces the indexed tracks of a playlist (dicts with filename, duration, size, mtime).
+    Bumps the playlist's tracks_version only when the list actually changed.
+    """
+    rows = []
+    seen = set()
+    for t in tracks:
+        if t["filename"] in seen:
+            continue  # Duplicate lines in legacy M3U files
+        seen.add(t["filename"])
+        rows.append((t["filename"], t.get("duration", 0), t.get("size", 0), t.get("mtime", 0)))
+    with get_db_context() as conn:
+        try:
+            current = conn.execute(
+                "SELECT filename, duration, size, mtime FROM tracks WHERE playlist_id = ? ORDER BY position",
+                (playlist_id,)
+            ).fetchall()
+            if [tuple(r) for r in current] == rows:
+                return
+
+            conn.execute("DELETE FROM tracks WHERE playlist_id = ?", (playlist_id,))
+            conn.executemany(
+                "INSERT INTO tracks (playlist_id, filename, duration, size, mtime, position) VALUES (?, ?, ?, ?, ?, ?)",
+                [(playlist_id, *row, pos) for pos, row in enumerate(rows)]
+            )
+            conn.execute("UPDATE playlists SET tracks_version = tracks_version + 1 WHERE id = ?", (playlist_id,))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def _tracks_filter(playlist_id: str, prefix: Optional[str]):
+    where = "playlist_id = ?"
+    params = [playlist_id]
+    if prefix:
+        # Entries are stored as M3U lines ("./Artist - Title.opus")
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        where += " AND (filename LIKE ? ESCAPE '\\' OR filename LIKE ? ESCAPE '\\')"
+        params += [f"./{escaped}%", f"{escaped}%"]
+    return where, params
+
+def get_tracks(playlist_id: str, offset: int = 0, limit: Optional[int] = None, prefix: Optional[str] = None) -> List[Dict]:
+    where, params = _tracks_filter(playlist_id, prefix)
+    with get_db_context() as conn:
+        rows = conn.execute(
+            f"SELECT filename, duration, size, mtime, position FROM tracks WHERE {where} ORDER BY position LIMIT ? OFFSET ?",
+            (*params, limit if limit is not None else -1, offset)
+        ).fetchall()
         return [dict(row) for row in rows]
+
+def get_library_files(exclude_playlist_id: Optional[str] = None) -> List[Dict]:
+    """Every indexed file with its playlist name (name, filename), for cross-playlist lookups."""
+    with get_db_context() as conn:
+        rows = conn.execute(
+            "SELECT p.name, t.filename FROM tracks t JOIN playlists p ON p.id = t.playlist_id WHERE t.playlist_id IS NOT ?",
+            (exclude_playlist_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+def count_tracks(playlist_id: str, prefix: Optional[str] = None) -> int:
+    where, params = _tracks_filter(playlist_id, prefix)
+    with get_db_context() as conn:
+        row = conn.execute(f"SELECT COUNT(*) AS n FROM tracks WHERE {where}", params).fetchone()
+        return row["n"]
+
+def get_tracks_version(playlist_id: str) -> Optional[int]:
+    """Returns the tracks_version of a playlist, None if it doesn't exist."""
+    with get_db_context() as conn:
+        row = conn.execute("SELECT tracks_version FROM playlists WHERE id = ?", (playlist_id,)).fetchone()
+        return row["tracks_version"] if row else None
+
+def get_yt_listing(playlist_id: str, url: str) -> Dict[str, Dict]:
+    """Last stored listing of a playlist's YouTube URL: video_id -> {title, clean_title, done}."""
+    with get_db_context() as conn:
+        rows = conn.execute(
+            "SELECT video_id, title, clean_title, done FROM yt_listings WHERE playlist_id = ? AND url = ? ORDER BY position",
+            (playlist_id, url)
+        ).fetchall()
+        return {row["video_id"]: {"title": row["title"], "clean_title": row["clean_title"], "done": bool(row["done"])}
+                for row in rows}
+
+def get_yt_full_check(playlist_id: str, url: str) -> Optional[float]:
+    """Unix time of the last sync that dispatched every entry of the listing."""
+    with get_db_context() as conn:
+        row = conn.execute(
+            "SELECT full_check_at FROM yt_listing_checks WHERE playlist_id = ? AND url = ?", (playlist_id, url)
+        ).fetchone()
+        return row["full_check_at"] if row else None
+
+def save_yt_listing(playlist_id: str, url: str, entries: List[Dict], full_check: bool = False):
+    """
+    Replaces the stored listing of a playlist's YouTube URL (dicts with
+    video_id, title, clean_title, done). With full_check, also records the time.
+    """
+    rows = {}
+    for pos, e in enumerate(entries):
+        rows.setdefault(e["video_id"], (playlist_id, url, e["video_id"], e.get("title"), e.get("clean_title"),
+                                        pos, int(bool(e.get("done")))))
+    with get_db_context() as conn:
+        try:
+            conn.execute("DELETE FROM yt_listings WHERE playlist_id = ? AND url = ?", (playlist_id, url))
+            conn.executemany(
+                "INSERT INTO yt_listings (playlist_id, url, video_id, title, clean_title, position, done) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                list(rows.values())
+            )
+            if full_check:
+                conn.execute(
+                    "INSERT OR REPLACE INTO yt_listing_checks (playlist_id, url, full_check_at) VALUES (?, ?, ?)",
+                    (playlist_id, url, time.time())
+                )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def mark_yt_entries_done(keys: List[tuple]):
+    """Marks (playlist_id, url, video_id) listing entries as downloaded."""
+    if not keys:
+        return
+    with get_db_context() as conn:
+        conn.executemany("UPDATE yt_listings SET done = 1 WHERE playlist_id = ? AND url = ? AND video_id = ?", keys)
+        conn.commit()
+
+def get_song_matches(keys: List[str]) -> Dict[str, Dict]:
+    """Cached matches for these keys: key -> {source_url, spotify_url, duration, filename}."""
+    keys = list(dict.fromkeys(keys))
+    matches = {}
+    with get_db_context() as conn:
+        # Chunked: SQLite limits the number of bound parameters
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, source_url, spotify_url, duration, filename FROM song_matches WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            for row in rows:
+                entry = dict(row)
+                matches[entry.pop("key")] = entry
+    return matches
+
+def save_song_match(keys: List[str], source_url: str, spotify_url: Optional[str] = None,
+                    duration: int = 0, filename: Optional[str] = None):
+    """Stores one match under every key (e.g. searched title and reported "Artist - Title")."""
+    now = time.time()
+    with get_db_context() as conn:
+        # A match learnt without the Spotify track keeps the one stored before
+        conn.executemany(
+            """INSERT INTO song_matches (key, source_url, spotify_url, duration, filename, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET
+                   spotify_url = CASE WHEN excluded.source_url = song_matches.source_url
+                                      THEN COALESCE(excluded.spotify_url, song_matches.spotify_url)
+                                      ELSE excluded.spotify_url END,
+                   source_url = excluded.source_url, duration = excluded.duration,
+                   filename = excluded.filename, updated_at = excluded.updated_at""",
+            [(key, source_url, spotify_url, duration, filename, now) for key in dict.fromkeys(keys) if key]
+        )
+        conn.commit()
+
+def forget_song_matches(keys: List[str]):
+    """Drops cached matches, and the other keys of their sources (their download failed)."""
+    if not keys:
+        return
+    with get_db_context() as conn:
+        # Every key learnt for the same source goes with it
+        conn.executemany(
+            "DELETE FROM song_matches WHERE source_url IN (SELECT source_url FROM song_matches WHERE key = ?)",
+            [(key,) for key in keys]
+        )
+        conn.commit()
@@ -0,0 +1,59 @@
+
+import time
+import uuid
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CAPACITY = 1000
+
+
+class LogBuffer:
+    """
+    Fixed-size ring of recent log events, each with a monotonic sequence
+    number. Used to replay history to websocket clients that connect
+    mid-job and to serve incremental fetches (GET /logs?since=<seq>).
+
+    `epoch` changes on every process start, so clients can tell that
+    sequence numbers were reset.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.lock = threading.Lock()
+        self._events = deque(maxlen=max(1, capacity))
+        self._seq = 0
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def append(self, message: Any) -> Dict:
+        with self.lock:
+            self._seq += 1
+            event = {"seq": self._seq, "ts": time.time(), "message": message}
+            self._events.append(event)
+            return event
+
+    def since(self, seq: int, limit: Optional[int] = None) -> List[Dict]:
+        """Events with a sequence number greater than `seq`, oldest first."""
+        with self.lock:
+            if not self._events or seq >= self._seq:
+                return []
+            # Sequence numbers are contiguous: index straight into the ring
+            first = self._events[0]["seq"]
+            start = max(0, seq + 1 - first)
+            end = len(self._events) if limit is None else min(len(self._events), start + limit)
+            return list(islice(self._events, start, end))
+
+    def tail(self, count: int) -> List[Dict]:
+        """The last `count` events, oldest first."""
+        with self.lock:
+            count = min(max(count, 0), len(self._events))
+            return list(islice(self._events, len(self._events) - count, None))
+
+    def first_seq(self) -> int:
+        """Oldest sequence number still held (last_seq + 1 when empty)."""
+        with self.lock:
+            return self._events[0]["seq"] if self._events else self._seq + 1
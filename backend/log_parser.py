@@ -11,11 +11,87 @@ C_RESET = "\033[0m"
 
 logger = logging.getLogger("downloader.parser")
 
+_FOUND_RE = re.compile(r"Found (\d+) songs in (.+)")
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+_RATE_WAIT_RE = re.compile(r"after:\s*(\d+)")
+_DOWNLOADED_RE = re.compile(r'Downloaded "(.+?)"')
+_ITEM_RE = re.compile(r"Downloading item (\d+) of (\d+)")
+_EXTRACTOR_ID_RE = re.compile(r"ERROR: \[[\w:]+\] ([\w-]+):")
+
+# Known noisy lines (not worth logging)
+_NOISE_MARKERS = (
+    "Downloading webpage", "Extracting URL", "android sdkless", "web safari",
+    "web_safari client", "web client", "JavaScript runtime", "m3u8 information",
+)
+
+
+def _is_noise(line: str) -> bool:
+    for marker in _NOISE_MARKERS:
+        if marker in line:
+            return True
+    return False
+
+
+# Line rules by first token: the bracketed yt-dlp tag ("[download]") or the
+# first word ("Downloaded", "ERROR:"). Each entry is (rules, noise): rules
+# are (marker, handler) pairs tried in order (None matches any line), noise
+# is True (always noise), a truthy value (noise if a _NOISE_MARKERS entry is
+# in the line) or () (never noise).
+_COMMON_RULES = {
+    "[download]": ((
+        ("has already been downloaded", "_on_already_downloaded"),
+        ("has already been recorded in the archive", "_on_archived"),
+        ("Downloading item", "_on_item_progress"),
+        ("Destination:", "_on_destination"),
+        ("Download completed", "_on_download_completed"),
+        ("%", "_on_progress"),
+    ), ()),
+    "[ExtractAudio]": ((("Destination:", "_on_extract_audio"),), True),
+    "[info]": ((("Downloading 1 format(s)", "_on_formats"),), ()),
+    "[youtube]": ((), _NOISE_MARKERS),
+    "[youtube:tab]": ((), _NOISE_MARKERS),
+    "Deleting": ((("Deleting original file", "_on_deleting_original"),), ()),
+    "WARNING:": (((None, "_on_warning"),), _NOISE_MARKERS),
+    "ERROR:": (((None, "_on_error"),), ()),
+    "PermissionError:": (((None, "_on_error"),), ()),
+    "AudioProviderError:": (((None, "_on_error"),), ()),
+    "LookupError:": ((("No results found", "_on_lookup_error"),), ()),
+}
+
+# spotdl's own lines ("Downloaded "Artist - Title": <url>", "Skipping ...")
+_SPOTDL_RULES = {
+    "Found": ((("songs in", "_on_found"),), ()),
+    "Downloading": (((None, "_on_spotdl_downloading"),), ()),
+    "Skipping": (((None, "_on_spotdl_skipping"),), ()),
+    "Downloaded": (((None, "_on_spotdl_downloaded"),), ()),
+    "Processing": ((), ()),
+}
+
+# Lines with any other first token: markers found mid-line
+# ("Your application has reached a rate/request limit ...", log-prefixed errors)
+_FALLBACK_RULES = (
+    ("rate/request limit", "_on_rate_limit"),
+    ("No results found", "_on_lookup_error"),
+    ("WARNING:", "_on_warning"),
+    ("ERROR:", "_on_error"),
+    ("PermissionError", "_on_error"),
+    ("AudioProviderError", "_on_error"),
+)
+
+
 class LogParser:
     """Parses stdout lines from spotdl and yt-dlp to extract structured status info."""
     
     def __init__(self):
-        pass
+        def bind(rules):
+            return tuple((marker, getattr(self, name)) for marker, name in rules)
+
+        # (yt-dlp table, spotdl table): first token -> (rules, noise)
+        common = {key: (bind(rules), noise) for key, (rules, noise) in _COMMON_RULES.items()}
+        spotdl = dict(common)
+        spotdl.update({key: (bind(rules), noise) for key, (rules, noise) in _SPOTDL_RULES.items()})
+        self._tables = (common, spotdl)
+        self._fallback = bind(_FALLBACK_RULES)
 
     def parse(self, line: str, tool: str, current_state: str) -> dict:
         """
@@ -30,210 +106,274 @@ class LogParser:
         - log_message: str (formatted info message to log)
         - log_level: str ("info", "warning", "error")
         - log_raw: str (if we want to force raw log broadcast)
+        - item_outcome: (outcome, name) for one input of a batch; outcome is
+          "downloaded", "skipped", "not_found" or "error", name the reported
+          song, file or video id (None if unknown)
+        - match_url: str (source spotdl downloaded a song from)
         """
+        return self.parse_line(line, tool, current_state)[0]
+
+    def parse_line(self, line: str, tool: str, current_state: str) -> tuple:
+        """Same as parse() but also returns whether the line is known noise: (updates, is_noise)."""
         updates = {}
         line = line.strip()
         if not line:
-            return updates
-
-        # 1. SpotDL Start / Found
-        if "Found" in line and "songs in" in line:
-            # Flexible regex for "Found 50 songs in PlaylistName"
-            match = re.search(r"Found (\d+) songs in (.+)", line)
-            if match:
-                try:
-                    count = int(match.group(1))
-                    name = match.group(2).replace("(Playlist)", "").strip()
-                    # ANSI cleanup for name just in case
-                    name = re.sub(r'\x1b\[[0-9;]*m', '', name) 
-                    
-                    updates["total_songs"] = count
-                    updates["log_message"] = f"{C_CYAN}📊 Playlist detectada: {name} ({count} canciones){C_RESET}"
-                except:
-                    pass
-
-        # 2. SpotDL Downloading
-        elif "Downloading" in line and tool == "spotdl":
-            clean = line.replace("Downloading", "").strip().replace('"', '')
-            if "http" not in clean: # avoid "Downloading https://..." urls
-                updates["current_song"] = clean
-                updates["state"] = "downloading"
-                updates["log_message"] = f"{C_CYAN}⬇ Descargando: {clean}{C_RESET}"
-
-        # 3. SpotDL Skipping (Duplicate)
-        elif "Skipping" in line and tool == "spotdl":
-             clean = line.replace("Skipping", "", 1).strip()
-             # Remove "(file already exists) (duplicate)"
-             clean = clean.replace("(file already exists)", "").replace("(duplicate)", "").strip()
-             
-             clean = clean.replace('"', '') # Remove quotes
-             
-             if "http" not in clean: 
-                 updates["current_song"] = clean
-                 updates["downloaded_increment"] = 1 # Count duplicates as processed!
-                 updates["log_message"] = f"{C_GREEN}✔ Ya existe: {clean}{C_RESET}"
-                 # Capture filename for M3U rebuild (even if skipped)
-                 updates["new_filename"] = clean
-
-        # 4. Rate Limits (Friendly)
-        elif "rate/request limit" in line:
-            wait_time = "un momento"
-            match = re.search(r"after:\s*(\d+)", line)
-            if match:
-                wait_time = f"{match.group(1)}s"
-            
-            updates["state"] = "retrying"
-            updates["log_message"] = f"{C_YELLOW}⏳ Límite de Spotify. Esperando {wait_time}...{C_RESET}"
-            updates["log_level"] = "warning"
-
-        # 5. Success (SpotDL)
-        elif "Downloaded" in line and tool == "spotdl":
-            match = re.search(r'Downloaded "(.+?)"', line)
-            song_name = match.group(1) if match else "Canción"
-            updates["downloaded_increment"] = 1
-            updates["current_song"] = f"✔ {song_name}"
-            # Capture filename for manual M3U appending
-            # SpotDL typically outputs: Downloaded "Artist - Title.mp3"
-            # We trust this is the filename relative to output_dir
-            updates["new_filename"] = song_name
-            updates["log_message"] = f"{C_GREEN}✔ Completado: {song_name}{C_RESET}"
+            return updates, False
+
+        # One dict lookup on the first token picks the line's rules
+        key = line.partition(" ")[0]
+        entry = self._tables[tool == "spotdl"].get(key)
+        if entry is None:
+            # Unknown first token: markers that show up mid-line
+            for marker, handler in self._fallback:
+                if marker in line:
+                    return handler(line, updates), key[:1] == "[" and _is_noise(line)
+            return updates, key[:1] == "[" and _is_noise(line)
+
+        rules, noise = entry
+        for marker, handler in rules:
+            if marker is None or marker in line:
+                updates = handler(line, updates)
+                break
+        if noise is not True:
+            noise = bool(noise) and _is_noise(line)
+        return updates, noise
+
+    # 1. SpotDL Start / Found
+    def _on_found(self, line: str, updates: dict) -> dict:
+        # Flexible regex for "Found 50 songs in PlaylistName"
+        match = _FOUND_RE.search(line)
+        if match:
+            try:
+                count = int(match.group(1))
+                name = match.group(2).replace("(Playlist)", "").strip()
+                # ANSI cleanup for name just in case
+                name = _ANSI_RE.sub('', name) 
+                
+                updates["total_songs"] = count
+                updates["log_message"] = f"{C_CYAN}📊 Playlist detectada: {name} ({count} canciones){C_RESET}"
+            except:
+                pass
+        return updates
+
+    # 2. SpotDL Downloading
+    def _on_spotdl_downloading(self, line: str, updates: dict) -> dict:
+        clean = line.replace("Downloading", "").strip().replace('"', '')
+        if "http" not in clean: # avoid "Downloading https://..." urls
+            updates["current_song"] = clean
+            updates["state"] = "downloading"
+            updates["log_message"] = f"{C_CYAN}⬇ Descargando: {clean}{C_RESET}"
+        return updates
+
+    # 3. SpotDL Skipping (Duplicate)
+    def _on_spotdl_skipping(self, line: str, updates: dict) -> dict:
+        clean = line.replace("Skipping", "", 1).strip()
+        # Remove "(file already exists) (duplicate)"
+        clean = clean.replace("(file already exists)", "").replace("(duplicate)", "").strip()
+        
+        clean = clean.replace('"', '') # Remove quotes
+        
+        if "http" not in clean: 
+            updates["current_song"] = clean
+            updates["downloaded_increment"] = 1 # Count duplicates as processed!
+            updates["log_message"] = f"{C_GREEN}✔ Ya existe: {clean}{C_RESET}"
+            # Capture filename for M3U rebuild (even if skipped)
+            updates["new_filename"] = clean
+            updates["item_outcome"] = ("skipped", clean)
+        return updates
+
+    # 4. Rate Limits (Friendly)
+    def _on_rate_limit(self, line: str, updates: dict) -> dict:
+        wait_time = "un momento"
+        match = _RATE_WAIT_RE.search(line)
+        if match:
+            wait_time = f"{match.group(1)}s"
+            updates["rate_limit_wait"] = int(match.group(1))
         
-        # 5b. SpotDL Lookup Error
-        elif "LookupError" in line and "No results found" in line:
-            updates["downloaded_increment"] = 1
-            # "LookupError: No results found for song: Rauw Alejandro - LOKERA"
-            clean = line.split("song:", 1)[-1].strip()
-            updates["log_message"] = f"{C_RED}❌ No encontrado en YouTube: {clean}{C_RESET}"
-
-        # 6. Already Downloaded
-        elif "has already been downloaded" in line:
-             # Try to extract title
-             song_name = "Canción"
-             if "downloads/" in line:
-                 try: 
-                    # Extract filename part
-                    raw_name = line.split("downloads/")[1]
-                    # Remove the suffix
-                    clean_name = raw_name.replace(" has already been downloaded", "")
-                    # Remove extension
-                    if "." in clean_name:
-                        clean_name = clean_name.rsplit(".", 1)[0]
-                    song_name = clean_name
-                 except: pass
-             
-             # Don't increment here if YT-DLP "Downloading item" already counted total?
-             # YT-DLP items are confusing. Usually "Downloading item x of y" is the start.
-             # "has already been" is the result. So yes, increment.
-             updates["downloaded_increment"] = 1
-             updates["log_message"] = f"{C_GREEN}✔ Ya existe: {song_name}{C_RESET}"
-
-        # 7. YT-DLP Item Progress
-        elif "Downloading item" in line and "of" in line:
-             match = re.search(r"Downloading item (\d+) of (\d+)", line)
-             if match:
-                 current = int(match.group(1))
-                 total = int(match.group(2))
-                 updates["total_songs"] = total
-                 updates["current_song"] = f"Procesando {current}/{total}"
-                 updates["log_message"] = f"{C_CYAN}🎵 Procesando canción {current} de {total}{C_RESET}"
-
-        # 7b. YT-DLP Destination (Filename) capture
-        elif "[download] Destination:" in line:
-             # Extract filename
-             try:
-                 parts = line.split("Destination:")[1].strip()
-                 # Keep full path for M3U logic if needed (though [ExtractAudio] is better for final)
-                 full_path = parts
-                 
-                 # Remove path for display
-                 if "/" in parts: parts = parts.rsplit("/", 1)[1]
-                 # Remove ext for display
-                 if "." in parts: parts = parts.rsplit(".", 1)[0]
-                 
-                 updates["current_song"] = parts
-                 updates["state"] = "downloading"
-                 updates["log_message"] = f"{C_CYAN}⬇ Descargando: {parts}{C_RESET}"
-             except: pass
-
-        # 7c. YT-DLP Extract Audio (Final Filename)
-        elif "[ExtractAudio] Destination:" in line:
-             try:
-                 parts = line.split("Destination:")[1].strip()
-                 # This is the final file!
-                 if "/" in parts: 
-                     filename = parts.rsplit("/", 1)[1]
-                     updates["new_filename"] = filename
-             except: pass
-
-        # 8. YT-DLP Warnings
-        elif "WARNING:" in line:
-            clean = line.split("WARNING:")[1].strip()
+        updates["state"] = "retrying"
+        updates["congestion"] = "rate_limit"
+        updates["log_message"] = f"{C_YELLOW}⏳ Límite de Spotify. Esperando {wait_time}...{C_RESET}"
+        updates["log_level"] = "warning"
+        return updates
+
+    # 5. Success (SpotDL)
+    def _on_spotdl_downloaded(self, line: str, updates: dict) -> dict:
+        match = _DOWNLOADED_RE.search(line)
+        song_name = match.group(1) if match else "Canción"
+        updates["downloaded_increment"] = 1
+        updates["current_song"] = f"✔ {song_name}"
+        # Capture filename for manual M3U appending
+        # SpotDL typically outputs: Downloaded "Artist - Title.mp3"
+        # We trust this is the filename relative to output_dir
+        updates["new_filename"] = song_name
+        updates["item_outcome"] = ("downloaded", match.group(1) if match else None)
+        # 'Downloaded "Artist - Title": https://music.youtube.com/watch?v=...' (the chosen source)
+        source = line[match.end():].lstrip(": ").split(" ", 1)[0] if match else ""
+        if source.startswith("http"):
+            updates["match_url"] = source
+        updates["log_message"] = f"{C_GREEN}✔ Completado: {song_name}{C_RESET}"
+        return updates
+
+    # 5b. SpotDL Lookup Error
+    def _on_lookup_error(self, line: str, updates: dict) -> dict:
+        updates["downloaded_increment"] = 1
+        # "LookupError: No results found for song: Rauw Alejandro - LOKERA"
+        clean = line.split("song:", 1)[-1].strip()
+        updates["item_outcome"] = ("not_found", clean)
+        updates["log_message"] = f"{C_RED}❌ No encontrado en YouTube: {clean}{C_RESET}"
+        return updates
+
+    # 6. Already Downloaded
+    def _on_already_downloaded(self, line: str, updates: dict) -> dict:
+        # Try to extract title
+        song_name = "Canción"
+        # "[download] <path>/<title> [<id>].opus has already been downloaded"
+        updates["item_outcome"] = ("skipped", line.replace("[download]", "").replace(" has already been downloaded", "").strip())
+        if "downloads/" in line:
+            try: 
+                # Extract filename part
+                raw_name = line.split("downloads/")[1]
+                # Remove the suffix
+                clean_name = raw_name.replace(" has already been downloaded", "")
+                # Remove extension
+                if "." in clean_name:
+                    clean_name = clean_name.rsplit(".", 1)[0]
+                song_name = clean_name
+            except: pass
+        
+        # Don't increment here if YT-DLP "Downloading item" already counted total?
+        # YT-DLP items are confusing. Usually "Downloading item x of y" is the start.
+        # "has already been" is the result. So yes, increment.
+        updates["downloaded_increment"] = 1
+        updates["log_message"] = f"{C_GREEN}✔ Ya existe: {song_name}{C_RESET}"
+        return updates
+
+    # 6b. YT-DLP --download-archive hit ("[download] <id>: has already been recorded in the archive")
+    def _on_archived(self, line: str, updates: dict) -> dict:
+        video_id = line.replace("[download]", "").split(":", 1)[0].strip()
+        updates["downloaded_increment"] = 1
+        updates["item_outcome"] = ("skipped", video_id)
+        updates["log_message"] = f"{C_GREEN}✔ Ya descargado (archivo): {video_id}{C_RESET}"
+        return updates
+
+    # 7. YT-DLP Item Progress
+    def _on_item_progress(self, line: str, updates: dict) -> dict:
+        match = _ITEM_RE.search(line)
+        if match:
+            current = int(match.group(1))
+            total = int(match.group(2))
+            updates["total_songs"] = total
+            updates["current_song"] = f"Procesando {current}/{total}"
+            updates["log_message"] = f"{C_CYAN}🎵 Procesando canción {current} de {total}{C_RESET}"
+        return updates
+
+    # 7b. YT-DLP Destination (Filename) capture
+    def _on_destination(self, line: str, updates: dict) -> dict:
+        # Extract filename
+        try:
+            parts = line.split("Destination:")[1].strip()
+            # Keep full path for M3U logic if needed (though [ExtractAudio] is better for final)
+            full_path = parts
             
-            if ("SABR streaming" in clean or 
-                "web_safari client" in clean or 
-                "web client" in clean or
-                "missing a url" in clean or
-                "JavaScript runtime" in clean): 
-                return {} 
+            # Remove path for display
+            if "/" in parts: parts = parts.rsplit("/", 1)[1]
+            # Remove ext for display
+            if "." in parts: parts = parts.rsplit(".", 1)[0]
             
-            # If warning is about error in attempt, ignore safely as we handle retries
-            if "Error en intento" in clean:
-                return {}
-
-            updates["log_message"] = f"{C_YELLOW}⚠ {clean}{C_RESET}"
-            updates["log_level"] = "warning"
-
-        # 9. YT-DLP Errors
-        elif "ERROR:" in line or "PermissionError" in line or "AudioProviderError" in line:
-             clean = line.replace("ERROR:", "").replace("downloader.core:", "").strip()
-             increment = 0
-             
-             if "PermissionError" in line:
-                 clean = "Error de permisos (No se puede escribir en disco)"
-             elif "AudioProviderError" in line:
-                 # Clean up the spotdl wrapper error
-                 clean = clean.replace("AudioProviderError:", "").strip()
-                 if "YT-DLP download error" in clean:
-                     clean = "Error de YT-DLP (Posible bloqueo o login requerido)"
-             elif "Video unavailable" in clean:
-                 clean = "Vídeo no disponible"
-                 increment = 1 # Count unavailable videos as processed (failed)
-             elif "fragment" in clean:
-                 increment = 0 # Fragment errors usually retry
-             
-             if increment > 0:
-                 updates["downloaded_increment"] = increment
-                 
-             updates["log_message"] = f"{C_RED}❌ Error: {clean}{C_RESET}"
-             updates["log_level"] = "error"
-
-        # 10. YT-DLP Specific Events (New)
-        elif "[download] Download completed" in line:
-             updates["downloaded_increment"] = 1
-             # Try to find current song if possible, or just generic success
-             # Unfortunately yt-dlp doesn't repeat the filename here easily unless we tracked it.
-             # But we can just say "Completed".
-             updates["log_message"] = f"{C_GREEN}✔ Descarga completada{C_RESET}"
-             
-        elif "Deleting original file" in line:
-             # "Deleting original file downloads/NA - ... (pass -k to keep)"
-             updates["log_message"] = f"{C_CYAN}🧹 Limpiando archivos temporales...{C_RESET}"
-             
-        elif "[info]" in line and "Downloading 1 format(s)" in line:
-             # "[info] 6WrVXWgn094: Downloading 1 format(s): 251"
-             updates["log_message"] = f"{C_CYAN}⚡ Iniciando descarga de formatos...{C_RESET}"
-
-        # 11. Skip Noise (Webpage, etc)
-        elif "Downloading webpage" in line or "Extracting URL" in line:
-             pass # Silent
-
-        # 11. Generic "Processing" for YT-DLP
-        elif "[download]" in line and "%" in line:
-             # 23.5% of 10.00MiB at 2.00MiB/s ETA 00:05
-             updates["state"] = "downloading"
-             # No log message to avoid spam, frontend handles progress bar if we parsed it (TODO)
-             # sending raw for "hacker console" feel? User wants easy.
-             # Let's send 1 simple update every 20%? No too complex state.
-             pass
+            updates["current_song"] = parts
+            updates["state"] = "downloading"
+            updates["log_message"] = f"{C_CYAN}⬇ Descargando: {parts}{C_RESET}"
+        except: pass
+        return updates
+
+    # 7c. YT-DLP Extract Audio (Final Filename)
+    def _on_extract_audio(self, line: str, updates: dict) -> dict:
+        try:
+            parts = line.split("Destination:")[1].strip()
+            # This is the final file!
+            if "/" in parts: 
+                filename = parts.rsplit("/", 1)[1]
+                updates["new_filename"] = filename
+                updates["item_outcome"] = ("downloaded", filename)
+        except: pass
+        return updates
+
+    # 8. YT-DLP Warnings
+    def _on_warning(self, line: str, updates: dict) -> dict:
+        clean = line.split("WARNING:")[1].strip()
+        
+        if ("SABR streaming" in clean or 
+            "web_safari client" in clean or 
+            "web client" in clean or
+            "missing a url" in clean or
+            "JavaScript runtime" in clean): 
+            return {} 
+        
+        # If warning is about error in attempt, ignore safely as we handle retries
+        if "Error en intento" in clean:
+            return {}
+
+        updates["log_message"] = f"{C_YELLOW}⚠ {clean}{C_RESET}"
+        updates["log_level"] = "warning"
+        return updates
+
+    # 9. YT-DLP Errors
+    def _on_error(self, line: str, updates: dict) -> dict:
+        clean = line.replace("ERROR:", "").replace("downloader.core:", "").strip()
+        increment = 0
+        # yt-dlp names the video ("ERROR: [youtube] <id>: ..."), spotdl errors name no song
+        match = _EXTRACTOR_ID_RE.match(line)
+        outcome = "error"
+        
+        if "PermissionError" in line:
+            clean = "Error de permisos (No se puede escribir en disco)"
+        elif "AudioProviderError" in line:
+            # Clean up the spotdl wrapper error
+            clean = clean.replace("AudioProviderError:", "").strip()
+            updates["congestion"] = "audio_provider_error"
+            if "YT-DLP download error" in clean:
+                clean = "Error de YT-DLP (Posible bloqueo o login requerido)"
+                updates["congestion"] = "ytdlp_error"
+        elif "Video unavailable" in clean:
+            clean = "Vídeo no disponible"
+            increment = 1 # Count unavailable videos as processed (failed)
+            outcome = "not_found"
+        elif "fragment" in clean:
+            increment = 0 # Fragment errors usually retry
+        elif line.startswith("ERROR: ["):
+            # yt-dlp extractor errors ("ERROR: [youtube] ...: Sign in to confirm ...")
+            updates["congestion"] = "ytdlp_error"
+        
+        if increment > 0:
+            updates["downloaded_increment"] = increment
+        updates["item_outcome"] = (outcome, match.group(1) if match else None)
+            
+        updates["log_message"] = f"{C_RED}❌ Error: {clean}{C_RESET}"
+        updates["log_level"] = "error"
+        return updates
+
+    # 10. YT-DLP Specific Events (New)
+    def _on_download_completed(self, line: str, updates: dict) -> dict:
+        updates["downloaded_increment"] = 1
+        # Try to find current song if possible, or just generic success
+        # Unfortunately yt-dlp doesn't repeat the filename here easily unless we tracked it.
+        # But we can just say "Completed".
+        updates["log_message"] = f"{C_GREEN}✔ Descarga completada{C_RESET}"
+        return updates
+
+    def _on_deleting_original(self, line: str, updates: dict) -> dict:
+        # "Deleting original file downloads/NA - ... (pass -k to keep)"
+        updates["log_message"] = f"{C_CYAN}🧹 Limpiando archivos temporales...{C_RESET}"
+        return updates
+
+    def _on_formats(self, line: str, updates: dict) -> dict:
+        # "[info] 6WrVXWgn094: Downloading 1 format(s): 251"
+        updates["log_message"] = f"{C_CYAN}⚡ Iniciando descarga de formatos...{C_RESET}"
+        return updates
 
+    # 11. Generic "Processing" for YT-DLP
+    def _on_progress(self, line: str, updates: dict) -> dict:
+        # 23.5% of 10.00MiB at 2.00MiB/s ETA 00:05
+        updates["state"] = "downloading"
+        # No log message to avoid spam, frontend handles progress bar if we parsed it (TODO)
         return updates
@@ -0,0 +1,165 @@
+
+import os
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+logger = logging.getLogger("downloader.m3u")
+
+M3U_HEADER = "#EXTM3U"
+
+
+def parse_m3u(text: str) -> List[Tuple[int, str]]:
+    """Returns (duration, path_line) for every entry, in playlist order."""
+    entries = []
+    duration = 0
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF:"):
+            try:
+                duration = int(float(line[8:].split(",", 1)[0]))
+            except ValueError:
+                duration = 0
+        elif not line.startswith("#"):
+            entries.append((max(duration, 0), line))
+            duration = 0
+    return entries
+
+
+class M3UWriter:
+    """
+    Incremental writer for a single playlist .m3u8 file.
+
+    The file is read once (lazily, on first use) and kept in memory together
+    with a set of its entries, so duplicate checks are O(1) instead of
+    re-reading the playlist for every track. New entries are buffered and
+    written atomically (temp file + rename) every `flush_every` additions and
+    whenever `flush()` / `close()` is called.
+
+    The bytes produced are the same the old append-per-track logic wrote:
+    header only for empty/new files, entries joined by a single newline and
+    no trailing newline until `normalize_paths()` rewrites the file.
+    """
+
+    def __init__(self, path: str, flush_every: int = 25, playlist_id: Optional[str] = None):
+        self.path = Path(path)
+        self.flush_every = max(1, flush_every)
+        self.playlist_id = playlist_id  # Library index owner (if tracked)
+        self.lock = threading.RLock()
+
+        self._loaded = False
+        self._exists = False
+        self._text = ""            # Content as it is on disk
+        self._pending: List[str] = []  # Chunks not written yet
+        self._entries: Set[str] = set()
+
+    def _load(self):
+        if self._loaded:
+            return
+        if self.path.exists():
+            # newline="" keeps the original line endings untouched on rewrite
+            with open(self.path, "r", encoding="utf-8", newline="") as f:
+                self._text = f.read()
+            self._exists = True
+        self._entries = {l.strip() for l in self._text.splitlines() if l.strip()}
+        self._loaded = True
+
+    def _size(self) -> int:
+        return len(self._text) + sum(len(c) for c in self._pending)
+
+    def __contains__(self, file_line: str) -> bool:
+        with self.lock:
+            self._load()
+            return file_line in self._entries
+
+    def add(self, duration: int, title: str, file_line: str) -> bool:
+        """Queues an entry. Returns False if `file_line` is already listed."""
+        with self.lock:
+            self._load()
+            if file_line in self._entries:
+                return False
+
+            extinf_line = f"#EXTINF:{duration},{title}"
+            chunk = ""
+            if self._size() == 0:
+                # Header if missing/new file
+                chunk += f"{M3U_HEADER}\n"
+            else:
+                chunk += "\n"
+            chunk += f"{extinf_line}\n{file_line}"
+
+            self._pending.append(chunk)
+            self._entries.add(extinf_line)
+            self._entries.add(file_line)
+
+            if len(self._pending) >= self.flush_every:
+                self.flush()
+            return True
+
+    def _write(self, text: str):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=f".{self.path.name}.", suffix=".tmp", dir=str(self.path.parent))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            if self._exists:
+                try:
+                    os.chmod(tmp, self.path.stat().st_mode & 0o7777)
+                except OSError:
+                    pass
+            os.replace(tmp, self.path)
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self._text = text
+        self._exists = True
+
+    def flush(self):
+        """Writes buffered entries to disk atomically."""
+        with self.lock:
+            if not self._pending:
+                return
+            self._write(self._text + "".join(self._pending))
+            self._pending = []
+
+    def normalize_paths(self) -> bool:
+        """
+        Rewrites every path line as `./<filename>` and ends the file with a
+        newline. Returns False if the playlist file does not exist yet.
+        """
+        with self.lock:
+            self._load()
+            self.flush()
+            if not self._exists:
+                return False
+
+            new_lines = []
+            for line in self._text.splitlines():
+                if line.startswith("#") or not line.strip():
+                    new_lines.append(line)
+                    continue
+                filename = Path(line).name
+                # Enforce ./ prefix to match the entries written by add()
+                if not filename.startswith("./"):
+                    filename = f"./{filename}"
+                new_lines.append(filename)
+
+            self._write("\n".join(new_lines) + "\n")
+            self._entries = {l.strip() for l in new_lines if l.strip()}
+            return True
+
+    def tracks(self) -> List[Tuple[int, str]]:
+        """Parsed entries, buffered ones included (see parse_m3u)."""
+        with self.lock:
+            self._load()
+            return parse_m3u(self._text + "".join(self._pending))
+
+    def close(self):
+        self.flush()
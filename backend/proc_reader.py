@@ -0,0 +1,120 @@
+
+import os
+import re
+import logging
+import selectors
+import threading
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger("downloader.proc_reader")
+
+CHUNK_SIZE = 65536
+
+# \r\n first so Windows-style endings don't produce an extra empty line
+_LINE_SPLIT_RE = re.compile(r"\r\n|\r|\n")
+
+
+class LineSplitter:
+    """
+    Incremental bytes -> lines splitter shared by LineReader and the asyncio
+    engine. Splits on \\n, \\r\\n and bare \\r like text mode does.
+
+    With `collapse_cr`, \\r-separated updates read together are reduced to
+    the last one, which is what a terminal would show (yt-dlp
+    "[download]  42.0% ..." bursts). Returned lines may be empty.
+    """
+
+    def __init__(self, collapse_cr: bool = True):
+        self.collapse_cr = collapse_cr
+        self._buf = b""
+
+    def feed(self, data: bytes, final: bool = False) -> List[str]:
+        data = self._buf + data
+        # Decode only complete lines: a chunk may end inside a UTF-8 sequence
+        cut = len(data) if final else max(data.rfind(b"\n"), data.rfind(b"\r")) + 1
+        self._buf = data[cut:]
+        if not cut:
+            return []
+        text = data[:cut].decode("utf-8", errors="replace")
+        if not self.collapse_cr:
+            return _LINE_SPLIT_RE.split(text)
+        lines = text.replace("\r\n", "\n").split("\n")
+        if "\r" in text:
+            # "12%\r13%\r14%" -> "14%"
+            lines = [l.rstrip("\r").rpartition("\r")[2] for l in lines]
+        return lines
+
+    def flush(self) -> List[str]:
+        """Remaining unterminated output (at EOF)."""
+        return self.feed(b"", final=True)
+
+
+class LineReader:
+    """
+    Event-driven line reader for a subprocess pipe.
+
+    Sleeps in a selector until the pipe has data, reaches EOF or `wake()` is
+    called (e.g. from DownloaderManager.stop), reads up to CHUNK_SIZE bytes at
+    a time and splits lines with a LineSplitter. Yielded lines may be empty.
+    """
+
+    def __init__(self, stream, stop_event: Optional[threading.Event] = None, collapse_cr: bool = True):
+        self.stream = stream
+        self.fd = stream.fileno()
+        self.stop_event = stop_event
+        self.splitter = LineSplitter(collapse_cr)
+        self.stopped = False  # True if iteration ended because of a stop signal
+
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self.fd, False)
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.fd, selectors.EVENT_READ, "data")
+        self._selector.register(self._wake_r, selectors.EVENT_READ, "wake")
+
+    def wake(self):
+        """Interrupts a pending wait (safe to call from any thread)."""
+        try:
+            os.write(self._wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass  # Pipe full (already woken) or reader closed
+
+    def _should_stop(self) -> bool:
+        return bool(self.stop_event and self.stop_event.is_set())
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            if self._should_stop():
+                self.stopped = True
+                return
+            for key, _ in self._selector.select():
+                if key.data == "wake":
+                    try:
+                        while os.read(self._wake_r, 512):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                try:
+                    chunk = os.read(self.fd, CHUNK_SIZE)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    # EOF: flush the unterminated tail
+                    for line in self.splitter.flush():
+                        yield line
+                    return
+                for line in self.splitter.feed(chunk):
+                    yield line
+
+    def close(self):
+        try:
+            self._selector.close()
+        except Exception:
+            pass
+        for fd in (self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
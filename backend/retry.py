@@ -0,0 +1,122 @@
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("downloader.retry")
+
+DEFAULTS = {
+    "attempts": 1,
+    "backoff_seconds": 5.0,       # Cap of the first retry's delay
+    "multiplier": 2.0,            # Cap growth per attempt
+    "max_backoff_seconds": 300.0,
+    "jitter": True,               # Full jitter: uniform(0, cap)
+}
+
+
+class RetryPolicy:
+    """
+    Delays between attempts of a queue item, for one download job.
+
+    Attempt n (1 = first retry) waits uniform(0, cap) with
+    cap = min(max_backoff_seconds, backoff_seconds * multiplier ** (n - 1))
+    ("full jitter"), so workers that failed together don't retry together.
+    With `jitter` off the wait is the cap itself.
+
+    Server wait hints (Spotify "rate/request limit ... after: N") are a
+    hard minimum: `hold(seconds)` makes every retry that starts before the
+    hint runs out wait at least until then, whichever worker it is on.
+    New launches are held back by the token bucket (see throttle.py).
+
+    `wait()` / `wait_async()` sleep and give up as soon as the stop signal
+    is set; `report()` has the counters for job history since `reset()`.
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        self.lock = threading.Lock()
+        self._hold_until = 0.0
+        self.configure(settings)
+        self.reset()
+
+    def configure(self, settings: Optional[Dict[str, Any]] = None):
+        cfg = dict(DEFAULTS)
+        cfg.update(settings or {})
+        try:
+            self.attempts = max(1, int(cfg["attempts"]))
+            self.base = max(0.0, float(cfg["backoff_seconds"]))
+            self.multiplier = max(1.0, float(cfg["multiplier"]))
+            self.max_delay = max(self.base, float(cfg["max_backoff_seconds"]))
+        except (TypeError, ValueError):
+            self.attempts, self.base = DEFAULTS["attempts"], DEFAULTS["backoff_seconds"]
+            self.multiplier, self.max_delay = DEFAULTS["multiplier"], DEFAULTS["max_backoff_seconds"]
+        self.jitter = bool(cfg["jitter"])
+
+    def reset(self):
+        """Zeroes the counters (job boundary). A running server hold stays."""
+        with self.lock:
+            self._retries = 0
+            self._backoff_total = 0.0
+            self._hinted = 0
+            self._longest_hint = 0.0
+
+    def hold(self, seconds: float):
+        """Server wait hint: no retry starts before `seconds` from now (extends, never shortens)."""
+        seconds = max(0.0, float(seconds))
+        with self.lock:
+            self._hold_until = max(self._hold_until, time.monotonic() + seconds)
+            self._longest_hint = max(self._longest_hint, seconds)
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retry number `attempt` (1-based)."""
+        return self._delay(attempt)[0]
+
+    def _delay(self, attempt: int) -> tuple:
+        # (seconds, whether the server hint set them)
+        cap = min(self.max_delay, self.base * self.multiplier ** max(0, attempt - 1))
+        backoff = random.uniform(0.0, cap) if self.jitter else cap
+        with self.lock:
+            hinted = self._hold_until - time.monotonic()
+        return (hinted, True) if hinted > backoff else (backoff, False)
+
+    def _start(self, attempt: int) -> float:
+        seconds, hinted = self._delay(attempt)
+        with self.lock:
+            self._retries += 1
+            self._backoff_total += seconds
+            if hinted:
+                self._hinted += 1
+        logger.info(f"⏳ Reintento {attempt} en {seconds:.1f}s")
+        return seconds
+
+    def wait(self, attempt: int, stop_event: Optional[threading.Event] = None) -> bool:
+        """Sleeps before retry `attempt` (threads). False if stopped first."""
+        seconds = self._start(attempt)
+        if stop_event is None:
+            time.sleep(seconds)
+            return True
+        return not stop_event.wait(seconds)
+
+    async def wait_async(self, attempt: int, stop_event: Optional[asyncio.Event] = None) -> bool:
+        """wait() for the asyncio engine."""
+        seconds = self._start(attempt)
+        if stop_event is None:
+            await asyncio.sleep(seconds)
+            return True
+        try:
+            await asyncio.wait_for(stop_event.wait(), seconds)
+            return False
+        except asyncio.TimeoutError:
+            return True
+
+    def report(self) -> Dict:
+        """Counters for job history."""
+        with self.lock:
+            return {
+                "retries": self._retries,
+                "backoff_seconds": round(self._backoff_total, 1),
+                "server_hinted": self._hinted,
+                "longest_hint_seconds": round(self._longest_hint, 1),
+            }
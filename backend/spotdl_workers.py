@@ -0,0 +1,240 @@
+
+import os
+import sys
+import json
+import logging
+import threading
+import subprocess
+from typing import Callable, List, Optional
+
+try:
+    from backend.proc_reader import LineReader
+except ImportError:
+    from proc_reader import LineReader
+
+logger = logging.getLogger("downloader.spotdl_workers")
+
+DEFAULT_ENTRY = "spotdl.console.entry_point:console_entry_point"
+DEFAULT_MAX_REQUESTS = 50
+
+# Control lines on the worker's stdout. spotdl never prints this prefix.
+MARK = "@@spotdl-worker@@"
+
+
+class WorkerUnavailable(Exception):
+    """The worker couldn't load spotdl (run commands as subprocesses instead)."""
+
+
+class SpotdlWorker:
+    """
+    One long-lived Python process that imported spotdl once and runs
+    `spotdl <args>` requests in-process, one at a time.
+
+    Requests are JSON lines on the worker's stdin. Output (stdout + stderr)
+    is the same spotdl prints as a command, followed by a `MARK DONE <rc>`
+    line. The process has its own session so stop() can killpg it like any
+    spotdl subprocess; a killed worker is discarded, never reused.
+    """
+
+    def __init__(self, entry: str, stop_event: Optional[threading.Event] = None):
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", os.path.abspath(__file__), entry],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+        self.reader = LineReader(self.proc.stdout, stop_event)
+        self._lines = iter(self.reader)
+        self.requests = 0
+        self.broken = False
+
+    @property
+    def alive(self) -> bool:
+        return not self.broken and self.proc.poll() is None
+
+    def run(self, args: List[str], on_line: Callable[[str], None]) -> Optional[int]:
+        """
+        Runs `spotdl <args>`, calling on_line(line) for each output line.
+        Returns the exit code, or None if the worker died or was stopped
+        before finishing (it can't be reused then).
+        """
+        self.requests += 1
+        try:
+            self.proc.stdin.write((json.dumps({"argv": args}) + "\n").encode("utf-8"))
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            self.broken = True
+            return None
+        for line in self._lines:
+            if line.startswith(MARK):
+                _, kind, value = (line.strip().split(" ", 2) + ["", ""])[:3]
+                if kind == "DONE":
+                    try:
+                        return int(value)
+                    except ValueError:
+                        return 1
+                if kind == "UNAVAILABLE":
+                    self.broken = True
+                    raise WorkerUnavailable(value)
+                continue
+            on_line(line)
+        # EOF or stop signal
+        self.broken = True
+        return None
+
+    def close(self, timeout: float = 2.0):
+        """Lets the worker exit (EOF on stdin), killing it if it doesn't."""
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(os.getpgid(self.proc.pid), 9)
+            except (ProcessLookupError, PermissionError):
+                pass
+            try:
+                self.proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                pass
+        self.reader.close()
+        try:
+            self.proc.stdout.close()
+        except OSError:
+            pass
+
+
+class SpotdlWorkerPool:
+    """
+    Idle SpotdlWorkers for one download job. `acquire()` hands out an idle
+    worker (or starts one), `release()` takes it back. Concurrency is
+    bounded by the job's worker slots, not here.
+
+    Workers are replaced after `max_requests` runs (spotdl keeps some state
+    between runs). If a worker can't load spotdl, `unavailable` is set and
+    callers fall back to one subprocess per command.
+    """
+
+    def __init__(self, entry: str = DEFAULT_ENTRY, max_requests: int = DEFAULT_MAX_REQUESTS,
+                 stop_event: Optional[threading.Event] = None):
+        self.entry = entry or DEFAULT_ENTRY
+        self.max_requests = max(1, int(max_requests))
+        self.stop_event = stop_event
+        self.lock = threading.Lock()
+        self.idle: List[SpotdlWorker] = []
+        self.started = 0
+        self.unavailable = False
+
+    def acquire(self) -> SpotdlWorker:
+        with self.lock:
+            while self.idle:
+                worker = self.idle.pop()
+                if worker.alive:
+                    return worker
+                worker.close(timeout=0)
+            self.started += 1
+        logger.debug(f"Iniciando worker de spotdl #{self.started}")
+        return SpotdlWorker(self.entry, self.stop_event)
+
+    def release(self, worker: SpotdlWorker):
+        if worker.alive and worker.requests < self.max_requests:
+            with self.lock:
+                self.idle.append(worker)
+                return
+        worker.close(timeout=0 if worker.broken else 2.0)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for worker in idle:
+            worker.close()
+
+
+# --- Worker process ---
+
+def _load_entry(spec: str) -> Callable:
+    """'package.module:function' or '/path/to/script:function'."""
+    target, _, func = spec.rpartition(":")
+    if os.sep in target or target.endswith(".py"):
+        import importlib.machinery
+        import importlib.util
+        path = os.path.abspath(target)
+        sys.path.insert(0, os.path.dirname(path))
+        loader = importlib.machinery.SourceFileLoader("_spotdl_worker_entry", path)
+        spec_obj = importlib.util.spec_from_loader(loader.name, loader)
+        module = importlib.util.module_from_spec(spec_obj)
+        loader.exec_module(module)
+    else:
+        import importlib
+        module = importlib.import_module(target)
+    return getattr(module, func)
+
+
+def _reset_spotdl():
+    """Undoes the global state a spotdl run leaves behind."""
+    try:
+        from spotdl.utils.spotify import SpotifyClient
+        SpotifyClient._instance = None  # "A spotify client has already been initialized"
+    except Exception:
+        pass
+
+
+def _run_request(entry: Callable, argv: List[str]) -> int:
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    sys.argv = ["spotdl"] + argv
+    try:
+        rc = entry()
+        code = rc if isinstance(rc, int) else 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException as e:
+        import traceback
+        traceback.print_exc()
+        print(f"An error occurred: {e}", file=sys.stderr)
+        code = 1
+    finally:
+        # spotdl sets up its logging on every run
+        for handler in list(root.handlers):
+            if handler not in handlers:
+                root.removeHandler(handler)
+        root.setLevel(level)
+        _reset_spotdl()
+    return code
+
+
+def _emit(kind: str, value) -> None:
+    # Straight to fd 1, on a line of its own, after anything spotdl left buffered
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+    os.write(1, f"\n{MARK} {kind} {value}\n".encode("utf-8"))
+
+
+def worker_main(spec: str) -> int:
+    requests = sys.stdin.buffer
+    # spotdl must not read our requests
+    sys.stdin = open(os.devnull, "r")
+    try:
+        entry = _load_entry(spec)
+    except BaseException as e:
+        _emit("UNAVAILABLE", f"{type(e).__name__}: {e}")
+        return 3
+
+    for raw in requests:
+        try:
+            argv = json.loads(raw.decode("utf-8"))["argv"]
+        except (ValueError, KeyError, TypeError):
+            _emit("DONE", 2)
+            continue
+        _emit("DONE", _run_request(entry, argv))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(worker_main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ENTRY))
@@ -0,0 +1,135 @@
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("downloader.status")
+
+# States that end a job: sent immediately, never held back by the rate limit
+TERMINAL_STATES = {"idle", "stopped", "error"}
+
+DEFAULT_MAX_RATE = 10.0  # Frames per second
+
+_MISSING = object()
+
+
+class StatusPublisher:
+    """
+    Coalesces status changes into versioned delta frames.
+
+    Callers mutate the status dict as before and call `publish()`. Changes
+    are merged until the next frame is due (at most `max_rate` frames per
+    second), then a single "status_delta" event carries only the fields that
+    differ from the previous frame:
+
+        {"version": 42, "changes": {"downloaded": 17, "current_song": "..."}}
+
+    A change to a terminal state (see TERMINAL_STATES) or `publish(flush=True)`
+    sends right away. `snapshot()` returns the full status as of the last
+    frame plus its version, for clients that connect mid-job.
+
+    Trailing frames are scheduled with `loop.call_later` when `publish()` runs
+    on an event loop (asyncio engine) and with a threading.Timer otherwise.
+    """
+
+    def __init__(self, status: Dict[str, Any], send: Optional[Callable[[str, Any], None]],
+                 max_rate: float = DEFAULT_MAX_RATE):
+        self.status = status
+        self.send = send
+        self.max_rate = max_rate
+        self.lock = threading.Lock()
+
+        self._version = 0
+        self._sent: Dict[str, Any] = dict(status)  # Status as of the last frame
+        self._last_emit = 0.0
+        self._timer = None  # threading.Timer or asyncio.TimerHandle
+        self._timer_loop: Optional[asyncio.AbstractEventLoop] = None  # Loop of an asyncio timer
+        self._timer_gen = 0  # Bumped per scheduled timer: a stale one that fires does nothing
+
+    @property
+    def max_rate(self) -> float:
+        return self._max_rate
+
+    @max_rate.setter
+    def max_rate(self, value: float):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = DEFAULT_MAX_RATE
+        # 0 or negative disables coalescing (one frame per change)
+        self._max_rate = value if value > 0 else 0.0
+
+    def publish(self, flush: bool = False):
+        """Notes that the status changed; sends now or at the next free slot."""
+        with self.lock:
+            if flush or self.status.get("state") in TERMINAL_STATES or not self._max_rate:
+                self._emit()
+                return
+            wait = self._last_emit + 1.0 / self._max_rate - time.monotonic()
+            if wait <= 0:
+                self._emit()
+            elif self._timer is None:
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    loop = None
+                self._timer_gen += 1
+                self._timer_loop = loop
+                if loop is not None:
+                    self._timer = loop.call_later(wait, self._on_timer, self._timer_gen)
+                else:
+                    self._timer = threading.Timer(wait, self._on_timer, (self._timer_gen,))
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def flush(self):
+        """Sends pending changes (if any) right away."""
+        self.publish(flush=True)
+
+    def snapshot(self) -> Tuple[int, Dict[str, Any]]:
+        """(version, full status) as of the last frame sent."""
+        with self.lock:
+            return self._version, dict(self._sent)
+
+    def _on_timer(self, gen: int):
+        with self.lock:
+            # A timer cancelled (or replaced) while it was already firing
+            if self._timer is None or gen != self._timer_gen:
+                return
+            self._timer = None
+            self._emit()
+
+    def _cancel_timer(self):
+        # Caller holds the lock. TimerHandle.cancel() is only safe on its own loop
+        timer, loop = self._timer, self._timer_loop
+        self._timer = self._timer_loop = None
+        if loop is None:
+            timer.cancel()
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            timer.cancel()
+        elif not loop.is_closed():
+            loop.call_soon_threadsafe(timer.cancel)
+
+    def _emit(self):
+        # Caller holds the lock: frames leave in version order
+        if self._timer is not None:
+            self._cancel_timer()
+        current = dict(self.status)
+        changes = {k: v for k, v in current.items() if self._sent.get(k, _MISSING) != v}
+        if not changes:
+            return
+        self._version += 1
+        self._sent = current
+        self._last_emit = time.monotonic()
+        if self.send:
+            try:
+                self.send("status_delta", {"version": self._version, "changes": changes})
+            except Exception as e:
+                logger.error(f"Status broadcast failed: {e}")
@@ -0,0 +1,140 @@
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger("downloader.throttle")
+
+DEFAULT_RATE_PER_MINUTE = 20.0
+DEFAULT_BURST = 2
+
+
+class TokenBucket:
+    """
+    Shared gate for spotdl launches across all download workers.
+
+    Tokens refill at `rate_per_minute` up to `burst`; every command start
+    takes one. `pause(seconds)` (Spotify "rate/request limit ... after: N")
+    holds back every worker until the pause ends, on top of the bucket.
+
+    `try_acquire()` never blocks: it returns 0 when a token was taken, or
+    the seconds to wait before trying again. `acquire()` (threads) and
+    `acquire_async()` (asyncio engine) wait on top of it and give up as soon
+    as the stop signal is set.
+    """
+
+    def __init__(self, rate_per_minute: float = DEFAULT_RATE_PER_MINUTE, burst: int = DEFAULT_BURST):
+        self.lock = threading.Lock()
+        self.rate_per_minute = 0.0
+        self.burst = DEFAULT_BURST
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = 0
+        self.configure(rate_per_minute, burst)
+        self._tokens = float(self.burst)
+
+    def configure(self, rate_per_minute: float, burst: int):
+        with self.lock:
+            self._refill(time.monotonic())
+            try:
+                rate = float(rate_per_minute)
+            except (TypeError, ValueError):
+                rate = DEFAULT_RATE_PER_MINUTE
+            # 0 or negative disables the bucket (pauses still apply)
+            self.rate_per_minute = rate if rate > 0 else 0.0
+            try:
+                self.burst = max(1, int(burst))
+            except (TypeError, ValueError):
+                self.burst = DEFAULT_BURST
+            self._tokens = min(self._tokens, float(self.burst))
+
+    def _refill(self, now: float):
+        # Caller holds the lock
+        if self.rate_per_minute:
+            elapsed = max(0.0, now - self._updated)
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate_per_minute / 60.0)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Blocks new launches for `seconds` (extends, never shortens, a running pause)."""
+        with self.lock:
+            until = time.monotonic() + max(0.0, float(seconds))
+            if until > self._paused_until:
+                self._paused_until = until
+                logger.info(f"⏳ Pausando descargas {seconds:.0f}s por límite de Spotify")
+
+    def try_acquire(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if not self.rate_per_minute:
+                return 0.0
+            self._refill(now)
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) * 60.0 / self.rate_per_minute
+
+    def acquire(self, stop_event: Optional[threading.Event] = None) -> bool:
+        """Waits for a token. False if stopped first."""
+        with self.lock:
+            self._waiting += 1
+        try:
+            while True:
+                wait = self.try_acquire()
+                if wait <= 0:
+                    return True
+                if stop_event is not None:
+                    if stop_event.wait(wait):
+                        return False
+                else:
+                    time.sleep(wait)
+        finally:
+            with self.lock:
+                self._waiting -= 1
+
+    async def acquire_async(self, stop_event: Optional[asyncio.Event] = None) -> bool:
+        """acquire() for the asyncio engine."""
+        with self.lock:
+            self._waiting += 1
+        try:
+            while True:
+                wait = self.try_acquire()
+                if wait <= 0:
+                    return True
+                if stop_event is None:
+                    await asyncio.sleep(wait)
+                    continue
+                try:
+                    await asyncio.wait_for(stop_event.wait(), wait)
+                    return False
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self.lock:
+                self._waiting -= 1
+
+    def snapshot(self) -> Dict:
+        """Current permits and wait, for /status."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            paused = max(0.0, self._paused_until - now)
+            if paused:
+                wait = paused
+            elif not self.rate_per_minute or self._tokens >= 1.0:
+                wait = 0.0
+            else:
+                wait = (1.0 - self._tokens) * 60.0 / self.rate_per_minute
+            return {
+                "permits": int(self._tokens) if self.rate_per_minute else None,
+                "burst": self.burst,
+                "rate_per_minute": self.rate_per_minute,
+                "paused_for": round(paused, 1),
+                "wait_seconds": round(wait, 1),
+                "waiting": self._waiting,
+            }
@@ -0,0 +1,184 @@
+
+import os
+import re
+import shutil
+import hashlib
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger("downloader.track_pool")
+
+POOL_DIR_NAME = ".pool"
+HASH_CHUNK = 1024 * 1024
+
+
+def track_key(name: str) -> str:
+    """
+    Key for "the same song" by name: accents folded, case and punctuation
+    ignored. "Rosalía - Ciudad Sol" and "Rosalia - Ciudad  Sol" share a key,
+    so YouTube titles match files written with --restrict ascii.
+    """
+    ascii_name = "".join(c for c in unicodedata.normalize("NFKD", name) if not unicodedata.combining(c))
+    return re.sub(r"[\W_]+", " ", ascii_name).strip().casefold()
+
+
+class TrackPool:
+    """
+    Shared store for audio files under <output_dir>/.pool.
+
+    Each song is stored once; playlist folders hold hardlinks to it (or
+    symlinks where hardlinks aren't possible, e.g. some network shares).
+    Pool files keep the name of the first file adopted. They are indexed
+    either by `track_key(stem) + ext` ("title", the default) or by content
+    hash ("hash", exact duplicates only, can't be checked before
+    downloading).
+
+    A pool file whose link count drops to 1 (and that no symlink points
+    to) is unreferenced; `gc()` removes those.
+    """
+
+    def __init__(self, root: Path, key: str = "title"):
+        self.root = Path(root)
+        self.key_mode = key if key in ("title", "hash") else "title"
+        self.lock = threading.RLock()
+        self._index: Optional[Dict[str, Path]] = None
+
+    # --- Index ---
+
+    def _key_for(self, path: Path) -> str:
+        if self.key_mode == "hash":
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                    digest.update(chunk)
+            return digest.hexdigest()[:32] + path.suffix.lower()
+        return track_key(path.stem) + path.suffix.lower()
+
+    def _load(self) -> Dict[str, Path]:
+        # Caller holds the lock
+        if self._index is None:
+            self._index = {}
+            if self.root.is_dir():
+                for entry in os.scandir(self.root):
+                    if entry.is_file(follow_symlinks=False):
+                        path = Path(entry.path)
+                        try:
+                            self._index.setdefault(self._key_for(path), path)
+                        except OSError as e:
+                            logger.warning(f"⚠️ Pool: no se pudo leer {entry.name}: {e}")
+        return self._index
+
+    def find(self, title: str, exts: Iterable[str] = ()) -> Optional[Path]:
+        """Pool file for a song title, trying `exts` in order ("title" keys only)."""
+        if self.key_mode != "title":
+            return None
+        key = track_key(title)
+        with self.lock:
+            index = self._load()
+            for ext in exts:
+                path = index.get(key + ext)
+                if path is not None and path.exists():
+                    return path
+        return None
+
+    # --- Linking ---
+
+    @staticmethod
+    def _link(src: Path, dst: Path):
+        """Hardlink src at dst, symlink if the filesystem refuses."""
+        try:
+            os.link(src, dst)
+        except OSError:
+            os.symlink(os.path.relpath(src, dst.parent), dst)
+
+    def _replace_with_link(self, pooled: Path, path: Path):
+        tmp = path.with_name(f".{path.name}.pool-tmp")
+        if tmp.exists() or tmp.is_symlink():
+            tmp.unlink()
+        self._link(pooled, tmp)
+        os.replace(tmp, path)
+
+    def adopt(self, path: Path) -> Optional[Path]:
+        """
+        Puts a playlist file under pool management. Returns the pool file.
+
+        New song: the pool gets a hardlink to it (or the file moves to the
+        pool and a symlink is left behind). Known song stored separately: the
+        playlist copy is replaced by a link to the pool file.
+        """
+        path = Path(path)
+        if path.is_symlink() or not path.is_file():
+            return None
+        with self.lock:
+            index = self._load()
+            key = self._key_for(path)
+            pooled = index.get(key)
+            if pooled is not None and not pooled.exists():
+                pooled = None
+            try:
+                if pooled is None:
+                    self.root.mkdir(parents=True, exist_ok=True)
+                    pooled = self.root / path.name
+                    if pooled.exists():
+                        # Same name, different key (hash mode): keep both
+                        pooled = self.root / f"{path.stem}.{key[:8]}{path.suffix}"
+                    try:
+                        os.link(path, pooled)
+                    except OSError:
+                        shutil.move(str(path), str(pooled))
+                        os.symlink(os.path.relpath(pooled, path.parent), path)
+                    index[key] = pooled
+                elif not os.path.samefile(pooled, path):
+                    self._replace_with_link(pooled, path)
+                return pooled
+            except OSError as e:
+                logger.error(f"❌ Pool: no se pudo enlazar {path.name}: {e}")
+                return None
+
+    def link_into(self, pooled: Path, directory: Path) -> Path:
+        """Makes `pooled` available in a playlist folder (no-op if the file is already there)."""
+        dst = Path(directory) / pooled.name
+        if not dst.exists():
+            self._link(pooled, dst)
+        return dst
+
+    # --- Maintenance ---
+
+    def gc(self, library_root: Optional[Path] = None) -> int:
+        """
+        Deletes pool files no playlist folder links to any more. Symlinked
+        references are found by scanning `library_root` (the pool's parent
+        by default).
+        """
+        with self.lock:
+            if not self.root.is_dir():
+                return 0
+            library_root = Path(library_root or self.root.parent)
+            symlinked = set()
+            for folder in library_root.iterdir():
+                if not folder.is_dir() or folder == self.root:
+                    continue
+                for entry in os.scandir(folder):
+                    if entry.is_symlink():
+                        try:
+                            symlinked.add(os.path.realpath(entry.path))
+                        except OSError:
+                            pass
+            removed = 0
+            for entry in list(os.scandir(self.root)):
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if entry.stat(follow_symlinks=False).st_nlink > 1 or os.path.realpath(entry.path) in symlinked:
+                    continue
+                try:
+                    os.unlink(entry.path)
+                    removed += 1
+                except OSError as e:
+                    logger.error(f"❌ Pool: no se pudo borrar {entry.name}: {e}")
+            if removed:
+                self._index = None  # Rebuilt on next use
+                logger.info(f"🧹 Pool: {removed} canciones sin playlists eliminadas")
+            return removed
@@ -1,6 +1,7 @@
 import unicodedata
 import re
 from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
 
 import os
 
@@ -70,3 +71,28 @@ def get_safe_filename(input_str: str) -> str:
         return "Unknown_Name"
         
     return safe_str
+
+# open.spotify.com/intl-es/playlist/<id>?si=... -> spotify:playlist:<id>
+_SPOTIFY_PATH_RE = re.compile(r"^/(?:intl-[a-z-]+/)?(track|album|playlist|artist)/([A-Za-z0-9]+)")
+
+def normalize_url(url: str) -> str:
+    """
+    Key for de-duplicating download URLs: Spotify links collapse to
+    "spotify:<type>:<id>" (share parameters and locale prefixes dropped),
+    other URLs lose their fragment and trailing slash and get a lowercase host.
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.endswith("spotify.com"):
+        match = _SPOTIFY_PATH_RE.match(parts.path)
+        if match:
+            return f"spotify:{match.group(1)}:{match.group(2)}"
+    if url.startswith("spotify:"):
+        return url
+    # Keep the query: YouTube ids live there (?v=, ?list=)
+    return urlunsplit((parts.scheme.lower(), host, parts.path.rstrip("/"), parts.query, ""))
+
+def normalize_title(title: str) -> str:
+    """Key for de-duplicating search titles (case and spacing insensitive)."""
+    return re.sub(r"\s+", " ", title).strip().casefold()
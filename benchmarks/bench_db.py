@@ -0,0 +1,129 @@
+"""
+Calls/sec of the backend.database functions the app uses most.
+
+"before" opens a fresh connection per call on a rollback-journal database
+without the migration indexes (what get_db() used to do); "after" is the
+current layer: one reused connection per thread, WAL and tuned pragmas,
+schema migrated. Both run against identical temp databases.
+
+    python benchmarks/bench_db.py [--playlists 50] [--urls 5] [--tracks 500]
+                                  [--calls 2000] [--repeat 5] [--threads 1]
+
+With --threads N each figure is N threads calling at once (the scheduler,
+background tasks and request handlers share the database).
+
+Each figure is the best of --repeat runs.
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+import backend.database as db  # noqa: E402
+
+CURRENT_CONTEXT = db.get_db_context
+
+
+@contextmanager
+def legacy_db_context():
+    """get_db_context() before the connection layer: connect, use, close."""
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def populate(args):
+    db.init_db()
+    for p in range(args.playlists):
+        pid = f"pl{p:04d}"
+        db.save_playlist(pid, f"Playlist {p}", [f"https://open.spotify.com/playlist/{pid}u{u}" for u in range(args.urls)])
+        db.replace_tracks(pid, [{"filename": f"./Artist {t} - Song {t}.opus", "duration": 180, "size": 1000, "mtime": 1}
+                                for t in range(args.tracks)])
+    for t in range(args.tracks):
+        db.save_cached_duration(f"Playlist 0/Artist {t} - Song {t}.opus", 1000, 1, 180)
+
+
+def make_db(workdir: Path, legacy: bool, args) -> Path:
+    path = workdir / ("before.db" if legacy else "after.db")
+    db.DB_PATH = path
+    db.get_db_context = CURRENT_CONTEXT
+    populate(args)
+    db.close_db()
+    if legacy:
+        # Undo what the connection layer and the migrations changed
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'").fetchall():
+            if name != "idx_tracks_position":
+                conn.execute(f"DROP INDEX {name}")
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+        conn.close()
+    return path
+
+
+CALLS = {
+    "get_playlist": lambda i, n: db.get_playlist(f"pl{i % n:04d}"),
+    "get_playlists": lambda i, n: db.get_playlists(),
+    "count_tracks": lambda i, n: db.count_tracks(f"pl{i % n:04d}"),
+    "get_tracks(50)": lambda i, n: db.get_tracks(f"pl{i % n:04d}", 0, 50),
+    "cached_duration": lambda i, n: db.get_cached_duration(f"Playlist 0/Artist {i % 100} - Song {i % 100}.opus", 1000, 1),
+    "save_duration": lambda i, n: db.save_cached_duration(f"Playlist 0/Artist {i % 100} - Song {i % 100}.opus", 1000, 1, 180),
+}
+
+
+def run(call, calls, threads, playlists):
+    per_thread = max(1, calls // threads)
+
+    def worker():
+        for i in range(per_thread):
+            call(i, playlists)
+        db.close_db()
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--playlists", type=int, default=50, help="playlists in the database")
+    ap.add_argument("--urls", type=int, default=5, help="URLs per playlist")
+    ap.add_argument("--tracks", type=int, default=500, help="indexed tracks per playlist")
+    ap.add_argument("--calls", type=int, default=2000, help="calls per run (split between threads)")
+    ap.add_argument("--repeat", type=int, default=5, help="runs per figure (best is reported)")
+    ap.add_argument("--threads", type=int, default=1, help="threads calling at once")
+    args = ap.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="soniq-bench-db-"))
+    paths = {legacy: make_db(workdir, legacy, args) for legacy in (True, False)}
+
+    print(f"{'call':<18}{'before c/s':>12}{'after c/s':>12}{'speedup':>9}")
+    for name, call in CALLS.items():
+        best = {}
+        for legacy in (True, False):
+            db.DB_PATH = paths[legacy]
+            db.get_db_context = legacy_db_context if legacy else CURRENT_CONTEXT
+            # Slow calls get fewer iterations
+            calls = args.calls // 10 if name == "get_playlists" else args.calls
+            best[legacy] = max(run(call, calls, args.threads, args.playlists) for _ in range(args.repeat))
+        print(f"{name:<18}{best[True]:>12,.0f}{best[False]:>12,.0f}{best[False] / best[True]:>8.2f}x")
+    db.get_db_context = CURRENT_CONTEXT
+
+
+if __name__ == "__main__":
+    main()
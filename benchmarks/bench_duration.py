@@ -0,0 +1,95 @@
+"""
+Compares backend.audio_meta.read_duration against ffprobe.
+
+Generates a corpus of sine-wave files with ffmpeg (one set per container
+that spotdl/yt-dlp can produce), then times both readers over it and
+reports the largest disagreement in seconds.
+
+    python benchmarks/bench_duration.py [--files 20] [--seconds 180]
+"""
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.audio_meta import read_duration  # noqa: E402
+
+# extension -> ffmpeg encoder args
+FORMATS = {
+    "opus": ["-c:a", "libopus", "-b:a", "128k"],
+    "ogg": ["-c:a", "libvorbis", "-q:a", "4"],
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "192k"],
+    "vbr.mp3": ["-c:a", "libmp3lame", "-q:a", "2"],
+    "m4a": ["-c:a", "aac", "-b:a", "192k"],
+    "flac": ["-c:a", "flac"],
+}
+
+
+def generate_corpus(target: Path, files: int, seconds: int) -> list:
+    corpus = []
+    for ext, args in FORMATS.items():
+        for i in range(files):
+            length = seconds + i  # Different durations per file
+            out = target / f"track_{i:03d}.{ext}"
+            cmd = [
+                "ffmpeg", "-v", "error", "-y",
+                "-f", "lavfi", "-i", f"sine=frequency={220 + i}:duration={length}",
+                *args, str(out)
+            ]
+            subprocess.run(cmd, check=True)
+            corpus.append(out)
+    return corpus
+
+
+def ffprobe_duration(path: Path) -> float:
+    res = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", str(path)],
+        capture_output=True, text=True
+    )
+    return float(res.stdout.strip())
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=20, help="files per format")
+    ap.add_argument("--seconds", type=int, default=180, help="base track length")
+    args = ap.parse_args()
+
+    for tool in ("ffmpeg", "ffprobe"):
+        if not shutil.which(tool):
+            sys.exit(f"{tool} not found on PATH")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.files * len(FORMATS)} files...")
+        corpus = generate_corpus(Path(tmp), args.files, args.seconds)
+
+        start = time.perf_counter()
+        native = {p: read_duration(p) for p in corpus}
+        native_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        probed = {p: ffprobe_duration(p) for p in corpus}
+        probe_time = time.perf_counter() - start
+
+        print(f"{'format':<10}{'files':>6}{'max |diff| s':>14}{'fallbacks':>11}")
+        for ext in FORMATS:
+            paths = [p for p in corpus if p.name.endswith(f".{ext}") and (ext != "mp3" or ".vbr." not in p.name)]
+            diffs = [abs(native[p] - probed[p]) for p in paths if native[p] is not None]
+            missing = sum(1 for p in paths if native[p] is None)
+            print(f"{ext:<10}{len(paths):>6}{max(diffs, default=0):>14.3f}{missing:>11}")
+
+        n = len(corpus)
+        print()
+        print(f"native : {native_time * 1000:9.1f} ms total, {native_time / n * 1e6:9.1f} us/file")
+        print(f"ffprobe: {probe_time * 1000:9.1f} ms total, {probe_time / n * 1e6:9.1f} us/file")
+        print(f"speedup: {probe_time / native_time:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+LogParser throughput over recorded spotdl / yt-dlp transcripts.
+
+"before" is the old if/elif chain plus the separate noise check that
+_run_cmd used to do (benchmarks/legacy_log_parser.py); "after" is
+LogParser.parse_line, which returns both in one pass. Both must produce
+identical updates for every line.
+
+    python benchmarks/bench_log_parser.py [--rounds 20] [--repeat 7]
+
+Each figure is the best of --repeat runs (as timeit does), since one-off
+timings on a busy machine are mostly scheduler noise.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from backend.log_parser import LogParser  # noqa: E402
+import legacy_log_parser as legacy  # noqa: E402
+
+TRANSCRIPTS_DIR = BENCH_DIR / "transcripts"
+
+
+def load_transcripts():
+    """Returns {name: [(line, tool), ...]}; tool is inferred from the file name."""
+    out = {}
+    for path in sorted(TRANSCRIPTS_DIR.glob("*.log")):
+        tool = "yt-dlp" if path.name.startswith("ytdlp") else "spotdl"
+        lines = [l.strip() for l in path.read_text(encoding="utf-8").splitlines()]
+        out[path.stem] = [(l, tool) for l in lines if l]
+    return out
+
+
+def run_before(lines, rounds):
+    parser = legacy.LogParser()
+    parse, is_noise = parser.parse, legacy.is_noise
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for line, tool in lines:
+            parse(line, tool, "downloading")
+            is_noise(line)
+    return time.perf_counter() - start
+
+
+def run_after(lines, rounds):
+    parser = LogParser()
+    parse_line = parser.parse_line
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for line, tool in lines:
+            parse_line(line, tool, "downloading")
+    return time.perf_counter() - start
+
+
+def best_of(lines, rounds, repeat):
+    """(before, after) seconds, best of `repeat` interleaved runs."""
+    before, after = [], []
+    for _ in range(repeat):
+        before.append(run_before(lines, rounds))
+        after.append(run_after(lines, rounds))
+    return min(before), min(after)
+
+
+# Fields added after the legacy parser (scheduler signals, not UI output)
+NEW_KEYS = {"rate_limit_wait", "congestion", "item_outcome", "match_url"}
+
+
+def check_equivalence(lines):
+    old, new = legacy.LogParser(), LogParser()
+    for line, tool in lines:
+        updates, noise = new.parse_line(line, tool, "downloading")
+        updates = {k: v for k, v in updates.items() if k not in NEW_KEYS}
+        if updates != old.parse(line, tool, "downloading") or noise != legacy.is_noise(line):
+            sys.exit(f"Mismatch on {tool} line: {line!r}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=20, help="passes over each transcript per run")
+    ap.add_argument("--repeat", type=int, default=7, help="runs per figure (best is reported)")
+    args = ap.parse_args()
+
+    transcripts = load_transcripts()
+    print(f"{'transcript':<20}{'lines':>7}{'before l/s':>14}{'after l/s':>14}{'speedup':>9}")
+    all_lines = []
+    for name, lines in transcripts.items():
+        check_equivalence(lines)
+        all_lines += lines
+        n = len(lines) * args.rounds
+        before, after = best_of(lines, args.rounds, args.repeat)
+        print(f"{name:<20}{len(lines):>7}{n / before:>14,.0f}{n / after:>14,.0f}{before / after:>8.2f}x")
+
+    n = len(all_lines) * args.rounds
+    before, after = best_of(all_lines, args.rounds, args.repeat)
+    print(f"{'all':<20}{len(all_lines):>7}{n / before:>14,.0f}{n / after:>14,.0f}{before / after:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Subprocess output reading: the old poll()/readline() loop of
+DownloaderManager._run_cmd vs backend.proc_reader.LineReader.
+
+1. CPU per 10k lines: a child writes yt-dlp progress output as fast as it
+   can. Half the lines end with "\\n", half with "\\r" like yt-dlp does on
+   a terminal. Only the reading side's CPU time is counted.
+2. Stop-to-exit latency: the child prints one line and then goes quiet
+   (a stalled download). The stop event is set after --stop-after seconds,
+   without killing the child. The figure is how long the read loop takes
+   to return.
+
+    python benchmarks/bench_reader.py [--lines 100000] [--stop-after 0.5] [--quiet-for 5]
+"""
+import argparse
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.proc_reader import LineReader  # noqa: E402
+
+WRITER = r"""
+import sys
+n = int(sys.argv[1])
+out = sys.stdout
+for i in range(n):
+    end = "\r" if i % 2 else "\n"
+    out.write(f"[download] {i % 1000 / 10:5.1f}% of   5.88MiB at   2.63MiB/s ETA 00:21{end}")
+out.write("\n")
+out.flush()
+"""
+
+QUIET = r"""
+import sys, time
+print("[download] Destination: song.webm", flush=True)
+time.sleep(float(sys.argv[1]))
+"""
+
+
+def legacy_loop(proc, stop_event):
+    """The read loop _run_cmd used before LineReader (parsing stripped out)."""
+    count = 0
+    while True:
+        if stop_event.is_set():
+            break
+        if proc.poll() is not None:
+            rem = proc.stdout.read()
+            if rem:
+                for l in rem.splitlines():
+                    if l.strip():
+                        count += 1
+            break
+        line = proc.stdout.readline()
+        if not line and proc.poll() is not None:
+            break
+        if not line:
+            continue
+        line = line.strip()
+        if line:
+            count += 1
+    return count
+
+
+def reader_loop(proc, stop_event):
+    reader = LineReader(proc.stdout, stop_event)
+    # Lets the stopper call wake() like DownloaderManager.stop does
+    proc._bench_wake = reader.wake
+    count = 0
+    try:
+        for line in reader:
+            if line.strip():
+                count += 1
+    finally:
+        reader.close()
+    return count
+
+
+def spawn(script, arg, text):
+    return subprocess.Popen(
+        [sys.executable, "-c", script, str(arg)],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=text
+    )
+
+
+def cpu_per_10k(loop, text, lines):
+    proc = spawn(WRITER, lines, text)
+    start = time.thread_time()
+    count = loop(proc, threading.Event())
+    cpu = time.thread_time() - start
+    proc.wait()
+    return cpu / lines * 10000, count
+
+
+def stop_latency(loop, text, stop_after, quiet_for):
+    proc = spawn(QUIET, quiet_for, text)
+    stop_event = threading.Event()
+    stopped_at = []
+
+    def stopper():
+        time.sleep(stop_after)
+        stopped_at.append(time.perf_counter())
+        stop_event.set()
+        wake = getattr(proc, "_bench_wake", None)
+        if wake:
+            wake()
+
+    th = threading.Thread(target=stopper)
+    th.start()
+    loop(proc, stop_event)
+    latency = time.perf_counter() - stopped_at[0] if stopped_at else 0.0
+    th.join()
+    proc.kill()
+    proc.wait()
+    return latency
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--lines", type=int, default=100000, help="lines written by the fast child")
+    ap.add_argument("--stop-after", type=float, default=0.5, help="seconds before the stop event is set")
+    ap.add_argument("--quiet-for", type=float, default=5.0, help="seconds the stalled child stays silent")
+    args = ap.parse_args()
+
+    legacy_cpu, legacy_count = cpu_per_10k(legacy_loop, True, args.lines)
+    reader_cpu, reader_count = cpu_per_10k(reader_loop, False, args.lines)
+    print(f"{'':<22}{'legacy loop':>14}{'LineReader':>14}")
+    print(f"{'CPU ms / 10k lines':<22}{legacy_cpu * 1000:>14.1f}{reader_cpu * 1000:>14.1f}")
+    print(f"{'lines delivered':<22}{legacy_count:>14}{reader_count:>14}  (\\r progress collapsed)")
+
+    legacy_lat = stop_latency(legacy_loop, True, args.stop_after, args.quiet_for)
+    reader_lat = stop_latency(reader_loop, False, args.stop_after, args.quiet_for)
+    print(f"{'stop-to-exit ms':<22}{legacy_lat * 1000:>14.1f}{reader_lat * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
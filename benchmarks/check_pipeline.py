@@ -0,0 +1,280 @@
+"""
+End-to-end checks of the download pipeline against the offline stand-ins
+in benchmarks/stubs (same setup as replay.py). Each scenario runs a real
+DownloaderManager job in its own temp dir and asserts on what it left
+behind: M3U entries, the duration cache and the library index.
+
+    python benchmarks/check_pipeline.py [--keep] [scenario ...]
+
+Exits non-zero if any check fails.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+STUBS_DIR = BENCH_DIR / "stubs"
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+import backend.database as db  # noqa: E402
+from backend.core import DownloaderManager  # noqa: E402
+
+SPOTIFY_URL = "https://open.spotify.com/playlist/check000"
+
+
+def make_manager(workdir: Path, **config) -> DownloaderManager:
+    cfg = {
+        "output_dir": str(workdir / "downloads"),
+        "format": "opus",
+        "retry": {"attempts": 1, "backoff_seconds": 0},
+    }
+    cfg.update(config)
+    workdir.mkdir(parents=True, exist_ok=True)
+    config_path = workdir / "config.json"
+    config_path.write_text(json.dumps(cfg), encoding="utf-8")
+    db.close_db()
+    db.DB_PATH = workdir / "soniq.db"
+    db.init_db()
+    return DownloaderManager(config_path=str(config_path))
+
+
+def m3u_entries(path: Path) -> list:
+    """(duration, line) of every entry of an M3U file."""
+    entries, duration = [], None
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.startswith("#EXTINF:"):
+            duration = int(line[len("#EXTINF:"):].split(",", 1)[0])
+        elif line and not line.startswith("#"):
+            entries.append((duration, line))
+    return entries
+
+
+def write_flac(path: Path, seconds: int, sample_rate: int = 44100):
+    """Header-only FLAC file (STREAMINFO says `seconds` long): enough for audio_meta."""
+    packed = (sample_rate << 44) | (1 << 41) | (15 << 36) | (seconds * sample_rate)
+    info = (4096).to_bytes(2, "big") * 2 + bytes(6) + packed.to_bytes(8, "big") + bytes(16)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"fLaC" + bytes([0x80]) + len(info).to_bytes(3, "big") + info)
+
+
+def media_cache_rows() -> int:
+    with db.get_db_context() as conn:
+        return conn.execute("SELECT COUNT(*) FROM media_cache").fetchone()[0]
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise AssertionError(message)
+
+
+# === Scenarios ===
+
+def scenario_metadata(workdir: Path):
+    """Songs land in output_dir/<playlist>/: durations come from those files and get cached."""
+    manager = make_manager(workdir)
+    manager.process_urls([SPOTIFY_URL], m3u_name="Check", playlist_id="check")
+    folder = workdir / "downloads" / "Check"
+    files = sorted(folder.glob("*.opus"))
+    entries = m3u_entries(folder / "Check.m3u8")
+    check(files, "no audio files in the playlist folder")
+    check(len(entries) == len(files), f"{len(entries)} M3U entries for {len(files)} files")
+    for duration, line in entries:
+        check(line.endswith(".opus"), f"entry without extension: {line}")
+        check(duration > 0, f"duration 0 for {line}")
+    check(media_cache_rows() == len(files), f"{media_cache_rows()} cached durations for {len(files)} files")
+
+
+def scenario_native_duration(workdir: Path):
+    """A parseable file gets its duration from read_duration, not from ffprobe."""
+    folder = workdir / "downloads" / "Check"
+    # First song the transcript downloads; the stub leaves existing files alone
+    write_flac(folder / "Feid - Otra Vez.flac", 123)
+    os.environ["STUB_DURATION"] = "7"
+    try:
+        manager = make_manager(workdir, format="flac")
+        manager.process_urls([SPOTIFY_URL], m3u_name="Check", playlist_id="check")
+    finally:
+        del os.environ["STUB_DURATION"]
+    durations = dict((line, duration) for duration, line in m3u_entries(folder / "Check.m3u8"))
+    check(durations.get("./Feid - Otra Vez.flac") == 123,
+          f"native duration not used: {durations.get('./Feid - Otra Vez.flac')}")
+    # Empty stub files can't be parsed and fall back to ffprobe
+    check(durations.get("./Bad Bunny - Luna.flac") == 7, f"ffprobe fallback not used: {durations.get('./Bad Bunny - Luna.flac')}")
+
+
+def scenario_index(workdir: Path):
+    """Library index rows carry the size, mtime and duration of the playlist-folder files."""
+    folder = workdir / "downloads" / "Check"
+    write_flac(folder / "Feid - Otra Vez.flac", 123)
+    manager = make_manager(workdir, format="flac")
+    manager.process_urls([SPOTIFY_URL], m3u_name="Check", playlist_id="check")
+    rows = {row["filename"]: row for row in db.get_tracks("check")}
+    check(rows, "nothing indexed")
+    for row in rows.values():
+        check(row["mtime"] > 0, f"mtime 0 for {row['filename']}")
+        check(row["duration"] > 0, f"duration 0 for {row['filename']}")
+    flac = rows.get("./Feid - Otra Vez.flac")
+    check(flac and flac["size"] > 0 and flac["duration"] == 123, f"bad row for the FLAC file: {flac}")
+
+    # Rebuilding from an M3U written without extensions or durations resolves the files again
+    (folder / "Check.m3u8").write_text("#EXTM3U\n#EXTINF:0,Feid - Otra Vez\n./Feid - Otra Vez\n", encoding="utf-8")
+    check(manager.index_playlist("check", "Check") == 1, "rebuilt index has the wrong size")
+    row = db.get_tracks("check")[0]
+    check(row["size"] > 0 and row["mtime"] > 0 and row["duration"] == 123, f"bad rebuilt row: {dict(row)}")
+
+
+def scenario_pool_matches(workdir: Path):
+    """Track pool and match cache together: songs are pooled and their matches cached with file and duration."""
+    manager = make_manager(workdir, track_pool={"enabled": True}, match_cache={"enabled": True})
+    manager.process_urls([SPOTIFY_URL], m3u_name="Check", playlist_id="check")
+    pooled = [p for p in (workdir / "downloads" / ".pool").rglob("*") if p.is_file()]
+    check(pooled, "nothing in the track pool")
+    with db.get_db_context() as conn:
+        rows = [dict(r) for r in conn.execute("SELECT key, filename, duration FROM song_matches").fetchall()]
+    check(rows, "no match cached")
+    for row in rows:
+        check(row["filename"] and row["filename"].endswith(".opus"), f"match without file name: {row}")
+        check(row["duration"] > 0, f"match without duration: {row}")
+
+
+def scenario_asyncio_off_loop(workdir: Path):
+    """
+    asyncio engine: output is parsed and status published on the event loop,
+    while metadata reads, M3U/pool/DB writes and the job's end run in threads.
+    """
+    manager = make_manager(workdir, engine="asyncio", track_pool={"enabled": True}, match_cache={"enabled": True})
+    on_loop, off_loop = [], []
+
+    def watch(name):
+        method = getattr(manager, name)
+
+        def wrapper(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(name)
+            except RuntimeError:
+                off_loop.append(name)
+            return method(*args, **kwargs)
+        setattr(manager, name, wrapper)
+
+    blocking = ("_write_song", "_get_audio_metadata", "_store_matches", "_settle_attempt", "_end_job", "_close_m3u_writers")
+    for name in blocking + ("_parse_output_line", "_apply_updates"):
+        watch(name)
+    results = manager.process_urls([SPOTIFY_URL], m3u_name="Check", playlist_id="check")
+    check(results and results[0]["status"] == "success", f"job failed: {results}")
+    check(not set(on_loop) & set(blocking), f"blocking calls on the event loop: {sorted(set(on_loop) & set(blocking))}")
+    check("_write_song" in off_loop and "_store_matches" in off_loop, "no song written or match stored")
+    check(not {"_parse_output_line", "_apply_updates"} & set(off_loop),
+          f"parsing/publishing left the event loop: {sorted({'_parse_output_line', '_apply_updates'} & set(off_loop))}")
+    check(db.count_tracks("check") > 0, "nothing indexed")
+
+
+def scenario_direct_without_id(workdir: Path):
+    """Direct yt-dlp mode: listing entries without a video id are searched by spotdl, never passed as URLs."""
+    titles = workdir / "titles.txt"
+    titles.write_text("Rosalía - Luna\nFeid - Otra Vez\nNA\tBad Bunny - Baila Mar\n", encoding="utf-8")
+    os.environ["STUB_TITLES"] = str(titles)
+    try:
+        manager = make_manager(workdir, youtube_mode="ytdlp")
+        commands = []
+        run_cmd = manager._run_cmd
+
+        def recording_run_cmd(cmd, m3u_path=None, run=None):
+            commands.append(cmd)
+            return run_cmd(cmd, m3u_path, run)
+        manager._run_cmd = recording_run_cmd
+        manager.process_urls(["https://www.youtube.com/playlist?list=check000"], m3u_name="Check", playlist_id="check")
+    finally:
+        del os.environ["STUB_TITLES"]
+    ytdlp = [c for c in commands if "yt-dlp" in c[0]]
+    spotdl = [c for c in commands if "spotdl" in c[0]]
+    check(not any("watch?v=NA" in a or "Bad Bunny - Baila Mar" in a for c in ytdlp for a in c),
+          "entry without video id passed to yt-dlp")
+    check(sum(1 for c in ytdlp for a in c if "watch?v=" in a) == 2, f"videos with ids not sent to yt-dlp: {ytdlp}")
+    check(any("Bad Bunny - Baila Mar" in c for c in spotdl), f"entry without video id not searched by spotdl: {spotdl}")
+
+
+def scenario_stop_while_planning(workdir: Path):
+    """A Stop pressed while planning cancels the job; a leftover stop flag doesn't cancel the next one."""
+    for engine in ("threads", "asyncio"):
+        manager = make_manager(workdir / engine, engine=engine)
+        commands = []
+        run_cmd, run_cmd_async, plan = manager._run_cmd, manager._run_cmd_async, manager._plan_tasks
+
+        def recording_run_cmd(cmd, m3u_path=None, run=None):
+            commands.append(cmd)
+            return run_cmd(cmd, m3u_path, run)
+
+        async def recording_run_cmd_async(cmd, m3u_path=None, run=None):
+            commands.append(cmd)
+            return await run_cmd_async(cmd, m3u_path, run)
+
+        def stopping_plan(*args):
+            tasks = plan(*args)
+            manager.stop_requested.set()  # What stop() does first
+            return tasks
+        manager._run_cmd, manager._run_cmd_async = recording_run_cmd, recording_run_cmd_async
+
+        manager._plan_tasks = stopping_plan
+        results = manager.process_urls([SPOTIFY_URL], m3u_name="Check", playlist_id="check")
+        check(not commands and not results, f"{engine}: job ran after a stop during planning: {commands}")
+        check(manager.status["state"] == "idle", f"{engine}: state {manager.status['state']} after the cancelled job")
+
+        # The flag is still set from the cancelled job
+        manager._plan_tasks = plan
+        results = manager.process_urls([SPOTIFY_URL], m3u_name="Check", playlist_id="check")
+        check(commands and results and results[0]["status"] == "success", f"{engine}: next job didn't run: {results}")
+
+
+SCENARIOS = {
+    "metadata": scenario_metadata,
+    "native_duration": scenario_native_duration,
+    "index": scenario_index,
+    "pool_matches": scenario_pool_matches,
+    "asyncio_off_loop": scenario_asyncio_off_loop,
+    "direct_without_id": scenario_direct_without_id,
+    "stop_while_planning": scenario_stop_while_planning,
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    ap.add_argument("--keep", action="store_true", help="keep the temp dirs for inspection")
+    args = ap.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        ap.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    os.environ["PATH"] = str(STUBS_DIR) + os.pathsep + os.environ.get("PATH", "")
+    for tool in ("spotdl", "yt-dlp", "ffprobe", "ffmpeg"):
+        found = shutil.which(tool)
+        if not found or Path(found).parent != STUBS_DIR:
+            sys.exit(f"{tool} does not resolve to the stub ({found}); check permissions of {STUBS_DIR}")
+
+    failed = 0
+    for name in args.scenarios or SCENARIOS:
+        workdir = Path(tempfile.mkdtemp(prefix=f"soniq-check-{name}-"))
+        try:
+            SCENARIOS[name](workdir)
+            print(f"ok    {name}")
+        except Exception as e:
+            failed += 1
+            print(f"FAIL  {name}: {e}")
+            if not isinstance(e, AssertionError):
+                traceback.print_exc()
+        finally:
+            db.close_db()
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+End-to-end replay of DownloaderManager.process_urls against the offline
+stand-ins in benchmarks/stubs (spotdl, yt-dlp, ffprobe, ffmpeg), so the
+subprocess pipeline (_run_cmd, LogParser, M3U writing, library index) can be
+measured without network access.
+
+Each Spotify URL runs one `spotdl download` that replays the spotdl
+transcript. Each YouTube URL lists titles through `yt-dlp --flat-playlist`
+and then runs the spotdl batches built from them. Reports wall time, CPU
+time (this process and the stubs), parsed lines/sec and broadcasts/sec.
+
+    python benchmarks/replay.py [--spotify 3] [--youtube 1] [--line-rate 0]
+                                [--exit-code 0] [--no-files] [--runs 3]
+                                [--engine threads|asyncio] [--concurrency 1]
+                                [--rate-per-minute 0] [--burst 2] [--pause-scale 0]
+                                [--adaptive] [--playlists 1] [--per-playlist]
+                                [--startup-delay 0] [--spotdl-workers]
+
+--startup-delay stands in for interpreter + spotdl import time. It is paid
+by every spotdl command, or once per persistent worker with --spotdl-workers.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+STUBS_DIR = BENCH_DIR / "stubs"
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+import backend.database as db  # noqa: E402
+from backend.core import DownloaderManager  # noqa: E402
+
+
+class BroadcastSink:
+    """Stands in for app.sync_broadcast: counts events and JSON-encodes them once (one client)."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.bytes = 0
+
+    def __call__(self, event_type, data):
+        self.counts[event_type] += 1
+        self.bytes += len(json.dumps({"type": event_type, "data": data}))
+
+
+def configure_stubs(args):
+    os.environ["PATH"] = str(STUBS_DIR) + os.pathsep + os.environ.get("PATH", "")
+    os.environ["STUB_LINE_RATE"] = str(args.line_rate)
+    os.environ["STUB_STARTUP_DELAY"] = str(args.startup_delay)
+    os.environ["STUB_EXIT_CODE"] = str(args.exit_code)
+    os.environ["STUB_CREATE_FILES"] = "0" if args.no_files else "1"
+    for var, value in (("STUB_SPOTDL_TRANSCRIPT", args.spotdl_transcript),
+                       ("STUB_YTDLP_TRANSCRIPT", args.ytdlp_transcript),
+                       ("STUB_TITLES", args.titles)):
+        if value:
+            os.environ[var] = str(Path(value).resolve())
+
+
+def run_once(args, workdir: Path) -> dict:
+    out_dir = workdir / "downloads"
+    config_path = workdir / "config.json"
+    config_path.write_text(json.dumps({
+        "output_dir": str(out_dir),
+        "format": "opus",
+        "retry": {"attempts": 1, "backoff_seconds": 0},
+        "engine": args.engine,
+        "concurrency": args.concurrency,
+        "spotify_rate_limit": {"per_minute": args.rate_per_minute, "burst": args.burst},
+        "adaptive_concurrency": {"enabled": args.adaptive, "initial": 1, "increase_every": 3, "cooldown_seconds": 1},
+        "spotdl_workers": {"enabled": args.spotdl_workers, "entry": f"{STUBS_DIR / 'spotdl'}:console_entry_point"},
+    }), encoding="utf-8")
+    db.DB_PATH = workdir / "soniq.db"
+    db.init_db()
+
+    sink = BroadcastSink()
+    manager = DownloaderManager(config_path=str(config_path), broadcast_func=sink)
+
+    # Count what _run_cmd / _run_cmd_async actually consumed from the stubs
+    lines = Counter()
+    run_cmd = manager._run_cmd
+    run_cmd_async = manager._run_cmd_async
+
+    def count(out_lines):
+        lines["total"] += len(out_lines)
+        lines["commands"] += 1
+
+    def counting_run_cmd(cmd, m3u_path=None, run=None):
+        success, out_lines = run_cmd(cmd, m3u_path, run)
+        count(out_lines)
+        return success, out_lines
+
+    async def counting_run_cmd_async(cmd, m3u_path=None, run=None):
+        success, out_lines = await run_cmd_async(cmd, m3u_path, run)
+        count(out_lines)
+        return success, out_lines
+
+    manager._run_cmd = counting_run_cmd
+    manager._run_cmd_async = counting_run_cmd_async
+
+    # The transcripts contain real "Retry will occur after: 31" lines but the
+    # stubs don't wait them out: scale the pool pauses they trigger
+    pause = manager.throttle.pause
+    manager.throttle.pause = lambda seconds: pause(seconds * args.pause_scale)
+    hold = manager.retry_policy.hold
+    manager.retry_policy.hold = lambda seconds: hold(seconds * args.pause_scale)
+
+    urls = [f"https://open.spotify.com/playlist/replay{i:03d}" for i in range(args.spotify)]
+    urls += [f"https://www.youtube.com/playlist?list=replay{i:03d}" for i in range(args.youtube)]
+
+    # Every playlist lists the same URLs (worst case for per-playlist runs)
+    playlists = [{"id": "replay" if i == 0 else f"replay{i + 1}",
+                  "name": "Replay" if i == 0 else f"Replay {i + 1}",
+                  "urls": urls} for i in range(args.playlists)]
+
+    cpu_self = time.process_time()
+    children = os.times()
+    start = time.perf_counter()
+    if args.playlists == 1:
+        results = manager.process_urls(urls, m3u_name="Replay", playlist_id="replay")
+    elif args.per_playlist:
+        # What execution_job did before the global queue
+        results = []
+        for p in playlists:
+            results += manager.process_urls(p["urls"], m3u_name=p["name"], playlist_id=p["id"])
+    else:
+        results = manager.process_playlists(playlists)
+    wall = time.perf_counter() - start
+    cpu_self = time.process_time() - cpu_self
+    children_end = os.times()
+    cpu_stubs = (children_end.children_user - children.children_user) + \
+                (children_end.children_system - children.children_system)
+
+    m3u_entries = 0
+    for p in playlists:
+        m3u = out_dir / p["name"] / f"{p['name']}.m3u8"
+        if m3u.exists():
+            m3u_entries += sum(1 for l in m3u.read_text(encoding="utf-8").splitlines() if l and not l.startswith("#"))
+    return {
+        "wall": wall,
+        "cpu_self": cpu_self,
+        "cpu_stubs": cpu_stubs,
+        "commands": lines["commands"],
+        "lines": lines["total"],
+        "logs": sink.counts["log"],
+        "statuses": sink.counts["status"] + sink.counts["status_delta"],
+        "broadcast_bytes": sink.bytes,
+        "ok": sum(1 for r in results if r.get("status") == "success"),
+        "failed": sum(1 for r in results if r.get("status") != "success"),
+        "m3u_entries": m3u_entries,
+        "indexed": sum(db.count_tracks(p["id"]) for p in playlists),
+        "pool": manager.last_job_report,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--spotify", type=int, default=3, help="Spotify playlist URLs per job")
+    ap.add_argument("--youtube", type=int, default=1, help="YouTube playlist URLs per job")
+    ap.add_argument("--line-rate", type=float, default=0, help="stub output lines/sec (0 = unthrottled)")
+    ap.add_argument("--startup-delay", type=float, default=0, help="seconds each stub waits before its first line")
+    ap.add_argument("--exit-code", type=int, default=0, help="exit code of every spotdl/yt-dlp run")
+    ap.add_argument("--no-files", action="store_true", help="stubs don't create audio files")
+    ap.add_argument("--spotdl-transcript", help="transcript replayed by spotdl")
+    ap.add_argument("--ytdlp-transcript", help="transcript replayed by yt-dlp downloads")
+    ap.add_argument("--titles", help="titles file for yt-dlp --flat-playlist")
+    ap.add_argument("--playlists", type=int, default=1, help="playlists sharing the same URLs (one global job)")
+    ap.add_argument("--per-playlist", action="store_true", help="with --playlists: one job per playlist instead")
+    ap.add_argument("--engine", choices=("threads", "asyncio"), default="threads", help="download engine")
+    ap.add_argument("--concurrency", type=int, default=1, help="concurrent download workers")
+    ap.add_argument("--rate-per-minute", type=float, default=0, help="spotdl launches/minute (0 = no token bucket)")
+    ap.add_argument("--adaptive", action="store_true", help="AIMD worker count (starts at 1, up to --concurrency)")
+    ap.add_argument("--pause-scale", type=float, default=0, help="multiplier for rate-limit pauses (0 = ignore them)")
+    ap.add_argument("--burst", type=int, default=2, help="token bucket size")
+    ap.add_argument("--spotdl-workers", action="store_true", help="run spotdl commands in persistent worker processes")
+    ap.add_argument("--runs", type=int, default=3, help="fresh jobs to run (each in its own temp dir)")
+    ap.add_argument("--keep", action="store_true", help="keep the temp dirs for inspection")
+    args = ap.parse_args()
+
+    configure_stubs(args)
+    for tool in ("spotdl", "yt-dlp", "ffprobe", "ffmpeg"):
+        found = shutil.which(tool)
+        if not found or Path(found).parent != STUBS_DIR:
+            sys.exit(f"{tool} does not resolve to the stub ({found}); check permissions of {STUBS_DIR}")
+
+    print(f"{'run':>4}{'wall s':>9}{'cpu s':>8}{'stubs s':>9}{'cmds':>6}{'lines':>8}"
+          f"{'lines/s':>10}{'logs':>7}{'status':>8}{'bcast/s':>9}{'m3u':>6}{'idx':>6}{'fail':>6}")
+    for run in range(1, args.runs + 1):
+        workdir = Path(tempfile.mkdtemp(prefix="soniq-replay-"))
+        try:
+            r = run_once(args, workdir)
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+        broadcasts = r["logs"] + r["statuses"]
+        print(f"{run:>4}{r['wall']:>9.2f}{r['cpu_self']:>8.2f}{r['cpu_stubs']:>9.2f}{r['commands']:>6}"
+              f"{r['lines']:>8}{r['lines'] / r['wall']:>10,.0f}{r['logs']:>7}{r['statuses']:>8}"
+              f"{broadcasts / r['wall']:>9,.0f}{r['m3u_entries']:>6}{r['indexed']:>6}{r['failed']:>6}")
+        if args.adaptive and r["pool"]:
+            pool = r["pool"]
+            steps = " ".join(f"{d['from']}→{d['to']}({d['reason']})" for d in pool["decisions"])
+            print(f"     workers {pool['initial']}→{pool['final']}: {steps or 'no changes'}")
+        if args.keep:
+            print(f"     kept {workdir}")
+
+
+if __name__ == "__main__":
+    main()
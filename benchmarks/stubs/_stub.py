@@ -0,0 +1,95 @@
+"""
+Shared logic for the offline stand-ins in this directory (spotdl, yt-dlp,
+ffprobe, ffmpeg). Put the directory first on PATH and DownloaderManager runs
+its normal subprocess pipeline against recorded transcripts instead of the
+network. Behaviour is driven by environment variables:
+
+    STUB_SPOTDL_TRANSCRIPT  transcript replayed by `spotdl download`
+                            (default: transcripts/spotdl_playlist.log)
+    STUB_YTDLP_TRANSCRIPT   transcript replayed by a yt-dlp download
+                            (default: transcripts/ytdlp_playlist.log)
+    STUB_TITLES             file with one title per line for
+                            `yt-dlp --flat-playlist --print ...` (default: the
+                            "Processing query:" titles of spotdl_batch.log);
+                            "<id>\t<title>" lines fix the video id,
+                            "NA" as yt-dlp prints for a missing one
+    STUB_LINE_RATE          lines per second, 0 = as fast as possible (default 0)
+    STUB_STARTUP_DELAY      seconds to sleep before the first line, once per
+                            process like interpreter + spotdl import time
+                            (default 0)
+    STUB_EXIT_CODE          exit code of spotdl / yt-dlp (default 0)
+    STUB_CREATE_FILES       1 = create the audio files the transcript reports
+                            as downloaded or already existing (default 1)
+    STUB_DURATION           seconds printed by ffprobe (default 180.0)
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+TRANSCRIPTS_DIR = Path(__file__).resolve().parent.parent / "transcripts"
+
+_started = False  # Startup delay already paid (persistent spotdl workers run many replays)
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def arg_value(argv, *flags):
+    """Value following the first of `flags` in argv (None if absent)."""
+    for i, arg in enumerate(argv[:-1]):
+        if arg in flags:
+            return argv[i + 1]
+    return None
+
+
+def read_lines(path) -> list:
+    return Path(path).read_text(encoding="utf-8").splitlines()
+
+
+def touch(path: Path):
+    if os.environ.get("STUB_CREATE_FILES", "1") != "1" or path.exists():
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    except OSError:
+        pass
+
+
+def replay(lines, on_line=None) -> int:
+    """
+    Writes `lines` to stdout at STUB_LINE_RATE, then returns STUB_EXIT_CODE.
+    on_line(line) runs before each line is written, so files are on disk by
+    the time they are reported (as with the real tools).
+    """
+    global _started
+    rate = env_float("STUB_LINE_RATE", 0)
+    delay = env_float("STUB_STARTUP_DELAY", 0)
+    if delay > 0 and not _started:
+        time.sleep(delay)
+    _started = True
+
+    out = sys.stdout
+    start = time.monotonic()
+    for i, line in enumerate(lines):
+        if rate > 0:
+            wait = start + i / rate - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+        if on_line:
+            on_line(line)
+        out.write(line + "\n")
+        out.flush()
+    return env_int("STUB_EXIT_CODE", 0)
@@ -11,6 +11,10 @@ const api = new API(API_URL);
 const ui = new UI(api);
 
 let currentEditId = null;
+let liveStatus = {};
+let statusVersion = 0;
+let lastLogSeq = 0;
+let logEpoch = null;
 
 // === Event Handlers ===
 
@@ -221,36 +225,85 @@ async function syncPlaylist(id) {
     }
 }
 
+const TRACKS_PAGE_SIZE = 200;
+
+function renderTrackItem(track) {
+    const li = document.createElement('li');
+    li.className = 'track-item';
+
+    // Cleanup filename: remove leading ./ and extension
+    let cleanName = track.replace(/^\.\//, ''); // Remove ./
+    cleanName = cleanName.replace(/\.(opus|mp3|m4a|flac)$/, ''); // Remove ext
+
+    li.innerHTML = `
+        <span class="track-icon">🎵</span>
+        <span class="track-name">${cleanName}</span>
+    `;
+    return li;
+}
+
+async function loadTracksPage(id, offset, prefix) {
+    const list = document.getElementById('tracks-list');
+    const { tracks, total } = await api.getTracks(id, { offset, limit: TRACKS_PAGE_SIZE, prefix });
+
+    // Stale response (filter changed meanwhile)
+    if (list.dataset.id !== id || list.dataset.prefix !== prefix) return;
+
+    list.querySelector('.load-more')?.remove();
+    if (offset === 0) list.innerHTML = '';
+
+    if (total === 0) {
+        // A filter without matches doesn't mean the playlist is empty
+        const empty = document.createElement('li');
+        empty.className = 'empty-state';
+        empty.textContent = prefix
+            ? `Ningún track empieza por "${prefix}".`
+            : 'No hay tracks descargados.';
+        list.innerHTML = '';
+        list.appendChild(empty);
+        return;
+    }
+
+    const fragment = document.createDocumentFragment();
+    tracks.forEach(track => fragment.appendChild(renderTrackItem(track)));
+    list.appendChild(fragment);
+
+    const loaded = offset + tracks.length;
+    if (loaded < total) {
+        const more = document.createElement('li');
+        more.className = 'load-more';
+        more.innerHTML = `<button class="btn btn-secondary">Cargar más (${loaded}/${total})</button>`;
+        more.querySelector('button').onclick = () => loadTracksPage(id, loaded, prefix)
+            .catch(() => ui.showToast("Error cargando tracks", "error"));
+        list.appendChild(more);
+    }
+}
+
 async function viewTracks(id, name) {
     const modal = document.getElementById('tracks-modal');
     const title = document.getElementById('modal-title');
     const list = document.getElementById('tracks-list');
+    const filter = document.getElementById('tracks-filter');
 
     title.textContent = `Tracks: ${name}`;
     list.innerHTML = '<li class="loading-state">Cargando...</li>';
+    list.dataset.id = id;
+    list.dataset.prefix = '';
+    filter.value = '';
     modal.style.display = 'flex'; // Use flex for centering (via CSS)
 
+    let debounce = null;
+    filter.oninput = () => {
+        clearTimeout(debounce);
+        debounce = setTimeout(() => {
+            list.dataset.prefix = filter.value.trim();
+            loadTracksPage(id, 0, list.dataset.prefix)
+                .catch(() => list.innerHTML = '<li class="error-state">Error cargando tracks.</li>');
+        }, 250);
+    };
+
     try {
-        const tracks = await api.getTracks(id);
-        list.innerHTML = '';
-        if (tracks.length === 0) {
-            list.innerHTML = '<li class="empty-state">No hay tracks descargados.</li>';
-        } else {
-            tracks.forEach(track => {
-                const li = document.createElement('li');
-                li.className = 'track-item';
-
-                // Cleanup filename: remove leading ./ and extension
-                let cleanName = track.replace(/^\.\//, ''); // Remove ./
-                cleanName = cleanName.replace(/\.(opus|mp3|m4a|flac)$/, ''); // Remove ext
-
-                li.innerHTML = `
-                    <span class="track-icon">🎵</span>
-                    <span class="track-name">${cleanName}</span>
-                `;
-                list.appendChild(li);
-            });
-        }
+        await loadTracksPage(id, 0, '');
     } catch (e) {
         list.innerHTML = '<li class="error-state">Error cargando tracks.</li>';
     }
@@ -321,8 +374,35 @@ document.addEventListener('DOMContentLoaded', () => {
         onOpen: () => ui.setOnline(true),
         onClose: () => ui.setOnline(false),
         onMessage: (msg) => {
-            if (msg.type === 'status') ui.updateStatus(msg.data);
-            if (msg.type === 'log') ui.appendLog(msg.data);
+            if (msg.type === 'status') {
+                // Full snapshot (on connect); deltas with a higher version follow
+                liveStatus = msg.data;
+                statusVersion = msg.version || 0;
+                ui.updateStatus(liveStatus);
+            }
+            if (msg.type === 'status_delta') {
+                if (msg.data.version <= statusVersion) return; // Already in the snapshot
+                Object.assign(liveStatus, msg.data.changes);
+                statusVersion = msg.data.version;
+                ui.updateStatus(liveStatus);
+            }
+            if (msg.type === 'log') {
+                if (msg.seq <= lastLogSeq) return; // Already shown by a replay
+                lastLogSeq = msg.seq || lastLogSeq;
+                ui.appendLog(msg.data);
+            }
+            if (msg.type === 'log_replay') {
+                // History on (re)connect; sequence numbers restart with the server
+                if (msg.data.epoch !== logEpoch) {
+                    logEpoch = msg.data.epoch;
+                    lastLogSeq = 0;
+                }
+                for (const ev of msg.data.events) {
+                    if (ev.seq <= lastLogSeq) continue;
+                    lastLogSeq = ev.seq;
+                    ui.appendLog(ev.message);
+                }
+            }
         }
     });
     ws.connect();
@@ -37,10 +37,15 @@ export class API {
         await fetch(`${this.baseUrl}/playlists/${id}`, { method: 'DELETE' });
     }
 
-    async getTracks(id) {
-        const res = await fetch(`${this.baseUrl}/playlists/${id}/tracks`);
+    async getTracks(id, { offset = 0, limit = 200, prefix = "" } = {}) {
+        // Browser HTTP cache revalidates with If-None-Match (ETag) => 304 on unchanged lists
+        const params = new URLSearchParams({ offset, limit });
+        if (prefix) params.set('prefix', prefix);
+        const res = await fetch(`${this.baseUrl}/playlists/${id}/tracks?${params}`);
         if (!res.ok) throw new Error("Failed to load tracks");
-        return await res.json();
+        const tracks = await res.json();
+        const total = parseInt(res.headers.get('X-Total-Count') || tracks.length);
+        return { tracks, total };
     }
 
     async syncPlaylist(id) {
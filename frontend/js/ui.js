@@ -125,6 +125,8 @@ export class UI {
                 hour: '2-digit', minute: '2-digit'
             });
             const durationStr = this.formatDuration(entry.duration_seconds);
+            const concurrencyStr = this.formatConcurrency(entry.details);
+            const retryStr = this.formatRetry(entry.details);
 
             item.innerHTML = `
                 <div class="h-header">
@@ -134,12 +136,54 @@ export class UI {
                 <div class="h-details">
                     <span>Canciones: <strong>${entry.items_downloaded}</strong> / ${entry.total_items}</span>
                     <span>⏱ ${durationStr}</span>
+                    ${concurrencyStr ? `<span>⚙ ${concurrencyStr}</span>` : ''}
+                    ${retryStr ? `<span>🔁 ${retryStr}</span>` : ''}
                 </div>
             `;
             list.appendChild(item);
         });
     }
 
+    // "Hilos 1→3 · mejor 3 (12.5 canciones/min)" from the controller reports in job details
+    formatConcurrency(details) {
+        const reports = details && details.concurrency;
+        if (!reports || reports.length === 0) return '';
+        const first = reports[0];
+        const last = reports[reports.length - 1];
+        const byLimit = {};
+        reports.forEach(r => {
+            Object.entries(r.by_limit || {}).forEach(([limit, stats]) => {
+                const acc = byLimit[limit] || (byLimit[limit] = { seconds: 0, songs: 0 });
+                acc.seconds += stats.seconds;
+                acc.songs += stats.songs;
+            });
+        });
+        let best = null;
+        Object.entries(byLimit).forEach(([limit, stats]) => {
+            const rate = stats.seconds > 0 ? stats.songs / (stats.seconds / 60) : 0;
+            if (!best || rate > best.rate) best = { limit, rate };
+        });
+        let text = `Hilos ${first.initial}→${last.final}`;
+        if (best && best.rate > 0) text += ` · mejor ${best.limit} (${best.rate.toFixed(1)} canciones/min)`;
+        return text;
+    }
+
+    // "2 reintentos · 45 segundos de espera" from the retry counters of each controller report
+    formatRetry(details) {
+        const reports = (details && details.concurrency) || [];
+        let retries = 0;
+        let backoff = 0;
+        reports.forEach(r => {
+            if (!r.retry) return;
+            retries += r.retry.retries || 0;
+            backoff += r.retry.backoff_seconds || 0;
+        });
+        if (!retries) return '';
+        let text = `${retries} ${retries === 1 ? 'reintento' : 'reintentos'}`;
+        if (backoff > 0) text += ` · ${this.formatDuration(backoff)} de espera`;
+        return text;
+    }
+
     timeAgo(date) {
         const seconds = Math.floor((new Date() - date) / 1000);
         let interval = seconds / 31536000;
@@ -254,12 +298,39 @@ export class UI {
             songEl.style.color = 'var(--text-main)';
         }
 
+        this.renderPlaylistProgress(data);
+
         if (data.state === 'idle' && percent === 100 && data.total_songs > 0) {
             stateBadge.textContent = 'Sincronizado';
             stateBadge.classList.add('online');
         }
     }
 
+    // Per-playlist progress of a multi-playlist run (shared songs count for each playlist)
+    renderPlaylistProgress(data) {
+        const box = document.getElementById('status-playlists');
+        if (!box) return;
+        const entries = Object.values(data.playlists || {});
+        if (entries.length < 2 || data.state === 'idle') {
+            box.style.display = 'none';
+            return;
+        }
+        box.innerHTML = '';
+        entries.forEach(p => {
+            const row = document.createElement('div');
+            row.style.display = 'flex';
+            row.style.justifyContent = 'space-between';
+            const name = document.createElement('span');
+            name.className = 'text-truncate';
+            name.textContent = p.name;
+            const count = document.createElement('span');
+            count.textContent = `${Math.min(p.downloaded, p.total)} / ${p.total}`;
+            row.append(name, count);
+            box.appendChild(row);
+        });
+        box.style.display = 'block';
+    }
+
     appendLog(text) {
         const consoleBox = document.getElementById('console-logs');
 